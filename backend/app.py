@@ -7,7 +7,7 @@ from routes.elemento import elemento_bp
 from routes.amostra import amostra_bp
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
 
 app.config["APP_NAME"] = APP_NAME
 app.config["ENV"] = FLASK_ENV
@@ -21,6 +21,9 @@ GAS_KG_DEFAULT = 1.0
 
 CILINDRO_STATUS = ["ativo", "em_uso", "esgotado"]
 
+# Máximo de itens por requisição nos endpoints /lote
+LOTE_MAXIMO = int(os.getenv("LOTE_MAXIMO", "1000"))
+
 ELEMENTOS_PADRAO = [
     {"nome": "Antimônio", "consumo_lpm": 1.5},
     {"nome": "Alumínio", "consumo_lpm": 4.5},
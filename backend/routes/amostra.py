@@ -1,19 +1,111 @@
 from flask import Blueprint, request, jsonify
 from utils.supabase import get_supabase
 from utils.decorators import token_required
+from utils.listagem import listar
+from utils.lote import ler_lote, processar_lote, ids_do_usuario
+from utils.validators import tempo_chama_para_segundos, data_iso
 
 amostra_bp = Blueprint("amostra", __name__, url_prefix="/api/amostras")
 
+COLUNAS = (
+    "id", "data", "tempo_chama", "tempo_chama_segundos", "cilindro_id", "elemento_id",
+    "quantidade_amostras", "user_id", "created_at", "updated_at",
+)
+ORDENAVEIS = ("id", "data", "updated_at")
+
+
+def montar_amostra(data, atual=None, parcial=False):
+    """Linha da amostra a partir do item (sobre `atual`, numa atualização); retorna (linha, erro).
+
+    Com parcial=True (PATCH) só os campos presentes no item são validados e retornados.
+    """
+    if not isinstance(data, dict):
+        return None, "Item deve ser um objeto JSON"
+    atual = atual or {}
+    linha = {}
+
+    def usar(campo):
+        return not parcial or campo in data
+
+    if usar("data"):
+        data_amostra = data.get("data", atual.get("data"))
+        if not data_amostra:
+            return None, "Data e tempo de chama são obrigatórios"
+        if data_iso(data_amostra) is None:
+            return None, "Data deve estar no formato AAAA-MM-DD"
+        linha["data"] = data_iso(data_amostra)
+
+    if usar("tempo_chama"):
+        tempo_chama = data.get("tempo_chama", atual.get("tempo_chama"))
+        if not tempo_chama:
+            return None, "Data e tempo de chama são obrigatórios"
+        tempo_chama_segundos = tempo_chama_para_segundos(tempo_chama)
+        if tempo_chama_segundos is None:
+            return None, "Tempo de chama deve estar no formato HH:MM:SS"
+        linha["tempo_chama"] = tempo_chama
+        linha["tempo_chama_segundos"] = tempo_chama_segundos
+
+    for campo in ("cilindro_id", "elemento_id"):
+        if usar(campo):
+            linha[campo] = data.get(campo, atual.get(campo))
+
+    if usar("quantidade_amostras"):
+        quantidade = data.get("quantidade_amostras", atual.get("quantidade_amostras", 1))
+        if isinstance(quantidade, str) and quantidade.isdigit():
+            quantidade = int(quantidade)
+        if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade < 1:
+            return None, "quantidade_amostras deve ser um inteiro positivo"
+        linha["quantidade_amostras"] = quantidade
+
+    if not linha:
+        return None, "Nenhum campo para atualizar"
+    return linha, None
+
+
+def _referencias_do_usuario(itens):
+    """(cilindros, elementos) do usuário entre os referenciados pelos itens; uma consulta por tabela."""
+    objetos = [item for item in itens if isinstance(item, dict)]
+    cilindros = ids_do_usuario("cilindro", request.user_id, [item.get("cilindro_id") for item in objetos])
+    elementos = ids_do_usuario("elemento", request.user_id, [item.get("elemento_id") for item in objetos])
+    return cilindros, elementos
+
+
+def _erro_referencias(item, linha, cilindros, elementos):
+    """Erro se o item informar um cilindro ou elemento que não é do usuário.
+
+    Só os campos presentes no item são verificados: referências mantidas de
+    um registro existente já eram do usuário.
+    """
+    if "cilindro_id" in item and linha.get("cilindro_id") is not None and linha["cilindro_id"] not in cilindros:
+        return "Cilindro não encontrado"
+    if "elemento_id" in item and linha.get("elemento_id") is not None and linha["elemento_id"] not in elementos:
+        return "Elemento não encontrado"
+    return None
+
+
+def _processar_amostras(itens, atualizar=False):
+    cilindros, elementos = _referencias_do_usuario(itens)
+
+    def montar(item, atual):
+        linha, erro = montar_amostra(item, atual)
+        if erro:
+            return None, erro
+        erro = _erro_referencias(item, linha, cilindros, elementos)
+        if erro:
+            return None, erro
+        return linha, None
+
+    return processar_lote("amostra", itens, montar, atualizar=atualizar)
+
 
 @amostra_bp.route("", methods=["GET"])
 @token_required
 def get_amostras():
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    response = supabase.table("amostra").select("*").eq("user_id", user_id).execute()
-
-    return jsonify(response.data), 200
+    return listar(
+        "amostra", COLUNAS, ORDENAVEIS,
+        filtros={"cilindro_id": int, "elemento_id": int},
+        coluna_data="data",
+    )
 
 
 @amostra_bp.route("", methods=["POST"])
@@ -23,17 +115,12 @@ def create_amostra():
     user_id = request.user_id
     data = request.get_json()
 
-    if not data.get("data") or not data.get("tempo_chama"):
-        return jsonify({"message": "Data e tempo de chama são obrigatórios"}), 400
-
-    new_data = {
-        "data": data["data"],
-        "tempo_chama": data["tempo_chama"],
-        "cilindro_id": data.get("cilindro_id"),
-        "elemento_id": data.get("elemento_id"),
-        "quantidade_amostras": data.get("quantidade_amostras", 1),
-        "user_id": user_id,
-    }
+    new_data, erro = montar_amostra(data)
+    if not erro:
+        erro = _erro_referencias(data, new_data, *_referencias_do_usuario([data]))
+    if erro:
+        return jsonify({"message": erro}), 400
+    new_data["user_id"] = user_id
 
     response = supabase.table("amostra").insert(new_data).execute()
 
@@ -42,6 +129,24 @@ def create_amostra():
     ), 201
 
 
+@amostra_bp.route("/lote", methods=["POST"])
+@token_required
+def create_amostras_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return _processar_amostras(itens)
+
+
+@amostra_bp.route("/lote", methods=["PUT"])
+@token_required
+def update_amostras_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return _processar_amostras(itens, atualizar=True)
+
+
 @amostra_bp.route("/<int:amostra_id>", methods=["GET"])
 @token_required
 def get_amostra(amostra_id):
@@ -62,37 +167,30 @@ def get_amostra(amostra_id):
     return jsonify(response.data[0]), 200
 
 
-@amostra_bp.route("/<int:amostra_id>", methods=["PUT"])
+@amostra_bp.route("/<int:amostra_id>", methods=["PUT", "PATCH"])
 @token_required
 def update_amostra(amostra_id):
     supabase = get_supabase()
     user_id = request.user_id
-    data = request.get_json()
+    data = request.get_json(silent=True)
 
-    existing = (
+    # Só os campos enviados são alterados; a posse é garantida pelo filtro de user_id
+    update_data, erro = montar_amostra(data, parcial=True)
+    if not erro and ("cilindro_id" in update_data or "elemento_id" in update_data):
+        erro = _erro_referencias(data, update_data, *_referencias_do_usuario([data]))
+    if erro:
+        return jsonify({"message": erro}), 400
+
+    response = (
         supabase.table("amostra")
-        .select("id")
+        .update(update_data)
         .eq("id", amostra_id)
         .eq("user_id", user_id)
         .execute()
     )
-    if not existing.data:
+    if not response.data:
         return jsonify({"message": "Amostra não encontrada"}), 404
 
-    update_data = {
-        "data": data.get("data", existing.data[0]["data"]),
-        "tempo_chama": data.get("tempo_chama", existing.data[0]["tempo_chama"]),
-        "cilindro_id": data.get("cilindro_id", existing.data[0].get("cilindro_id")),
-        "elemento_id": data.get("elemento_id", existing.data[0].get("elemento_id")),
-        "quantidade_amostras": data.get(
-            "quantidade_amostras", existing.data[0].get("quantidade_amostras", 1)
-        ),
-    }
-
-    response = (
-        supabase.table("amostra").update(update_data).eq("id", amostra_id).execute()
-    )
-
     return jsonify(
         {"message": "Amostra atualizada com sucesso", "data": response.data[0]}
     ), 200
@@ -101,19 +199,9 @@ def update_amostra(amostra_id):
 @amostra_bp.route("/<int:amostra_id>", methods=["DELETE"])
 @token_required
 def delete_amostra(amostra_id):
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    existing = (
-        supabase.table("amostra")
-        .select("id")
-        .eq("id", amostra_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if not existing.data:
+    # Exclusão e registro no histórico em uma chamada
+    response = get_supabase().rpc("excluir_amostra", {"p_user_id": request.user_id, "p_id": amostra_id}).execute()
+    if not response.data:
         return jsonify({"message": "Amostra não encontrada"}), 404
 
-    supabase.table("amostra").delete().eq("id", amostra_id).execute()
-
     return jsonify({"message": "Amostra excluída com sucesso"}), 200
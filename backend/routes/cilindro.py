@@ -1,20 +1,80 @@
 from flask import Blueprint, request, jsonify
 from utils.supabase import get_supabase
 from utils.decorators import token_required
-from config import LITROS_EQUIVALENTES_KG, CUSTO_DEFAULT, GAS_KG_DEFAULT
+from utils.listagem import listar, opcao
+from utils.lote import ler_lote, processar_lote
+from utils.validators import data_iso, numero
+from config import LITROS_EQUIVALENTES_KG, CUSTO_DEFAULT, GAS_KG_DEFAULT, CILINDRO_STATUS
 
 cilindro_bp = Blueprint("cilindro", __name__, url_prefix="/api/cilindros")
 
+COLUNAS = (
+    "id", "codigo", "data_compra", "data_inicio_consumo", "data_fim", "gas_kg",
+    "litros_equivalentes", "custo", "status", "user_id", "created_at", "updated_at",
+)
+ORDENAVEIS = ("id", "codigo", "data_compra", "updated_at")
+
+
+def montar_cilindro(data, atual=None, parcial=False):
+    """Linha do cilindro a partir do item (sobre `atual`, numa atualização); retorna (linha, erro).
+
+    Com parcial=True (PATCH) só os campos presentes no item são validados e retornados.
+    """
+    if not isinstance(data, dict):
+        return None, "Item deve ser um objeto JSON"
+    atual = atual or {}
+    linha = {}
+
+    def usar(campo):
+        return not parcial or campo in data
+
+    if usar("codigo"):
+        codigo = data.get("codigo", atual.get("codigo"))
+        if not codigo or not isinstance(codigo, str):
+            return None, "Código é obrigatório"
+        linha["codigo"] = codigo
+
+    for campo in ("data_compra", "data_inicio_consumo", "data_fim"):
+        if usar(campo):
+            valor = data.get(campo, atual.get(campo))
+            if valor and data_iso(valor) is None:
+                return None, f"{campo} deve estar no formato AAAA-MM-DD"
+            linha[campo] = data_iso(valor) if valor else None
+    if "data_compra" in linha and not linha["data_compra"]:
+        return None, "Data de compra é obrigatória"
+
+    if usar("gas_kg"):
+        gas_kg = numero(data.get("gas_kg", atual.get("gas_kg", GAS_KG_DEFAULT)))
+        if gas_kg is None:
+            return None, "gas_kg deve ser numérico"
+        linha["gas_kg"] = gas_kg
+        linha["litros_equivalentes"] = gas_kg * LITROS_EQUIVALENTES_KG
+
+    if usar("custo"):
+        custo = numero(data.get("custo", atual.get("custo", CUSTO_DEFAULT)))
+        if custo is None:
+            return None, "custo deve ser numérico"
+        linha["custo"] = custo
+
+    if usar("status"):
+        status = data.get("status", atual.get("status") or "ativo")
+        if status not in CILINDRO_STATUS:
+            return None, f"Status deve ser um de: {', '.join(CILINDRO_STATUS)}"
+        linha["status"] = status
+
+    if not linha:
+        return None, "Nenhum campo para atualizar"
+    return linha, None
+
 
 @cilindro_bp.route("", methods=["GET"])
 @token_required
 def get_cilindros():
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    response = supabase.table("cilindro").select("*").eq("user_id", user_id).execute()
-
-    return jsonify(response.data), 200
+    return listar(
+        "cilindro", COLUNAS, ORDENAVEIS,
+        filtros={"status": opcao(CILINDRO_STATUS)},
+        coluna_data="data_compra",
+    )
 
 
 @cilindro_bp.route("", methods=["POST"])
@@ -24,37 +84,21 @@ def create_cilindro():
     user_id = request.user_id
     data = request.get_json()
 
-    if not data.get("codigo"):
-        return jsonify({"message": "Código é obrigatório"}), 400
-
-    if not data.get("data_compra"):
-        return jsonify({"message": "Data de compra é obrigatória"}), 400
+    new_data, erro = montar_cilindro(data)
+    if erro:
+        return jsonify({"message": erro}), 400
 
     existing = (
         supabase.table("cilindro")
         .select("id")
-        .eq("codigo", data["codigo"])
+        .eq("codigo", new_data["codigo"])
         .eq("user_id", user_id)
         .execute()
     )
     if existing.data:
         return jsonify({"message": "Código já existe"}), 400
 
-    gas_kg = data.get("gas_kg", GAS_KG_DEFAULT)
-    litros = gas_kg * LITROS_EQUIVALENTES_KG
-    custo = data.get("custo", CUSTO_DEFAULT)
-
-    new_data = {
-        "codigo": data["codigo"],
-        "data_compra": data["data_compra"],
-        "data_inicio_consumo": data.get("data_inicio_consumo"),
-        "data_fim": data.get("data_fim"),
-        "gas_kg": gas_kg,
-        "litros_equivalentes": litros,
-        "custo": custo,
-        "status": data.get("status", "ativo"),
-        "user_id": user_id,
-    }
+    new_data["user_id"] = user_id
 
     response = supabase.table("cilindro").insert(new_data).execute()
 
@@ -63,6 +107,27 @@ def create_cilindro():
     ), 201
 
 
+@cilindro_bp.route("/lote", methods=["POST"])
+@token_required
+def create_cilindros_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return processar_lote("cilindro", itens, montar_cilindro, coluna_unica="codigo", mensagem_duplicado="Código já existe")
+
+
+@cilindro_bp.route("/lote", methods=["PUT"])
+@token_required
+def update_cilindros_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return processar_lote(
+        "cilindro", itens, montar_cilindro, atualizar=True,
+        coluna_unica="codigo", mensagem_duplicado="Código já existe"
+    )
+
+
 @cilindro_bp.route("/<int:cilindro_id>", methods=["GET"])
 @token_required
 def get_cilindro(cilindro_id):
@@ -83,28 +148,23 @@ def get_cilindro(cilindro_id):
     return jsonify(response.data[0]), 200
 
 
-@cilindro_bp.route("/<int:cilindro_id>", methods=["PUT"])
+@cilindro_bp.route("/<int:cilindro_id>", methods=["PUT", "PATCH"])
 @token_required
 def update_cilindro(cilindro_id):
     supabase = get_supabase()
     user_id = request.user_id
-    data = request.get_json()
+    data = request.get_json(silent=True)
 
-    existing = (
-        supabase.table("cilindro")
-        .select("id")
-        .eq("id", cilindro_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if not existing.data:
-        return jsonify({"message": "Cilindro não encontrado"}), 404
+    # Só os campos enviados são alterados; a posse é garantida pelo filtro de user_id
+    update_data, erro = montar_cilindro(data, parcial=True)
+    if erro:
+        return jsonify({"message": erro}), 400
 
-    if data.get("codigo"):
+    if "codigo" in update_data:
         duplicate = (
             supabase.table("cilindro")
             .select("id")
-            .eq("codigo", data["codigo"])
+            .eq("codigo", update_data["codigo"])
             .eq("user_id", user_id)
             .neq("id", cilindro_id)
             .execute()
@@ -112,23 +172,15 @@ def update_cilindro(cilindro_id):
         if duplicate.data:
             return jsonify({"message": "Código já existe"}), 400
 
-    gas_kg = data.get("gas_kg", existing.data[0].get("gas_kg", GAS_KG_DEFAULT))
-    litros = gas_kg * LITROS_EQUIVALENTES_KG
-
-    update_data = {
-        "codigo": data.get("codigo", existing.data[0]["codigo"]),
-        "data_compra": data.get("data_compra", existing.data[0]["data_compra"]),
-        "data_inicio_consumo": data.get("data_inicio_consumo", existing.data[0].get("data_inicio_consumo")),
-        "data_fim": data.get("data_fim", existing.data[0].get("data_fim")),
-        "gas_kg": gas_kg,
-        "litros_equivalentes": litros,
-        "custo": data.get("custo", existing.data[0]["custo"]),
-        "status": data.get("status", existing.data[0]["status"]),
-    }
-
     response = (
-        supabase.table("cilindro").update(update_data).eq("id", cilindro_id).execute()
+        supabase.table("cilindro")
+        .update(update_data)
+        .eq("id", cilindro_id)
+        .eq("user_id", user_id)
+        .execute()
     )
+    if not response.data:
+        return jsonify({"message": "Cilindro não encontrado"}), 404
 
     return jsonify(
         {"message": "Cilindro atualizado com sucesso", "data": response.data[0]}
@@ -138,19 +190,12 @@ def update_cilindro(cilindro_id):
 @cilindro_bp.route("/<int:cilindro_id>", methods=["DELETE"])
 @token_required
 def delete_cilindro(cilindro_id):
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    existing = (
-        supabase.table("cilindro")
-        .select("id")
-        .eq("id", cilindro_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if not existing.data:
+    # Verificação de amostras, exclusão e registro no histórico em uma chamada
+    response = get_supabase().rpc("excluir_cilindro", {"p_user_id": request.user_id, "p_id": cilindro_id}).execute()
+    if not response.data:
         return jsonify({"message": "Cilindro não encontrado"}), 404
-
-    supabase.table("cilindro").delete().eq("id", cilindro_id).execute()
+    resultado = response.data[0]
+    if resultado["situacao"] == "com_amostras":
+        return jsonify({"message": "Cilindro possui amostras vinculadas. Exclua primeiro as amostras"}), 409
 
     return jsonify({"message": "Cilindro excluído com sucesso"}), 200
@@ -1,19 +1,47 @@
 from flask import Blueprint, request, jsonify
 from utils.supabase import get_supabase
 from utils.decorators import token_required
+from utils.listagem import listar
+from utils.lote import ler_lote, processar_lote
+from utils.validators import numero
 
 elemento_bp = Blueprint("elemento", __name__, url_prefix="/api/elementos")
 
+COLUNAS = ("id", "nome", "consumo_lpm", "user_id", "created_at", "updated_at")
+ORDENAVEIS = ("id", "nome", "consumo_lpm", "updated_at")
+
+
+def montar_elemento(data, atual=None, parcial=False):
+    """Linha do elemento a partir do item (sobre `atual`, numa atualização); retorna (linha, erro).
+
+    Com parcial=True (PATCH) só os campos presentes no item são validados e retornados.
+    """
+    if not isinstance(data, dict):
+        return None, "Item deve ser um objeto JSON"
+    atual = atual or {}
+    linha = {}
+
+    if not parcial or "nome" in data:
+        nome = data.get("nome", atual.get("nome"))
+        if not nome or not isinstance(nome, str):
+            return None, "Nome é obrigatório"
+        linha["nome"] = nome
+
+    if not parcial or "consumo_lpm" in data:
+        consumo_lpm = numero(data.get("consumo_lpm", atual.get("consumo_lpm", 1.5)))
+        if consumo_lpm is None or consumo_lpm < 0:
+            return None, "consumo_lpm deve ser um número não negativo"
+        linha["consumo_lpm"] = consumo_lpm
+
+    if not linha:
+        return None, "Nenhum campo para atualizar"
+    return linha, None
+
 
 @elemento_bp.route("", methods=["GET"])
 @token_required
 def get_elementos():
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    response = supabase.table("elemento").select("*").eq("user_id", user_id).execute()
-    
-    return jsonify(response.data), 200
+    return listar("elemento", COLUNAS, ORDENAVEIS)
 
 
 @elemento_bp.route("", methods=["POST"])
@@ -23,24 +51,21 @@ def create_elemento():
     user_id = request.user_id
     data = request.get_json()
 
-    if not data.get("nome"):
-        return jsonify({"message": "Nome é obrigatório"}), 400
+    new_data, erro = montar_elemento(data)
+    if erro:
+        return jsonify({"message": erro}), 400
 
     existing = (
         supabase.table("elemento")
         .select("id")
-        .eq("nome", data["nome"])
+        .eq("nome", new_data["nome"])
         .eq("user_id", user_id)
         .execute()
     )
     if existing.data:
         return jsonify({"message": "Elemento já existe"}), 400
 
-    new_data = {
-        "nome": data["nome"],
-        "consumo_lpm": data.get("consumo_lpm", 1.5),
-        "user_id": user_id,
-    }
+    new_data["user_id"] = user_id
 
     response = supabase.table("elemento").insert(new_data).execute()
 
@@ -49,6 +74,27 @@ def create_elemento():
     ), 201
 
 
+@elemento_bp.route("/lote", methods=["POST"])
+@token_required
+def create_elementos_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return processar_lote("elemento", itens, montar_elemento, coluna_unica="nome", mensagem_duplicado="Elemento já existe")
+
+
+@elemento_bp.route("/lote", methods=["PUT"])
+@token_required
+def update_elementos_lote():
+    itens, erro = ler_lote()
+    if erro:
+        return erro
+    return processar_lote(
+        "elemento", itens, montar_elemento, atualizar=True,
+        coluna_unica="nome", mensagem_duplicado="Nome já existe"
+    )
+
+
 @elemento_bp.route("/<int:elemento_id>", methods=["GET"])
 @token_required
 def get_elemento(elemento_id):
@@ -69,28 +115,23 @@ def get_elemento(elemento_id):
     return jsonify(response.data[0]), 200
 
 
-@elemento_bp.route("/<int:elemento_id>", methods=["PUT"])
+@elemento_bp.route("/<int:elemento_id>", methods=["PUT", "PATCH"])
 @token_required
 def update_elemento(elemento_id):
     supabase = get_supabase()
     user_id = request.user_id
-    data = request.get_json()
+    data = request.get_json(silent=True)
 
-    existing = (
-        supabase.table("elemento")
-        .select("id")
-        .eq("id", elemento_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if not existing.data:
-        return jsonify({"message": "Elemento não encontrado"}), 404
+    # Só os campos enviados são alterados; a posse é garantida pelo filtro de user_id
+    update_data, erro = montar_elemento(data, parcial=True)
+    if erro:
+        return jsonify({"message": erro}), 400
 
-    if data.get("nome"):
+    if "nome" in update_data:
         duplicate = (
             supabase.table("elemento")
             .select("id")
-            .eq("nome", data["nome"])
+            .eq("nome", update_data["nome"])
             .eq("user_id", user_id)
             .neq("id", elemento_id)
             .execute()
@@ -98,14 +139,15 @@ def update_elemento(elemento_id):
         if duplicate.data:
             return jsonify({"message": "Nome já existe"}), 400
 
-    update_data = {
-        "nome": data.get("nome", existing.data[0]["nome"]),
-        "consumo_lpm": data.get("consumo_lpm", existing.data[0]["consumo_lpm"]),
-    }
-
     response = (
-        supabase.table("elemento").update(update_data).eq("id", elemento_id).execute()
+        supabase.table("elemento")
+        .update(update_data)
+        .eq("id", elemento_id)
+        .eq("user_id", user_id)
+        .execute()
     )
+    if not response.data:
+        return jsonify({"message": "Elemento não encontrado"}), 404
 
     return jsonify(
         {"message": "Elemento atualizado com sucesso", "data": response.data[0]}
@@ -115,19 +157,12 @@ def update_elemento(elemento_id):
 @elemento_bp.route("/<int:elemento_id>", methods=["DELETE"])
 @token_required
 def delete_elemento(elemento_id):
-    supabase = get_supabase()
-    user_id = request.user_id
-
-    existing = (
-        supabase.table("elemento")
-        .select("id")
-        .eq("id", elemento_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if not existing.data:
+    # Verificação de amostras, exclusão e registro no histórico em uma chamada
+    response = get_supabase().rpc("excluir_elemento", {"p_user_id": request.user_id, "p_id": elemento_id}).execute()
+    if not response.data:
         return jsonify({"message": "Elemento não encontrado"}), 404
-
-    supabase.table("elemento").delete().eq("id", elemento_id).execute()
+    resultado = response.data[0]
+    if resultado["situacao"] == "com_amostras":
+        return jsonify({"message": "Elemento possui amostras vinculadas. Exclua primeiro as amostras"}), 409
 
     return jsonify({"message": "Elemento excluído com sucesso"}), 200
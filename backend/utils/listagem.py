@@ -0,0 +1,158 @@
+import json
+import base64
+from datetime import date
+from flask import request, jsonify
+from utils.supabase import get_supabase
+
+LIMITE_MAXIMO = 1000
+# Limite usado quando só o cursor é informado
+LIMITE_PADRAO = 100
+
+
+class ParametroInvalido(ValueError):
+    """Parâmetro de listagem inválido; a mensagem vai na resposta 400."""
+
+
+def opcao(valores):
+    """Conversor de filtro que aceita só os valores informados."""
+    def converter(valor):
+        if valor not in valores:
+            raise ValueError(valor)
+        return valor
+    return converter
+
+
+def codificar_cursor(ordem, valor, id_):
+    texto = json.dumps([ordem, valor, id_], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, ordem):
+    """Retorna (valor, id) do cursor; o cursor precisa ter sido gerado para a mesma ordenação."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ordem_cursor, valor, id_ = json.loads(texto)
+        id_ = int(id_)
+    except (ValueError, TypeError):
+        raise ParametroInvalido("Cursor inválido")
+    if ordem_cursor != ordem:
+        raise ParametroInvalido("Cursor gerado para outra ordenação")
+    return valor, id_
+
+
+def _campos(fields, colunas):
+    if not fields:
+        return list(colunas)
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in colunas]
+    if invalidos or not campos:
+        raise ParametroInvalido(f"Campos inválidos: {', '.join(invalidos)}. Disponíveis: {', '.join(colunas)}")
+    return list(dict.fromkeys(campos))
+
+
+def _ordem(sort, ordenaveis):
+    if not sort:
+        return "id", False
+    coluna = sort.lstrip("-")
+    if coluna not in ordenaveis:
+        raise ParametroInvalido(f"Ordenação inválida. Disponíveis: {', '.join(ordenaveis)}")
+    return coluna, sort.startswith("-")
+
+
+def _limite(limit, cursor):
+    if not limit:
+        return LIMITE_PADRAO if cursor else None
+    try:
+        limite = int(limit)
+    except ValueError:
+        raise ParametroInvalido("limit deve ser um número inteiro")
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ParametroInvalido(f"limit deve estar entre 1 e {LIMITE_MAXIMO}")
+    return limite
+
+
+def _data(valor, parametro):
+    try:
+        return date.fromisoformat(valor).isoformat()
+    except ValueError:
+        raise ParametroInvalido(f"{parametro} deve estar no formato AAAA-MM-DD")
+
+
+def _literal(valor):
+    """Valor entre aspas para os filtros or=(...) do PostgREST."""
+    texto = str(valor).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{texto}"'
+
+
+def listar(tabela, colunas, ordenaveis, filtros=None, coluna_data=None):
+    """Lista os registros do usuário com os parâmetros da query string.
+
+    - fields: colunas retornadas, separadas por vírgula (padrão: todas)
+    - sort: coluna de `ordenaveis`, com "-" na frente para ordem decrescente
+    - limit/cursor: paginação keyset por (coluna de ordenação, id); o cursor
+      da próxima página vem no cabeçalho X-Next-Cursor. Sem limit nem cursor
+      todos os registros são retornados, como antes
+    - filtros: parâmetro -> conversor (ex: {"cilindro_id": int}), filtro de igualdade
+    - data_from/data_to: intervalo inclusivo sobre `coluna_data`
+
+    Todos os parâmetros viram filtros da consulta ao PostgREST.
+    """
+    args = request.args
+    try:
+        campos = _campos(args.get("fields"), colunas)
+        coluna_ordem, decrescente = _ordem(args.get("sort"), ordenaveis)
+        limite = _limite(args.get("limit"), args.get("cursor"))
+        ordem = f"-{coluna_ordem}" if decrescente else coluna_ordem
+        chave = decodificar_cursor(args["cursor"], ordem) if args.get("cursor") else None
+
+        # id e a coluna de ordenação são necessários para montar o próximo cursor
+        extras = [coluna for coluna in dict.fromkeys(("id", coluna_ordem)) if limite and coluna not in campos]
+        consulta = get_supabase().table(tabela).select(",".join(campos + extras)).eq("user_id", request.user_id)
+
+        for parametro, converter in (filtros or {}).items():
+            valor = args.get(parametro)
+            if valor is None:
+                continue
+            try:
+                consulta = consulta.eq(parametro, converter(valor))
+            except ValueError:
+                raise ParametroInvalido(f"Valor inválido para {parametro}")
+
+        if coluna_data:
+            if args.get("data_from"):
+                consulta = consulta.gte(coluna_data, _data(args["data_from"], "data_from"))
+            if args.get("data_to"):
+                consulta = consulta.lte(coluna_data, _data(args["data_to"], "data_to"))
+    except ParametroInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    if chave:
+        valor, id_ = chave
+        op = "lt" if decrescente else "gt"
+        if coluna_ordem == "id":
+            consulta = getattr(consulta, op)("id", id_)
+        else:
+            consulta = consulta.or_(
+                f"{coluna_ordem}.{op}.{_literal(valor)},and({coluna_ordem}.eq.{_literal(valor)},id.{op}.{id_})"
+            )
+
+    consulta = consulta.order(coluna_ordem, desc=decrescente)
+    if coluna_ordem != "id":
+        consulta = consulta.order("id", desc=decrescente)
+    if limite:
+        consulta = consulta.limit(limite + 1)
+
+    linhas = consulta.execute().data or []
+
+    headers = {}
+    if limite and len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        headers["X-Next-Cursor"] = codificar_cursor(ordem, ultima[coluna_ordem], ultima["id"])
+
+    if extras:
+        for linha in linhas:
+            for coluna in extras:
+                linha.pop(coluna, None)
+
+    return jsonify(linhas), 200, headers
@@ -0,0 +1,170 @@
+from flask import request, jsonify
+from postgrest.exceptions import APIError
+from utils.supabase import get_supabase
+from config import LOTE_MAXIMO
+
+
+def ler_lote():
+    """Itens do corpo da requisição; retorna (itens, None) ou (None, resposta 400)."""
+    itens = request.get_json(silent=True)
+    if not isinstance(itens, list) or not itens:
+        return None, (jsonify({"message": "O corpo deve ser uma lista JSON com ao menos um item"}), 400)
+    if len(itens) > LOTE_MAXIMO:
+        return None, (jsonify({"message": f"Máximo de {LOTE_MAXIMO} itens por lote"}), 400)
+    return itens, None
+
+
+def _id_item(item):
+    id_ = item.get("id") if isinstance(item, dict) else None
+    return id_ if isinstance(id_, int) and not isinstance(id_, bool) else None
+
+
+def ids_do_usuario(tabela, user_id, ids):
+    """Subconjunto de `ids` que pertence ao usuário, em uma consulta."""
+    ids = list({id_ for id_ in ids if isinstance(id_, int) and not isinstance(id_, bool)})
+    if not ids:
+        return set()
+    response = get_supabase().table(tabela).select("id").eq("user_id", user_id).in_("id", ids).execute()
+    return {linha["id"] for linha in response.data}
+
+
+def _gravar(tabela, linhas, atualizar, user_id):
+    """Grava as linhas em um comando; retorna as linhas gravadas, na ordem recebida (None se não gravada).
+
+    A atualização é a função atualizar_lote_<tabela> (database/functions.sql):
+    um UPDATE ... FROM jsonb_to_recordset filtrado por id e user_id, então um
+    registro excluído depois da validação não volta a existir; fica None.
+    """
+    supabase = get_supabase()
+    if not atualizar:
+        return supabase.table(tabela).insert(linhas).execute().data
+    response = supabase.rpc(f"atualizar_lote_{tabela}", {"p_user_id": user_id, "p_linhas": linhas}).execute()
+    por_id = {linha["id"]: linha for linha in response.data or []}
+    return [por_id.get(linha["id"]) for linha in linhas]
+
+
+def processar_lote(tabela, itens, montar, atualizar=False, coluna_unica=None, mensagem_duplicado=None):
+    """Valida cada item e grava os válidos em um único comando.
+
+    `montar(item, atual)` retorna (linha, erro); `atual` é o registro do
+    usuário com o id do item (atualização) ou None (criação). Na criação os
+    válidos vão em um INSERT de várias linhas; na atualização, em um UPDATE
+    filtrado por id e user_id (ver _gravar). Um id repetido no lote é
+    recusado em todas as ocorrências. `coluna_unica` (ex: "codigo") não pode
+    repetir entre os registros do usuário nem dentro do lote. Se o banco
+    recusar o comando por um erro de dados (ex: valor fora da precisão da
+    coluna), as linhas são gravadas uma a uma e só as inválidas ficam de fora.
+
+    Responde com o resultado de cada item, na ordem recebida: 201 (criação)
+    ou 200 (atualização) se todos foram gravados, 207 se só parte e 400 se
+    nenhum.
+    """
+    supabase = get_supabase()
+    user_id = request.user_id
+    erros = {}
+
+    atuais = {}
+    repetidos = set()
+    if atualizar:
+        ids = [id_ for id_ in map(_id_item, itens) if id_ is not None]
+        vistos = set()
+        for id_ in ids:
+            (repetidos if id_ in vistos else vistos).add(id_)
+        if ids:
+            response = supabase.table(tabela).select("*").eq("user_id", user_id).in_("id", list(set(ids))).execute()
+            atuais = {linha["id"]: linha for linha in response.data}
+
+    # Valor da coluna única -> id do registro do usuário que já o usa
+    em_uso = {}
+    if coluna_unica:
+        valores = list({item[coluna_unica] for item in itens
+                        if isinstance(item, dict) and isinstance(item.get(coluna_unica), str)})
+        if valores:
+            response = (
+                supabase.table(tabela)
+                .select(f"id,{coluna_unica}")
+                .eq("user_id", user_id)
+                .in_(coluna_unica, valores)
+                .execute()
+            )
+            em_uso = {linha[coluna_unica]: linha["id"] for linha in response.data}
+
+    validos = []
+    for indice, item in enumerate(itens):
+        atual = None
+        if atualizar:
+            id_ = _id_item(item)
+            if id_ is None:
+                erros[indice] = "id é obrigatório"
+                continue
+            if id_ in repetidos:
+                erros[indice] = "id repetido no lote"
+                continue
+            atual = atuais.get(id_)
+            if atual is None:
+                erros[indice] = "Registro não encontrado"
+                continue
+
+        linha, erro = montar(item, atual)
+        if not erro and coluna_unica:
+            dono = em_uso.get(linha[coluna_unica])
+            if dono is not None and dono != (atual or {}).get("id"):
+                erro = mensagem_duplicado or f"{coluna_unica} já existe"
+        if erro:
+            erros[indice] = erro
+            continue
+
+        if coluna_unica:
+            if atual and atual[coluna_unica] != linha[coluna_unica]:
+                em_uso.pop(atual[coluna_unica], None)
+            em_uso[linha[coluna_unica]] = (atual or {}).get("id", -1 - indice)
+        if atual:
+            linha["id"] = atual["id"]
+        linha["user_id"] = user_id
+        validos.append((indice, linha))
+
+    gravados = {}
+    if validos:
+        try:
+            resultado = _gravar(tabela, [linha for _, linha in validos], atualizar, user_id)
+        except APIError as e:
+            # Erros de dados (SQLSTATE 22xxx/23xxx) são de alguma linha: grava
+            # linha a linha para recusar só as inválidas
+            if not str(e.code or "").startswith(("22", "23")):
+                for indice, _ in validos:
+                    erros[indice] = f"Não gravado: {e.message}"
+                resultado = []
+            else:
+                resultado = []
+                for indice, linha in validos:
+                    try:
+                        resultado.extend(_gravar(tabela, [linha], atualizar, user_id))
+                    except APIError as erro:
+                        resultado.append(None)
+                        erros[indice] = f"Não gravado: {erro.message}"
+        for (indice, _), linha in zip(validos, resultado):
+            if linha is not None:
+                gravados[indice] = linha
+            elif indice not in erros:
+                erros[indice] = "Registro não encontrado"
+
+    resultados = []
+    for indice in range(len(itens)):
+        if indice in gravados:
+            resultados.append({"indice": indice, "status": "ok", "data": gravados[indice]})
+        else:
+            resultados.append({"indice": indice, "status": "erro", "message": erros[indice]})
+
+    if not gravados:
+        status = 400
+    elif erros:
+        status = 207
+    else:
+        status = 200 if atualizar else 201
+
+    return jsonify({
+        "message": f"{len(gravados)} de {len(itens)} itens gravados",
+        "gravados": len(gravados),
+        "erros": len(erros),
+        "resultados": resultados,
+    }), status
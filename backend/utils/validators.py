@@ -0,0 +1,30 @@
+from datetime import date
+
+
+def tempo_chama_para_segundos(tempo):
+    """Converte tempo de chama HH:MM:SS em segundos; retorna None se inválido."""
+    try:
+        horas, minutos, segundos = (int(parte) for parte in str(tempo).split(":"))
+    except (ValueError, TypeError):
+        return None
+    if horas < 0 or not 0 <= minutos < 60 or not 0 <= segundos < 60:
+        return None
+    return horas * 3600 + minutos * 60 + segundos
+
+
+def data_iso(valor):
+    """Data no formato AAAA-MM-DD; retorna None se inválida."""
+    try:
+        return date.fromisoformat(str(valor)).isoformat()
+    except ValueError:
+        return None
+
+
+def numero(valor):
+    """Número (int/float ou texto numérico); retorna None se inválido."""
+    if isinstance(valor, bool):
+        return None
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        return None
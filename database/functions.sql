@@ -0,0 +1,286 @@
+-- =====================================================
+-- FUNÇÕES (RPC) - LabGas Manager
+-- Chamadas pelo Flask via supabase.rpc()
+-- =====================================================
+
+-- =====================================================
+-- Dashboard: agregados de amostras por cilindro × elemento
+-- =====================================================
+
+-- Retorna uma linha por par (cilindro, elemento) do usuário com a soma de
+-- amostras e de segundos de chama. O dashboard deriva desses poucos grupos
+-- os totais por cilindro, por elemento, o consumo × tempo e a matriz de
+-- eficiência, sem baixar as linhas de amostra.
+CREATE OR REPLACE FUNCTION dashboard_agregados(p_user_id UUID)
+RETURNS TABLE (
+    cilindro_id INTEGER,
+    elemento_id INTEGER,
+    quantidade BIGINT,
+    segundos_chama BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        a.cilindro_id,
+        a.elemento_id,
+        SUM(COALESCE(a.quantidade_amostras, 1))::BIGINT AS quantidade,
+        COALESCE(SUM(a.tempo_chama_segundos), 0)::BIGINT AS segundos_chama
+    FROM amostra a
+    WHERE a.user_id = p_user_id
+    GROUP BY a.cilindro_id, a.elemento_id;
+$$;
+
+
+-- =====================================================
+-- Exclusão em lote: amostras vinculadas por cilindro ou elemento
+-- =====================================================
+
+-- Conta, em uma única consulta, as amostras que referenciam cada um dos IDs
+-- informados. p_coluna indica a referência: 'cilindro_id' ou 'elemento_id'.
+-- Só retorna IDs que possuem amostras. Lê os contadores mantidos por trigger
+-- (cilindro_stats/elemento_stats) em vez de contar as amostras.
+CREATE OR REPLACE FUNCTION contar_amostras_vinculadas(p_coluna TEXT, p_ids INTEGER[])
+RETURNS TABLE (
+    referencia_id INTEGER,
+    total BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT cilindro_id, amostras::BIGINT FROM cilindro_stats
+    WHERE p_coluna = 'cilindro_id' AND cilindro_id = ANY(p_ids) AND amostras > 0
+    UNION ALL
+    SELECT elemento_id, amostras::BIGINT FROM elemento_stats
+    WHERE p_coluna = 'elemento_id' AND elemento_id = ANY(p_ids) AND amostras > 0;
+$$;
+
+
+-- =====================================================
+-- Painel admin: registros por usuário
+-- =====================================================
+
+-- Retorna (user_id, tabela, total) para os usuários informados (a página
+-- atual do painel), lidos dos contadores de user_stats. Tabelas sem
+-- registros do usuário não aparecem.
+CREATE OR REPLACE FUNCTION contagens_usuarios(p_user_ids UUID[])
+RETURNS TABLE (
+    user_id UUID,
+    tabela TEXT,
+    total BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT s.user_id, c.tabela, c.total
+    FROM user_stats s
+    CROSS JOIN LATERAL (VALUES
+        ('cilindro', s.cilindros::BIGINT),
+        ('elemento', s.elementos::BIGINT),
+        ('amostra', s.amostras::BIGINT),
+        ('pressao', s.pressoes::BIGINT)
+    ) AS c(tabela, total)
+    WHERE s.user_id = ANY(p_user_ids) AND c.total > 0;
+$$;
+
+-- =====================================================
+-- Login: perfil criado (se faltar) e retornado em uma chamada
+-- =====================================================
+
+-- Cria o perfil do usuário na primeira entrada e retorna as colunas que o
+-- Flask guarda em cache (COLUNAS_PERFIL), com criado = true quando o
+-- perfil acabou de ser inserido. Um perfil existente não é alterado.
+CREATE OR REPLACE FUNCTION entrar_perfil(
+    p_id UUID,
+    p_email TEXT,
+    p_nome TEXT,
+    p_habilitar_abas JSONB
+)
+RETURNS TABLE (
+    id UUID,
+    role VARCHAR,
+    nome VARCHAR,
+    ativo BOOLEAN,
+    habilitar_abas JSONB,
+    versao INTEGER,
+    criado BOOLEAN
+)
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH novo AS (
+        INSERT INTO perfil (id, role, ativo, nome, email, habilitar_abas)
+        VALUES (p_id, 'usuario', true, p_nome, p_email, p_habilitar_abas)
+        ON CONFLICT (id) DO NOTHING
+        RETURNING perfil.id, perfil.role, perfil.nome, perfil.ativo, perfil.habilitar_abas, perfil.versao
+    )
+    SELECT n.id, n.role, n.nome, n.ativo, n.habilitar_abas, n.versao, true FROM novo n
+    UNION ALL
+    SELECT p.id, p.role, p.nome, p.ativo, p.habilitar_abas, p.versao, false
+    FROM perfil p
+    WHERE p.id = p_id AND NOT EXISTS (SELECT 1 FROM novo);
+$$;
+
+-- =====================================================
+-- API REST: atualização em lote (PUT /api/<recurso>/lote)
+-- =====================================================
+
+-- Aplicam as linhas já validadas pelo Flask (p_linhas: array JSON com o id
+-- e todas as colunas editáveis) em um único UPDATE. O filtro por user_id
+-- está no próprio UPDATE: um id de outro usuário, ou excluído depois da
+-- validação, não é alterado nem recriado e simplesmente não volta no
+-- resultado. Retornam as linhas atualizadas.
+CREATE OR REPLACE FUNCTION atualizar_lote_cilindro(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF cilindro
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE cilindro c SET
+        codigo = x.codigo,
+        data_compra = x.data_compra,
+        data_inicio_consumo = x.data_inicio_consumo,
+        data_fim = x.data_fim,
+        gas_kg = x.gas_kg,
+        litros_equivalentes = x.litros_equivalentes,
+        custo = x.custo,
+        status = x.status
+    FROM jsonb_to_recordset(p_linhas) AS x(
+        id INTEGER, codigo VARCHAR, data_compra DATE, data_inicio_consumo DATE, data_fim DATE,
+        gas_kg NUMERIC, litros_equivalentes NUMERIC, custo NUMERIC, status VARCHAR
+    )
+    WHERE c.id = x.id AND c.user_id = p_user_id
+    RETURNING c.*;
+$$;
+
+CREATE OR REPLACE FUNCTION atualizar_lote_elemento(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF elemento
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE elemento e SET
+        nome = x.nome,
+        consumo_lpm = x.consumo_lpm
+    FROM jsonb_to_recordset(p_linhas) AS x(id INTEGER, nome VARCHAR, consumo_lpm NUMERIC)
+    WHERE e.id = x.id AND e.user_id = p_user_id
+    RETURNING e.*;
+$$;
+
+CREATE OR REPLACE FUNCTION atualizar_lote_amostra(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF amostra
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE amostra a SET
+        data = x.data,
+        tempo_chama = x.tempo_chama,
+        tempo_chama_segundos = x.tempo_chama_segundos,
+        cilindro_id = x.cilindro_id,
+        elemento_id = x.elemento_id,
+        quantidade_amostras = x.quantidade_amostras
+    FROM jsonb_to_recordset(p_linhas) AS x(
+        id INTEGER, data DATE, tempo_chama VARCHAR, tempo_chama_segundos INTEGER,
+        cilindro_id INTEGER, elemento_id INTEGER, quantidade_amostras INTEGER
+    )
+    WHERE a.id = x.id AND a.user_id = p_user_id
+    RETURNING a.*;
+$$;
+
+-- =====================================================
+-- API REST: exclusão (DELETE /api/<recurso>/<id>)
+-- =====================================================
+
+-- Excluem o registro do usuário em uma chamada. Uma linha de resultado:
+-- situacao 'excluido', ou 'com_amostras' se houver amostras vinculadas (o
+-- cilindro/elemento não é excluído: a cascata apagaria as amostras sem
+-- registro no histórico); nome é o usado no histórico. Sem linhas: o
+-- registro não existe ou não é do usuário. A exclusão registra no
+-- historico_log, na mesma transação, o tombstone (registro_id) lido pela
+-- exportação incremental.
+-- O SELECT ... FOR UPDATE trava o registro antes de procurar amostras: um
+-- INSERT de amostra que o referencie espera esta transação (a FK trava a
+-- linha referenciada), então nenhuma amostra entra entre a verificação e
+-- o DELETE.
+CREATE OR REPLACE FUNCTION excluir_cilindro(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_codigo TEXT;
+BEGIN
+    SELECT c.codigo INTO v_codigo FROM cilindro c
+    WHERE c.id = p_id AND c.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM amostra a WHERE a.cilindro_id = p_id) THEN
+        RETURN QUERY SELECT 'com_amostras'::TEXT, v_codigo;
+        RETURN;
+    END IF;
+    DELETE FROM cilindro c WHERE c.id = p_id;
+    INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+    VALUES ('cilindro', 'excluido', v_codigo, p_user_id, p_id);
+    RETURN QUERY SELECT 'excluido'::TEXT, v_codigo;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION excluir_elemento(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_nome TEXT;
+BEGIN
+    SELECT e.nome INTO v_nome FROM elemento e
+    WHERE e.id = p_id AND e.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM amostra a WHERE a.elemento_id = p_id) THEN
+        RETURN QUERY SELECT 'com_amostras'::TEXT, v_nome;
+        RETURN;
+    END IF;
+    DELETE FROM elemento e WHERE e.id = p_id;
+    INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+    VALUES ('elemento', 'excluido', v_nome, p_user_id, p_id);
+    RETURN QUERY SELECT 'excluido'::TEXT, v_nome;
+END;
+$$;
+
+-- Nome no formato do frontend: "<codigo do cilindro> - <nome do elemento>"
+CREATE OR REPLACE FUNCTION excluir_amostra(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH excluida AS (
+        DELETE FROM amostra a
+        WHERE a.id = p_id AND a.user_id = p_user_id
+        RETURNING a.id, a.cilindro_id, a.elemento_id
+    ),
+    nomeada AS (
+        SELECT x.id, LEFT(COALESCE(c.codigo, 'N/A') || ' - ' || COALESCE(e.nome, 'N/A'), 100) AS nome
+        FROM excluida x
+        LEFT JOIN cilindro c ON c.id = x.cilindro_id
+        LEFT JOIN elemento e ON e.id = x.elemento_id
+    ),
+    registro AS (
+        INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+        SELECT 'amostra', 'excluido', n.nome, p_user_id, n.id FROM nomeada n
+    )
+    SELECT 'excluido'::TEXT, n.nome FROM nomeada n;
+$$;
+
+-- SECURITY DEFINER com p_user_id: só o backend (service_role) pode chamar
+REVOKE EXECUTE ON FUNCTION excluir_cilindro(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION excluir_elemento(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION excluir_amostra(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION excluir_cilindro(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION excluir_elemento(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION excluir_amostra(UUID, INTEGER) TO service_role;
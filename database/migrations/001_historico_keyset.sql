@@ -0,0 +1,13 @@
+-- =====================================================
+-- MIGRAÇÃO 001 - Paginação keyset do histórico
+-- =====================================================
+
+-- A listagem do histórico pagina por (created_at, id) em ordem
+-- decrescente; estes índices atendem a ordenação e o filtro por cursor
+-- sem varrer as páginas anteriores.
+
+CREATE INDEX IF NOT EXISTS idx_historico_log_created_at_id
+    ON historico_log(created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_historico_log_user_created_at_id
+    ON historico_log(user_id, created_at DESC, id DESC);
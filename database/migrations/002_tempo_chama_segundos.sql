@@ -0,0 +1,29 @@
+-- =====================================================
+-- MIGRAÇÃO 002 - Tempo de chama em segundos
+-- =====================================================
+
+-- tempo_chama continua como texto HH:MM:SS para exibição; a nova coluna
+-- guarda a mesma duração em segundos para somas diretas no banco.
+-- O Flask (amostra.list) e a API (backend/routes/amostra.py) preenchem
+-- as duas colunas em todo insert/update.
+
+ALTER TABLE amostra ADD COLUMN IF NOT EXISTS tempo_chama_segundos INTEGER;
+
+-- Backfill: valores fora do formato HH:MM:SS contam como 0,
+-- como já acontecia no cálculo do dashboard
+UPDATE amostra
+SET tempo_chama_segundos = CASE
+    WHEN tempo_chama ~ '^\d+:\d+:\d+$' THEN
+        split_part(tempo_chama, ':', 1)::INTEGER * 3600
+        + split_part(tempo_chama, ':', 2)::INTEGER * 60
+        + split_part(tempo_chama, ':', 3)::INTEGER
+    ELSE 0 END
+WHERE tempo_chama_segundos IS NULL;
+
+ALTER TABLE amostra ALTER COLUMN tempo_chama_segundos SET DEFAULT 0;
+ALTER TABLE amostra ALTER COLUMN tempo_chama_segundos SET NOT NULL;
+ALTER TABLE amostra ADD CONSTRAINT amostra_tempo_chama_segundos_check CHECK (tempo_chama_segundos >= 0);
+
+-- O tipo de retorno de dashboard_agregados mudou (minutos_chama -> segundos_chama);
+-- remova a versão antiga e execute database/functions.sql novamente
+DROP FUNCTION IF EXISTS dashboard_agregados(UUID);
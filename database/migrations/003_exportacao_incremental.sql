@@ -0,0 +1,59 @@
+-- =====================================================
+-- MIGRAÇÃO 003 - Exportação incremental (delta)
+-- =====================================================
+
+-- updated_at marca a última alteração de cada registro; a exportação
+-- incremental (admin.export_data com since/cursor) envia apenas as linhas
+-- com updated_at a partir da marca anterior.
+
+CREATE OR REPLACE FUNCTION definir_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+ALTER TABLE cilindro ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE elemento ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE amostra ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE pressao ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+UPDATE cilindro SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE elemento SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE amostra SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE pressao SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+
+ALTER TABLE cilindro ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE elemento ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE amostra ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE pressao ALTER COLUMN updated_at SET DEFAULT NOW();
+
+ALTER TABLE cilindro ALTER COLUMN updated_at SET NOT NULL;
+ALTER TABLE elemento ALTER COLUMN updated_at SET NOT NULL;
+ALTER TABLE amostra ALTER COLUMN updated_at SET NOT NULL;
+ALTER TABLE pressao ALTER COLUMN updated_at SET NOT NULL;
+
+DROP TRIGGER IF EXISTS trg_cilindro_updated_at ON cilindro;
+DROP TRIGGER IF EXISTS trg_elemento_updated_at ON elemento;
+DROP TRIGGER IF EXISTS trg_amostra_updated_at ON amostra;
+DROP TRIGGER IF EXISTS trg_pressao_updated_at ON pressao;
+
+CREATE TRIGGER trg_cilindro_updated_at BEFORE UPDATE ON cilindro FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_elemento_updated_at BEFORE UPDATE ON elemento FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_amostra_updated_at BEFORE UPDATE ON amostra FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_pressao_updated_at BEFORE UPDATE ON pressao FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_cilindro_updated_at_id ON cilindro(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_elemento_updated_at_id ON elemento(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_amostra_updated_at_id ON amostra(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_pressao_updated_at_id ON pressao(updated_at, id);
+
+-- Exclusões viram "tombstones" a partir do histórico: o Flask grava o ID do
+-- registro excluído em registro_id (registros anteriores ficam NULL)
+ALTER TABLE historico_log ADD COLUMN IF NOT EXISTS registro_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_historico_log_exclusoes ON historico_log(id)
+    WHERE acao = 'excluido' AND registro_id IS NOT NULL;
@@ -0,0 +1,187 @@
+-- =====================================================
+-- MIGRAÇÃO 004 - Contadores por usuário, cilindro e elemento
+-- =====================================================
+
+-- Perfil, painel admin, dados do usuário e a verificação de amostras
+-- vinculadas antes de excluir cilindro/elemento leem estes contadores em
+-- vez de contar (ou baixar) as linhas das tabelas.
+
+-- Tabela: user_stats (contadores por usuário, mantidos por triggers)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    cilindros INTEGER NOT NULL DEFAULT 0,
+    elementos INTEGER NOT NULL DEFAULT 0,
+    amostras INTEGER NOT NULL DEFAULT 0,
+    pressoes INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Tabela: cilindro_stats (amostras por cilindro, mantida por trigger)
+CREATE TABLE IF NOT EXISTS cilindro_stats (
+    cilindro_id INTEGER PRIMARY KEY REFERENCES cilindro(id) ON DELETE CASCADE,
+    amostras INTEGER NOT NULL DEFAULT 0
+);
+
+-- Tabela: elemento_stats (amostras por elemento, mantida por trigger)
+CREATE TABLE IF NOT EXISTS elemento_stats (
+    elemento_id INTEGER PRIMARY KEY REFERENCES elemento(id) ON DELETE CASCADE,
+    amostras INTEGER NOT NULL DEFAULT 0
+);
+
+-- Contadores (user_stats, cilindro_stats, elemento_stats): um trigger por
+-- comando (não por linha) soma as linhas inseridas e subtrai as excluídas,
+-- agrupadas por usuário/cilindro/elemento, em um upsert por tabela de
+-- contadores. Atualizações só mudam contadores se trocarem a referência.
+CREATE OR REPLACE FUNCTION atualizar_contadores()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    fonte TEXT;
+    coluna TEXT;
+BEGIN
+    fonte := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS delta FROM novas'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS delta FROM antigas'
+        ELSE 'SELECT *, 1 AS delta FROM novas UNION ALL SELECT *, -1 AS delta FROM antigas'
+    END;
+    coluna := CASE TG_TABLE_NAME
+        WHEN 'cilindro' THEN 'cilindros'
+        WHEN 'elemento' THEN 'elementos'
+        WHEN 'amostra' THEN 'amostras'
+        WHEN 'pressao' THEN 'pressoes'
+    END;
+
+    EXECUTE format(
+        'INSERT INTO user_stats AS s (user_id, %1$I)
+         SELECT user_id, SUM(delta) FROM (%2$s) m
+         WHERE user_id IS NOT NULL GROUP BY user_id HAVING SUM(delta) <> 0
+         ON CONFLICT (user_id) DO UPDATE SET %1$I = s.%1$I + EXCLUDED.%1$I, atualizado_em = NOW()',
+        coluna, fonte
+    );
+
+    IF TG_TABLE_NAME = 'amostra' THEN
+        -- O JOIN ignora cilindros/elementos excluídos no mesmo comando
+        -- (amostras removidas em cascata): o contador deles já foi removido
+        EXECUTE format(
+            'INSERT INTO cilindro_stats AS s (cilindro_id, amostras)
+             SELECT m.cilindro_id, SUM(m.delta) FROM (%s) m JOIN cilindro c ON c.id = m.cilindro_id
+             GROUP BY m.cilindro_id HAVING SUM(m.delta) <> 0
+             ON CONFLICT (cilindro_id) DO UPDATE SET amostras = s.amostras + EXCLUDED.amostras',
+            fonte
+        );
+        EXECUTE format(
+            'INSERT INTO elemento_stats AS s (elemento_id, amostras)
+             SELECT m.elemento_id, SUM(m.delta) FROM (%s) m JOIN elemento e ON e.id = m.elemento_id
+             GROUP BY m.elemento_id HAVING SUM(m.delta) <> 0
+             ON CONFLICT (elemento_id) DO UPDATE SET amostras = s.amostras + EXCLUDED.amostras',
+            fonte
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+-- Recalcula todos os contadores a partir das tabelas (carga inicial ou
+-- correção). Bloqueia escritas nas tabelas contadas enquanto executa.
+CREATE OR REPLACE FUNCTION recalcular_contadores()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    LOCK TABLE cilindro, elemento, amostra, pressao IN SHARE MODE;
+
+    DELETE FROM user_stats;
+    INSERT INTO user_stats (user_id, cilindros, elementos, amostras, pressoes)
+    SELECT user_id, SUM(c), SUM(e), SUM(a), SUM(p)
+    FROM (
+        SELECT user_id, 1 AS c, 0 AS e, 0 AS a, 0 AS p FROM cilindro
+        UNION ALL SELECT user_id, 0, 1, 0, 0 FROM elemento
+        UNION ALL SELECT user_id, 0, 0, 1, 0 FROM amostra
+        UNION ALL SELECT user_id, 0, 0, 0, 1 FROM pressao
+    ) t
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id;
+
+    DELETE FROM cilindro_stats;
+    INSERT INTO cilindro_stats (cilindro_id, amostras)
+    SELECT cilindro_id, COUNT(*) FROM amostra WHERE cilindro_id IS NOT NULL GROUP BY cilindro_id;
+
+    DELETE FROM elemento_stats;
+    INSERT INTO elemento_stats (elemento_id, amostras)
+    SELECT elemento_id, COUNT(*) FROM amostra WHERE elemento_id IS NOT NULL GROUP BY elemento_id;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_cilindro_contadores_ins ON cilindro;
+DROP TRIGGER IF EXISTS trg_cilindro_contadores_upd ON cilindro;
+DROP TRIGGER IF EXISTS trg_cilindro_contadores_del ON cilindro;
+DROP TRIGGER IF EXISTS trg_elemento_contadores_ins ON elemento;
+DROP TRIGGER IF EXISTS trg_elemento_contadores_upd ON elemento;
+DROP TRIGGER IF EXISTS trg_elemento_contadores_del ON elemento;
+DROP TRIGGER IF EXISTS trg_amostra_contadores_ins ON amostra;
+DROP TRIGGER IF EXISTS trg_amostra_contadores_upd ON amostra;
+DROP TRIGGER IF EXISTS trg_amostra_contadores_del ON amostra;
+DROP TRIGGER IF EXISTS trg_pressao_contadores_ins ON pressao;
+DROP TRIGGER IF EXISTS trg_pressao_contadores_upd ON pressao;
+DROP TRIGGER IF EXISTS trg_pressao_contadores_del ON pressao;
+
+CREATE TRIGGER trg_cilindro_contadores_ins AFTER INSERT ON cilindro REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_cilindro_contadores_upd AFTER UPDATE ON cilindro REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_cilindro_contadores_del AFTER DELETE ON cilindro REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_ins AFTER INSERT ON elemento REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_upd AFTER UPDATE ON elemento REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_del AFTER DELETE ON elemento REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_ins AFTER INSERT ON amostra REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_upd AFTER UPDATE ON amostra REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_del AFTER DELETE ON amostra REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_ins AFTER INSERT ON pressao REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_upd AFTER UPDATE ON pressao REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_del AFTER DELETE ON pressao REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+
+-- Carga inicial
+SELECT recalcular_contadores();
+
+-- Conta, em uma única consulta, as amostras que referenciam cada um dos IDs
+-- informados. p_coluna indica a referência: 'cilindro_id' ou 'elemento_id'.
+-- Só retorna IDs que possuem amostras. Lê os contadores mantidos por trigger
+-- (cilindro_stats/elemento_stats) em vez de contar as amostras.
+CREATE OR REPLACE FUNCTION contar_amostras_vinculadas(p_coluna TEXT, p_ids INTEGER[])
+RETURNS TABLE (
+    referencia_id INTEGER,
+    total BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT cilindro_id, amostras::BIGINT FROM cilindro_stats
+    WHERE p_coluna = 'cilindro_id' AND cilindro_id = ANY(p_ids) AND amostras > 0
+    UNION ALL
+    SELECT elemento_id, amostras::BIGINT FROM elemento_stats
+    WHERE p_coluna = 'elemento_id' AND elemento_id = ANY(p_ids) AND amostras > 0;
+$$;
+
+-- =====================================================
+-- Contadores: user_stats, cilindro_stats, elemento_stats
+-- =====================================================
+
+-- Escritos apenas pelos triggers (SECURITY DEFINER)
+ALTER TABLE user_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cilindro_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE elemento_stats ENABLE ROW LEVEL SECURITY;
+
+-- SELECT: Apenas próprio usuário vê seus contadores
+CREATE POLICY "Users can view own user_stats" ON user_stats
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- SELECT: Qualquer usuário pode visualizar (como cilindro e elemento)
+CREATE POLICY "Anyone can view cilindro_stats" ON cilindro_stats
+    FOR SELECT USING (true);
+
+CREATE POLICY "Anyone can view elemento_stats" ON elemento_stats
+    FOR SELECT USING (true);
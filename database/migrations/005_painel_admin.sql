@@ -0,0 +1,28 @@
+-- =====================================================
+-- MIGRAÇÃO 005 - Painel admin paginado
+-- =====================================================
+
+-- O painel lista os perfis em páginas ordenadas por nome (busca por nome
+-- ou email) e busca os contadores só dos usuários da página.
+
+CREATE INDEX IF NOT EXISTS idx_perfil_nome_email_id ON perfil(nome, email, id);
+
+CREATE OR REPLACE FUNCTION contagens_usuarios(p_user_ids UUID[])
+RETURNS TABLE (
+    user_id UUID,
+    tabela TEXT,
+    total BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT s.user_id, c.tabela, c.total
+    FROM user_stats s
+    CROSS JOIN LATERAL (VALUES
+        ('cilindro', s.cilindros::BIGINT),
+        ('elemento', s.elementos::BIGINT),
+        ('amostra', s.amostras::BIGINT),
+        ('pressao', s.pressoes::BIGINT)
+    ) AS c(tabela, total)
+    WHERE s.user_id = ANY(p_user_ids) AND c.total > 0;
+$$;
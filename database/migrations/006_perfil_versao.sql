@@ -0,0 +1,25 @@
+-- =====================================================
+-- MIGRAÇÃO 006 - Versão do perfil (cache de permissões)
+-- =====================================================
+
+-- O Flask guarda role, nome, ativo e habilitar_abas em cache. versao é
+-- incrementada a cada alteração desses campos; o cache nunca troca uma
+-- versão mais nova por uma mais antiga.
+
+ALTER TABLE perfil ADD COLUMN IF NOT EXISTS versao INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION incrementar_versao_perfil()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF (NEW.role, NEW.ativo, NEW.nome, NEW.habilitar_abas)
+        IS DISTINCT FROM (OLD.role, OLD.ativo, OLD.nome, OLD.habilitar_abas) THEN
+        NEW.versao := OLD.versao + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_perfil_versao ON perfil;
+CREATE TRIGGER trg_perfil_versao BEFORE UPDATE ON perfil FOR EACH ROW EXECUTE FUNCTION incrementar_versao_perfil();
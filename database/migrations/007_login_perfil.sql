@@ -0,0 +1,38 @@
+-- =====================================================
+-- MIGRAÇÃO 007 - Login em uma única chamada ao perfil
+-- =====================================================
+
+-- O login lia o perfil para checar se o usuário está ativo, lia de novo
+-- para ver se existia e, na primeira entrada, o inseria. entrar_perfil
+-- faz tudo em uma chamada e o resultado alimenta o cache do perfil.
+
+CREATE OR REPLACE FUNCTION entrar_perfil(
+    p_id UUID,
+    p_email TEXT,
+    p_nome TEXT,
+    p_habilitar_abas JSONB
+)
+RETURNS TABLE (
+    id UUID,
+    role VARCHAR,
+    nome VARCHAR,
+    ativo BOOLEAN,
+    habilitar_abas JSONB,
+    versao INTEGER,
+    criado BOOLEAN
+)
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH novo AS (
+        INSERT INTO perfil (id, role, ativo, nome, email, habilitar_abas)
+        VALUES (p_id, 'usuario', true, p_nome, p_email, p_habilitar_abas)
+        ON CONFLICT (id) DO NOTHING
+        RETURNING perfil.id, perfil.role, perfil.nome, perfil.ativo, perfil.habilitar_abas, perfil.versao
+    )
+    SELECT n.id, n.role, n.nome, n.ativo, n.habilitar_abas, n.versao, true FROM novo n
+    UNION ALL
+    SELECT p.id, p.role, p.nome, p.ativo, p.habilitar_abas, p.versao, false
+    FROM perfil p
+    WHERE p.id = p_id AND NOT EXISTS (SELECT 1 FROM novo);
+$$;
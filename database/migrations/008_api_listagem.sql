@@ -0,0 +1,10 @@
+-- =====================================================
+-- MIGRAÇÃO 008 - Listagens paginadas da API (backend/)
+-- =====================================================
+
+-- A API lista registros do usuário filtrando por intervalo de datas e
+-- paginando por (data, id); esses índices atendem filtro e ordenação
+-- juntos, sem ordenar todas as linhas do usuário a cada página.
+
+CREATE INDEX IF NOT EXISTS idx_amostra_user_data_id ON amostra(user_id, data, id);
+CREATE INDEX IF NOT EXISTS idx_cilindro_user_data_compra_id ON cilindro(user_id, data_compra, id);
@@ -0,0 +1,16 @@
+-- =====================================================
+-- MIGRAÇÃO 009 - updated_at no perfil
+-- =====================================================
+
+-- A versão dos dados usada pelo cache de exportações (frontend/utils/
+-- tarefas_exportacao.py) é o maior updated_at e o total de linhas de cada
+-- tabela exportada; o perfil (email e nome vão na exportação) também
+-- precisa marcar suas alterações.
+
+ALTER TABLE perfil ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+UPDATE perfil SET updated_at = COALESCE(criado_em, NOW()) WHERE updated_at IS NULL;
+ALTER TABLE perfil ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE perfil ALTER COLUMN updated_at SET NOT NULL;
+
+DROP TRIGGER IF EXISTS trg_perfil_updated_at ON perfil;
+CREATE TRIGGER trg_perfil_updated_at BEFORE UPDATE ON perfil FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
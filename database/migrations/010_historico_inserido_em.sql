@@ -0,0 +1,15 @@
+-- =====================================================
+-- MIGRAÇÃO 010 - Momento de gravação do histórico
+-- =====================================================
+
+-- created_at do historico_log é a data do evento, definida pelo Flask (e
+-- mantida quando um evento pendente é regravado mais tarde). inserido_em é
+-- o momento em que a linha entrou no banco; a exportação incremental só
+-- avança a marca das exclusões até linhas gravadas há mais de
+-- EXPORT_DELTA_ATRASO_S segundos, para não passar à frente de transações
+-- ainda não confirmadas.
+
+ALTER TABLE historico_log ADD COLUMN IF NOT EXISTS inserido_em TIMESTAMP;
+UPDATE historico_log SET inserido_em = COALESCE(created_at, NOW()) WHERE inserido_em IS NULL;
+ALTER TABLE historico_log ALTER COLUMN inserido_em SET DEFAULT (clock_timestamp() AT TIME ZONE 'UTC');
+ALTER TABLE historico_log ALTER COLUMN inserido_em SET NOT NULL;
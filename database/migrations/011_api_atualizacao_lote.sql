@@ -0,0 +1,62 @@
+-- =====================================================
+-- MIGRAÇÃO 011 - Atualização em lote da API sem upsert
+-- =====================================================
+
+-- PUT /lote verificava a posse com um select e gravava com um upsert por
+-- id; um registro excluído entre os dois era inserido de novo. As funções
+-- abaixo fazem a atualização em um UPDATE filtrado por id e user_id.
+
+CREATE OR REPLACE FUNCTION atualizar_lote_cilindro(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF cilindro
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE cilindro c SET
+        codigo = x.codigo,
+        data_compra = x.data_compra,
+        data_inicio_consumo = x.data_inicio_consumo,
+        data_fim = x.data_fim,
+        gas_kg = x.gas_kg,
+        litros_equivalentes = x.litros_equivalentes,
+        custo = x.custo,
+        status = x.status
+    FROM jsonb_to_recordset(p_linhas) AS x(
+        id INTEGER, codigo VARCHAR, data_compra DATE, data_inicio_consumo DATE, data_fim DATE,
+        gas_kg NUMERIC, litros_equivalentes NUMERIC, custo NUMERIC, status VARCHAR
+    )
+    WHERE c.id = x.id AND c.user_id = p_user_id
+    RETURNING c.*;
+$$;
+
+CREATE OR REPLACE FUNCTION atualizar_lote_elemento(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF elemento
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE elemento e SET
+        nome = x.nome,
+        consumo_lpm = x.consumo_lpm
+    FROM jsonb_to_recordset(p_linhas) AS x(id INTEGER, nome VARCHAR, consumo_lpm NUMERIC)
+    WHERE e.id = x.id AND e.user_id = p_user_id
+    RETURNING e.*;
+$$;
+
+CREATE OR REPLACE FUNCTION atualizar_lote_amostra(p_user_id UUID, p_linhas JSONB)
+RETURNS SETOF amostra
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE amostra a SET
+        data = x.data,
+        tempo_chama = x.tempo_chama,
+        tempo_chama_segundos = x.tempo_chama_segundos,
+        cilindro_id = x.cilindro_id,
+        elemento_id = x.elemento_id,
+        quantidade_amostras = x.quantidade_amostras
+    FROM jsonb_to_recordset(p_linhas) AS x(
+        id INTEGER, data DATE, tempo_chama VARCHAR, tempo_chama_segundos INTEGER,
+        cilindro_id INTEGER, elemento_id INTEGER, quantidade_amostras INTEGER
+    )
+    WHERE a.id = x.id AND a.user_id = p_user_id
+    RETURNING a.*;
+$$;
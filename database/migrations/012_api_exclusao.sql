@@ -0,0 +1,105 @@
+-- =====================================================
+-- MIGRAÇÃO 012 - Exclusão pela API em uma chamada
+-- =====================================================
+
+-- DELETE na API verificava o registro, lia o contador de amostras e só
+-- então excluía, em consultas separadas: uma amostra criada no meio era
+-- apagada pela cascata, e o tombstone no historico_log era gravado depois,
+-- em outra requisição. As funções abaixo fazem a verificação, a exclusão e
+-- o registro no histórico em uma transação.
+
+-- Excluem o registro do usuário em uma chamada. Uma linha de resultado:
+-- situacao 'excluido', ou 'com_amostras' se houver amostras vinculadas (o
+-- cilindro/elemento não é excluído: a cascata apagaria as amostras sem
+-- registro no histórico); nome é o usado no histórico. Sem linhas: o
+-- registro não existe ou não é do usuário. A exclusão registra no
+-- historico_log, na mesma transação, o tombstone (registro_id) lido pela
+-- exportação incremental.
+-- O SELECT ... FOR UPDATE trava o registro antes de procurar amostras: um
+-- INSERT de amostra que o referencie espera esta transação (a FK trava a
+-- linha referenciada), então nenhuma amostra entra entre a verificação e
+-- o DELETE.
+CREATE OR REPLACE FUNCTION excluir_cilindro(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_codigo TEXT;
+BEGIN
+    SELECT c.codigo INTO v_codigo FROM cilindro c
+    WHERE c.id = p_id AND c.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM amostra a WHERE a.cilindro_id = p_id) THEN
+        RETURN QUERY SELECT 'com_amostras'::TEXT, v_codigo;
+        RETURN;
+    END IF;
+    DELETE FROM cilindro c WHERE c.id = p_id;
+    INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+    VALUES ('cilindro', 'excluido', v_codigo, p_user_id, p_id);
+    RETURN QUERY SELECT 'excluido'::TEXT, v_codigo;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION excluir_elemento(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_nome TEXT;
+BEGIN
+    SELECT e.nome INTO v_nome FROM elemento e
+    WHERE e.id = p_id AND e.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM amostra a WHERE a.elemento_id = p_id) THEN
+        RETURN QUERY SELECT 'com_amostras'::TEXT, v_nome;
+        RETURN;
+    END IF;
+    DELETE FROM elemento e WHERE e.id = p_id;
+    INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+    VALUES ('elemento', 'excluido', v_nome, p_user_id, p_id);
+    RETURN QUERY SELECT 'excluido'::TEXT, v_nome;
+END;
+$$;
+
+-- Nome no formato do frontend: "<codigo do cilindro> - <nome do elemento>"
+CREATE OR REPLACE FUNCTION excluir_amostra(p_user_id UUID, p_id INTEGER)
+RETURNS TABLE (situacao TEXT, nome TEXT)
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH excluida AS (
+        DELETE FROM amostra a
+        WHERE a.id = p_id AND a.user_id = p_user_id
+        RETURNING a.id, a.cilindro_id, a.elemento_id
+    ),
+    nomeada AS (
+        SELECT x.id, LEFT(COALESCE(c.codigo, 'N/A') || ' - ' || COALESCE(e.nome, 'N/A'), 100) AS nome
+        FROM excluida x
+        LEFT JOIN cilindro c ON c.id = x.cilindro_id
+        LEFT JOIN elemento e ON e.id = x.elemento_id
+    ),
+    registro AS (
+        INSERT INTO historico_log (tipo, acao, nome, user_id, registro_id)
+        SELECT 'amostra', 'excluido', n.nome, p_user_id, n.id FROM nomeada n
+    )
+    SELECT 'excluido'::TEXT, n.nome FROM nomeada n;
+$$;
+
+-- SECURITY DEFINER com p_user_id: só o backend (service_role) pode chamar
+REVOKE EXECUTE ON FUNCTION excluir_cilindro(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION excluir_elemento(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION excluir_amostra(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION excluir_cilindro(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION excluir_elemento(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION excluir_amostra(UUID, INTEGER) TO service_role;
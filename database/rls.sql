@@ -108,3 +108,23 @@ CREATE POLICY "Users can view historico_log" ON historico_log
 
 -- Nota: INSERT/UPDATE/DELETE são feitos via service_role (admin)
 -- para permitir registro de histórico de qualquer usuário
+
+-- =====================================================
+-- Contadores: user_stats, cilindro_stats, elemento_stats
+-- =====================================================
+
+-- Escritos apenas pelos triggers (SECURITY DEFINER)
+ALTER TABLE user_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cilindro_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE elemento_stats ENABLE ROW LEVEL SECURITY;
+
+-- SELECT: Apenas próprio usuário vê seus contadores
+CREATE POLICY "Users can view own user_stats" ON user_stats
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- SELECT: Qualquer usuário pode visualizar (como cilindro e elemento)
+CREATE POLICY "Anyone can view cilindro_stats" ON cilindro_stats
+    FOR SELECT USING (true);
+
+CREATE POLICY "Anyone can view elemento_stats" ON elemento_stats
+    FOR SELECT USING (true);
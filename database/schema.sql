@@ -11,7 +11,9 @@ CREATE TABLE perfil (
     nome VARCHAR(100),
     email VARCHAR(255),
     habilitar_abas JSONB DEFAULT '{"cilindro": false, "elemento": false, "amostra": false, "historico": false}',
-    criado_em TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    versao INTEGER NOT NULL DEFAULT 1,
+    criado_em TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Tabela: cilindro
@@ -26,7 +28,8 @@ CREATE TABLE cilindro (
     custo NUMERIC(10,2) DEFAULT 290.00,
     status VARCHAR(20) DEFAULT 'ativo',
     user_id UUID REFERENCES auth.users(id),
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Tabela: elemento
@@ -35,7 +38,8 @@ CREATE TABLE elemento (
     nome VARCHAR(100) NOT NULL,
     consumo_lpm NUMERIC(5,2) NOT NULL,
     user_id UUID REFERENCES auth.users(id),
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Tabela: pressao
@@ -47,7 +51,8 @@ CREATE TABLE pressao (
     data DATE NOT NULL,
     hora TIME NOT NULL,
     user_id UUID REFERENCES auth.users(id),
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Tabela: amostra
@@ -55,11 +60,13 @@ CREATE TABLE amostra (
     id SERIAL PRIMARY KEY,
     data DATE NOT NULL,
     tempo_chama VARCHAR(8) NOT NULL,
+    tempo_chama_segundos INTEGER NOT NULL DEFAULT 0 CHECK (tempo_chama_segundos >= 0),
     cilindro_id INTEGER REFERENCES cilindro(id) ON DELETE CASCADE,
     elemento_id INTEGER REFERENCES elemento(id) ON DELETE CASCADE,
     quantidade_amostras INTEGER DEFAULT 1,
     user_id UUID REFERENCES auth.users(id),
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Tabela: historico_log
@@ -69,7 +76,31 @@ CREATE TABLE historico_log (
     acao VARCHAR(20) NOT NULL,
     nome VARCHAR(100) NOT NULL,
     user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT NOW()
+    registro_id INTEGER,
+    created_at TIMESTAMP DEFAULT NOW(),
+    inserido_em TIMESTAMP NOT NULL DEFAULT (clock_timestamp() AT TIME ZONE 'UTC')
+);
+
+-- Tabela: user_stats (contadores por usuário, mantidos por triggers)
+CREATE TABLE user_stats (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    cilindros INTEGER NOT NULL DEFAULT 0,
+    elementos INTEGER NOT NULL DEFAULT 0,
+    amostras INTEGER NOT NULL DEFAULT 0,
+    pressoes INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Tabela: cilindro_stats (amostras por cilindro, mantida por trigger)
+CREATE TABLE cilindro_stats (
+    cilindro_id INTEGER PRIMARY KEY REFERENCES cilindro(id) ON DELETE CASCADE,
+    amostras INTEGER NOT NULL DEFAULT 0
+);
+
+-- Tabela: elemento_stats (amostras por elemento, mantida por trigger)
+CREATE TABLE elemento_stats (
+    elemento_id INTEGER PRIMARY KEY REFERENCES elemento(id) ON DELETE CASCADE,
+    amostras INTEGER NOT NULL DEFAULT 0
 );
 
 -- =====================================================
@@ -87,9 +118,160 @@ CREATE INDEX idx_amostra_data ON amostra(data);
 CREATE INDEX idx_perfil_id ON perfil(id);
 CREATE INDEX idx_perfil_role ON perfil(role);
 CREATE INDEX idx_perfil_role_ativo ON perfil(role, ativo);
+CREATE INDEX idx_perfil_nome_email_id ON perfil(nome, email, id);
 CREATE INDEX idx_pressao_user_id ON pressao(user_id);
 CREATE INDEX idx_pressao_cilindro_id ON pressao(cilindro_id);
 CREATE INDEX idx_pressao_data ON pressao(data);
 CREATE INDEX idx_historico_log_user_id ON historico_log(user_id);
 CREATE INDEX idx_historico_log_tipo ON historico_log(tipo);
 CREATE INDEX idx_historico_log_created_at ON historico_log(created_at);
+CREATE INDEX idx_historico_log_created_at_id ON historico_log(created_at DESC, id DESC);
+CREATE INDEX idx_historico_log_user_created_at_id ON historico_log(user_id, created_at DESC, id DESC);
+CREATE INDEX idx_historico_log_exclusoes ON historico_log(id) WHERE acao = 'excluido' AND registro_id IS NOT NULL;
+CREATE INDEX idx_cilindro_updated_at_id ON cilindro(updated_at, id);
+CREATE INDEX idx_elemento_updated_at_id ON elemento(updated_at, id);
+CREATE INDEX idx_amostra_updated_at_id ON amostra(updated_at, id);
+CREATE INDEX idx_pressao_updated_at_id ON pressao(updated_at, id);
+CREATE INDEX idx_amostra_user_data_id ON amostra(user_id, data, id);
+CREATE INDEX idx_cilindro_user_data_compra_id ON cilindro(user_id, data_compra, id);
+
+-- =====================================================
+-- TRIGGERS
+-- =====================================================
+
+-- updated_at acompanha cada alteração (exportação incremental e cache de exportações)
+CREATE OR REPLACE FUNCTION definir_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_cilindro_updated_at BEFORE UPDATE ON cilindro FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_elemento_updated_at BEFORE UPDATE ON elemento FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_amostra_updated_at BEFORE UPDATE ON amostra FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_pressao_updated_at BEFORE UPDATE ON pressao FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+CREATE TRIGGER trg_perfil_updated_at BEFORE UPDATE ON perfil FOR EACH ROW EXECUTE FUNCTION definir_updated_at();
+
+-- versao do perfil: incrementada quando role, ativo, nome ou abas mudam
+-- (o cache de perfil do Flask não troca uma versão nova por uma antiga)
+CREATE OR REPLACE FUNCTION incrementar_versao_perfil()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF (NEW.role, NEW.ativo, NEW.nome, NEW.habilitar_abas)
+        IS DISTINCT FROM (OLD.role, OLD.ativo, OLD.nome, OLD.habilitar_abas) THEN
+        NEW.versao := OLD.versao + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_perfil_versao BEFORE UPDATE ON perfil FOR EACH ROW EXECUTE FUNCTION incrementar_versao_perfil();
+
+-- Contadores (user_stats, cilindro_stats, elemento_stats): um trigger por
+-- comando (não por linha) soma as linhas inseridas e subtrai as excluídas,
+-- agrupadas por usuário/cilindro/elemento, em um upsert por tabela de
+-- contadores. Atualizações só mudam contadores se trocarem a referência.
+CREATE OR REPLACE FUNCTION atualizar_contadores()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    fonte TEXT;
+    coluna TEXT;
+BEGIN
+    fonte := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS delta FROM novas'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS delta FROM antigas'
+        ELSE 'SELECT *, 1 AS delta FROM novas UNION ALL SELECT *, -1 AS delta FROM antigas'
+    END;
+    coluna := CASE TG_TABLE_NAME
+        WHEN 'cilindro' THEN 'cilindros'
+        WHEN 'elemento' THEN 'elementos'
+        WHEN 'amostra' THEN 'amostras'
+        WHEN 'pressao' THEN 'pressoes'
+    END;
+
+    EXECUTE format(
+        'INSERT INTO user_stats AS s (user_id, %1$I)
+         SELECT user_id, SUM(delta) FROM (%2$s) m
+         WHERE user_id IS NOT NULL GROUP BY user_id HAVING SUM(delta) <> 0
+         ON CONFLICT (user_id) DO UPDATE SET %1$I = s.%1$I + EXCLUDED.%1$I, atualizado_em = NOW()',
+        coluna, fonte
+    );
+
+    IF TG_TABLE_NAME = 'amostra' THEN
+        -- O JOIN ignora cilindros/elementos excluídos no mesmo comando
+        -- (amostras removidas em cascata): o contador deles já foi removido
+        EXECUTE format(
+            'INSERT INTO cilindro_stats AS s (cilindro_id, amostras)
+             SELECT m.cilindro_id, SUM(m.delta) FROM (%s) m JOIN cilindro c ON c.id = m.cilindro_id
+             GROUP BY m.cilindro_id HAVING SUM(m.delta) <> 0
+             ON CONFLICT (cilindro_id) DO UPDATE SET amostras = s.amostras + EXCLUDED.amostras',
+            fonte
+        );
+        EXECUTE format(
+            'INSERT INTO elemento_stats AS s (elemento_id, amostras)
+             SELECT m.elemento_id, SUM(m.delta) FROM (%s) m JOIN elemento e ON e.id = m.elemento_id
+             GROUP BY m.elemento_id HAVING SUM(m.delta) <> 0
+             ON CONFLICT (elemento_id) DO UPDATE SET amostras = s.amostras + EXCLUDED.amostras',
+            fonte
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+-- Recalcula todos os contadores a partir das tabelas (carga inicial ou
+-- correção). Bloqueia escritas nas tabelas contadas enquanto executa.
+CREATE OR REPLACE FUNCTION recalcular_contadores()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    LOCK TABLE cilindro, elemento, amostra, pressao IN SHARE MODE;
+
+    DELETE FROM user_stats;
+    INSERT INTO user_stats (user_id, cilindros, elementos, amostras, pressoes)
+    SELECT user_id, SUM(c), SUM(e), SUM(a), SUM(p)
+    FROM (
+        SELECT user_id, 1 AS c, 0 AS e, 0 AS a, 0 AS p FROM cilindro
+        UNION ALL SELECT user_id, 0, 1, 0, 0 FROM elemento
+        UNION ALL SELECT user_id, 0, 0, 1, 0 FROM amostra
+        UNION ALL SELECT user_id, 0, 0, 0, 1 FROM pressao
+    ) t
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id;
+
+    DELETE FROM cilindro_stats;
+    INSERT INTO cilindro_stats (cilindro_id, amostras)
+    SELECT cilindro_id, COUNT(*) FROM amostra WHERE cilindro_id IS NOT NULL GROUP BY cilindro_id;
+
+    DELETE FROM elemento_stats;
+    INSERT INTO elemento_stats (elemento_id, amostras)
+    SELECT elemento_id, COUNT(*) FROM amostra WHERE elemento_id IS NOT NULL GROUP BY elemento_id;
+END;
+$$;
+
+CREATE TRIGGER trg_cilindro_contadores_ins AFTER INSERT ON cilindro REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_cilindro_contadores_upd AFTER UPDATE ON cilindro REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_cilindro_contadores_del AFTER DELETE ON cilindro REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_ins AFTER INSERT ON elemento REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_upd AFTER UPDATE ON elemento REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_elemento_contadores_del AFTER DELETE ON elemento REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_ins AFTER INSERT ON amostra REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_upd AFTER UPDATE ON amostra REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_amostra_contadores_del AFTER DELETE ON amostra REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_ins AFTER INSERT ON pressao REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_upd AFTER UPDATE ON pressao REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
+CREATE TRIGGER trg_pressao_contadores_del AFTER DELETE ON pressao REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION atualizar_contadores();
@@ -1,12 +1,11 @@
 import os
 from datetime import datetime, timedelta, timezone
 from flask import Flask, render_template, redirect, url_for, session, request, flash
-from flask_login import LoginManager, login_required, current_user
+from flask_login import LoginManager, login_required, current_user, logout_user
 from flask_wtf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 from blueprints.helpers import get_authenticated_client
 from utils.constants import ELEMENTO_CORES, ELEMENTO_CORES_AMOSTRAS
@@ -31,6 +30,16 @@ if is_production:
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+# A sessão só é regravada quando muda; last_activity é atualizado no máximo
+# uma vez por INACTIVITY_WRITE_INTERVAL_SECONDS (ver check_inactivity)
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+
+# Sessão no servidor (SESSION_BACKEND): o cookie leva só um identificador opaco
+from utils.sessao import criar_interface_sessao
+_interface_sessao = criar_interface_sessao()
+if _interface_sessao is not None:
+    app.session_interface = _interface_sessao
+
 csrf = CSRFProtect(app)
 
 limiter = Limiter(
@@ -54,7 +63,8 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+from utils.supabase_utils import get_supabase_client
+supabase = get_supabase_client()
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -74,6 +84,9 @@ def load_user(user_id):
 
 INACTIVITY_TIMEOUT_MINUTES = int(os.getenv("INACTIVITY_TIMEOUT_MINUTES", "10"))
 INACTIVITY_TIMEOUT = timedelta(minutes=INACTIVITY_TIMEOUT_MINUTES)
+# Granularidade do registro de atividade: gravar last_activity a cada
+# requisição faria a sessão (e o cookie) ser reenviada em toda resposta
+INACTIVITY_WRITE_INTERVAL = timedelta(seconds=int(os.getenv("INACTIVITY_WRITE_INTERVAL_SECONDS", "60")))
 
 PUBLIC_ENDPOINTS = [
     'auth.login',
@@ -100,17 +113,41 @@ def check_inactivity():
     if last_activity:
         try:
             last_activity_dt = datetime.fromisoformat(str(last_activity))
+            if last_activity_dt.tzinfo is None:
+                last_activity_dt = last_activity_dt.replace(tzinfo=timezone.utc)
             if now - last_activity_dt > INACTIVITY_TIMEOUT:
+                user_id = session.get('user_id', 'desconhecido')
                 session.clear()
                 flash('Sessão expirada por inatividade. Faça login novamente.', 'warning')
-                logger.info(f"Sessão expirada por inatividade para user_id: {session.get('user_id', 'desconhecido')}")
+                logger.info(f"Sessão expirada por inatividade para user_id: {user_id}")
                 return redirect(url_for('auth.login'))
+            # Atividade recente já registrada: não modifica a sessão
+            if now - last_activity_dt < INACTIVITY_WRITE_INTERVAL:
+                return
         except (ValueError, TypeError):
-            session['last_activity'] = now.isoformat()
+            pass
     
     session['last_activity'] = now.isoformat()
 
 
+@app.before_request
+def check_user_active():
+    """Encerra a sessão de usuário desativado pelo admin (perfil vem do cache)."""
+    if request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return
+    
+    if 'user_id' not in session:
+        return
+    
+    from blueprints.helpers import is_user_active
+    if not is_user_active(session['user_id']):
+        logger.info(f"Sessão encerrada, usuário desativado: {session['user_id']}")
+        session.clear()
+        logout_user()
+        flash('Usuário desativado. Contacte o administrador.', 'danger')
+        return redirect(url_for('auth.login'))
+
+
 @app.after_request
 def add_cors_headers(response):
     origin = request.headers.get("Origin")
@@ -135,41 +172,15 @@ def add_cors_headers(response):
 
 @app.context_processor
 def inject_user_info():
-    from blueprints.helpers import get_habilitar_abas
+    from blueprints.helpers import get_habilitar_abas, perfil_atual
     from datetime import datetime
     
-    user_id = session.get('user_id')
-    
-    if user_id and 'cached_user_info' not in session:
-        from utils.supabase_utils import get_admin_client
-        client = get_admin_client()
-        
-        perfil_response = client.table("perfil").select("role,nome,habilitar_abas").eq("id", user_id).execute()
-        
-        if perfil_response.data:
-            perfil = perfil_response.data[0]
-            from blueprints.helpers import ABAS_DEFAULT
-            session['cached_user_info'] = {
-                'user_role': perfil.get('role', 'usuario'),
-                'user_name': perfil.get('nome', ''),
-                'is_admin': perfil.get('role') == 'admin',
-                'habilitar_abas': perfil.get('habilitar_abas') or ABAS_DEFAULT
-            }
-        else:
-            from blueprints.helpers import ABAS_DEFAULT
-            session['cached_user_info'] = {
-                'user_role': 'usuario',
-                'user_name': '',
-                'is_admin': False,
-                'habilitar_abas': ABAS_DEFAULT
-            }
-    
-    cached = session.get('cached_user_info', {})
+    perfil = perfil_atual()
     
     return dict(
-        is_admin=cached.get('is_admin', False), 
-        user_role=cached.get('user_role', 'usuario'), 
-        user_name=cached.get('user_name', ''), 
+        is_admin=perfil.get("role") == "admin", 
+        user_role=perfil.get("role") or "usuario", 
+        user_name=perfil.get("nome") or "", 
         pode_acessar_aba=get_habilitar_abas,
         today=datetime.now().strftime("%Y-%m-%d")
     )
@@ -197,149 +208,168 @@ def index():
     return redirect(url_for("auth.login"))
 
 
-@app.route("/dashboard")
-@login_required
-def dashboard():
-    from utils.supabase_utils import get_supabase_client
-    from blueprints.helpers import get_user_id
+def calcular_dashboard(user_id):
+    """Consulta o banco e retorna os dados-base do dashboard do usuário.
+
+    O resultado é guardado em cache e compartilhado entre a página (cards e
+    listas) e os endpoints JSON de cada gráfico.
+    """
+    from utils.supabase_utils import get_supabase_client, executar_consultas
     
-    user_id = get_user_id()
     supabase = get_supabase_client()
     
-    cilindro_response = supabase.table("cilindro").select("*").eq("user_id", user_id).execute()
-    elementos_response = supabase.table("elemento").select("*").eq("user_id", user_id).order("nome").execute()
-    amostras_response = supabase.table("amostra").select("*").eq("user_id", user_id).execute()
+    # As amostras chegam já agrupadas por cilindro × elemento (database/functions.sql);
+    # apenas as 5 mais recentes são baixadas para a lista do card
+    respostas = executar_consultas({
+        "cilindro": supabase.table("cilindro").select("id,codigo,status,data_compra").eq("user_id", user_id),
+        "elementos": supabase.table("elemento").select("id,nome,consumo_lpm").eq("user_id", user_id).order("nome"),
+        "amostras": supabase.table("amostra").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(5),
+        "agregados": supabase.rpc("dashboard_agregados", {"p_user_id": user_id}),
+    })
 
-    cilindro = cilindro_response.data or []
-    elementos = elementos_response.data or []
-    amostras = amostras_response.data or []
+    return dict(
+        cilindro=respostas["cilindro"].data or [],
+        elementos=respostas["elementos"].data or [],
+        amostras=respostas["amostras"].data or [],
+        agregados=respostas["agregados"].data or [],
+    )
+
+
+def obter_dados_dashboard(user_id):
+    """Retorna os dados-base do dashboard do cache, consultando o banco se necessário."""
+    from utils.cache import obter_dashboard, salvar_dashboard
+    
+    dados, geracao = obter_dashboard(user_id)
+    if dados is None:
+        dados = calcular_dashboard(user_id)
+        salvar_dashboard(user_id, dados, geracao)
+    return dados
 
-    ativos = len([c for c in cilindro if c.get("status") == "ativo"])
 
-    # Status counts (para compatibilidadde)
-    status_counts = {}
-    for c in cilindro:
-        status = c.get("status", "desconhecido")
-        status_counts[status] = status_counts.get(status, 0) + 1
-
-    status_labels = list(status_counts.keys())
-    status_values = list(status_counts.values())
-
-    # Quantidade de amostras por cilindro (novo card)
-    cilindro_amostras = {}
-    for a in amostras:
-        cil_id = a.get("cilindro_id")
-        if cil_id:
-            cilindro_amostras[cil_id] = cilindro_amostras.get(cil_id, 0) + a.get("quantidade_amostras", 1)
-
-    cilindro_amostras_labels = []
-    cilindro_amostras_values = []
-    cilindro_dict = {c.get("id"): c.get("codigo") for c in cilindro}
-    for cil_id, count in sorted(cilindro_amostras.items(), key=lambda x: cilindro_dict.get(x[0], str(x[0]))):
-        cilindro_amostras_labels.append(cilindro_dict.get(cil_id, str(cil_id)))
-        cilindro_amostras_values.append(count)
-
-    # TOP 3 Elementos Mais Analisados
-    elemento_amostras_count = {}
-    for a in amostras:
-        elem_id = a.get("elemento_id")
-        if elem_id:
-            elemento_amostras_count[elem_id] = elemento_amostras_count.get(elem_id, 0) + a.get("quantidade_amostras", 1)
+def resumo_dashboard(dados):
+    from utils.analytics import resumir_amostras
+    return resumir_amostras(dados["agregados"], campo_quantidade="quantidade", campo_segundos="segundos_chama")
 
+
+def montar_cards(dados):
+    """Cards e listas renderizados direto na página."""
+    cilindro = dados["cilindro"]
+    elementos = dados["elementos"]
+    resumo = resumo_dashboard(dados)
+
+    ativos = len([c for c in cilindro if c.get("status") == "ativo"])
+
+    # TOP 5 Elementos Mais Analisados
     elemento_dict = {e.get("id"): e.get("nome") for e in elementos}
-    elementos_mais_analisados = []
-    for elem_id, count in sorted(elemento_amostras_count.items(), key=lambda x: x[1], reverse=True)[:5]:
-        elementos_mais_analisados.append({
-            "nome": elemento_dict.get(elem_id, str(elem_id)),
-            "quantidade": count
-        })
-
-    # Tempo de chama por elemento (para consumo × tempo)
-    tempo_chama_elementos = {}
-    for a in amostras:
-        elem_id = a.get("elemento_id")
-        tempo = a.get("tempo_chama", "00:00:00")
-        if elem_id and tempo:
-            try:
-                partes = tempo.split(":")
-                minutos = int(partes[0]) * 60 + int(partes[1]) + int(partes[2])/60
-                tempo_chama_elementos[elem_id] = tempo_chama_elementos.get(elem_id, 0) + minutos
-            except:
-                pass
-
-    # Consumo por Elemento × Tempo de Chama
-    elementos_labels = []
-    elementos_consumo_tempo = []
-    for e in elementos:
-        eid = e.get("id")
-        consumo = float(e.get("consumo_lpm", 0))
-        tempo = tempo_chama_elementos.get(eid, 0)
-        elementos_labels.append(e.get("nome"))
-        elementos_consumo_tempo.append(round(consumo * tempo, 2))
-
-    # Eficiência de Cilindros por Elemento (matriz)
-    eficiencia = {}
-    for a in amostras:
-        cil_id = a.get("cilindro_id")
-        elem_id = a.get("elemento_id")
-        if cil_id and elem_id:
-            key = f"{cil_id}-{elem_id}"
-            eficiencia[key] = eficiencia.get(key, 0) + a.get("quantidade_amostras", 1)
-
-    eficiencia_labels = []
-    eficiencia_values = []
-    for key, count in sorted(eficiencia.items(), key=lambda x: x[1], reverse=True)[:10]:
-        cil_id, elem_id = key.split("-")
-        nome_cil = cilindro_dict.get(cil_id, str(cil_id))
-        nome_elem = elemento_dict.get(elem_id, str(elem_id))
-        eficiencia_labels.append(f"{nome_cil} × {nome_elem}")
-        eficiencia_values.append(count)
-
-    total_quantidade_amostras = sum(a.get("quantidade_amostras", 1) for a in amostras)
+    elementos_mais_analisados = [
+        {"nome": elemento_dict.get(elem_id, str(elem_id)), "quantidade": count}
+        for elem_id, count in resumo.top_elementos(5)
+    ]
 
-    return render_template(
-        "dashboard.html",
+    return dict(
         cilindro=cilindro,
         elementos=elementos,
-        amostras=amostras,
+        amostras=dados["amostras"],
         ativos=ativos,
-        status_counts=status_counts,
-        status_labels=status_labels,
-        status_values=status_values,
-        cilindro_amostras_labels=cilindro_amostras_labels,
-        cilindro_amostras_values=cilindro_amostras_values,
         elementos_mais_analisados=elementos_mais_analisados,
-        elementos_labels=elementos_labels,
-        elementos_consumo_tempo=elementos_consumo_tempo,
-        eficiencia_labels=eficiencia_labels,
-        eficiencia_values=eficiencia_values,
-        eficiencia_data=eficiencia,
-        cilindro_dict=cilindro_dict,
+        cilindro_dict={c.get("id"): c.get("codigo") for c in cilindro},
         elemento_dict=elemento_dict,
+        total_quantidade_amostras=resumo.total,
+    )
+
+
+def grafico_status(dados):
+    """Quantidade de amostras por cilindro (statusChart)."""
+    resumo = resumo_dashboard(dados)
+    cilindro_dict = {c.get("id"): c.get("codigo") for c in dados["cilindro"]}
+
+    labels = []
+    values = []
+    for cil_id, count in sorted(resumo.por_cilindro().items(), key=lambda x: cilindro_dict.get(x[0], str(x[0]))):
+        labels.append(cilindro_dict.get(cil_id, str(cil_id)))
+        values.append(count)
+    return {"labels": labels, "values": values}
+
+
+def grafico_elementos(dados):
+    """Consumo por Elemento × Tempo de Chama (elementosChart)."""
+    segundos_chama_elementos = resumo_dashboard(dados).segundos_por_elemento()
+
+    labels = []
+    values = []
+    for e in dados["elementos"]:
+        consumo = float(e.get("consumo_lpm", 0))
+        minutos = segundos_chama_elementos.get(e.get("id"), 0) / 60
+        labels.append(e.get("nome"))
+        values.append(round(consumo * minutos, 2))
+    return {"labels": labels, "values": values}
+
+
+def grafico_eficiencia(dados):
+    """Matriz cilindro × elemento (eficienciaChart); o filtro por cilindro é feito no navegador."""
+    matriz = resumo_dashboard(dados).matriz()
+    elemento_dict = {e.get("id"): e.get("nome") for e in dados["elementos"]}
+    return {
+        "dados": {f"{cil_id}-{elem_id}": count for (cil_id, elem_id), count in matriz.items()},
+        "elementos": {str(elem_id): elemento_dict.get(elem_id, str(elem_id)) for _, elem_id in matriz}
+    }
+
+
+GRAFICOS_DASHBOARD = {
+    "status": grafico_status,
+    "elementos": grafico_elementos,
+    "eficiencia": grafico_eficiencia,
+}
+
+
+@app.route("/dashboard")
+@login_required
+def dashboard():
+    from blueprints.helpers import get_user_id
+    
+    dados = obter_dados_dashboard(get_user_id())
+
+    # Os gráficos são carregados depois, em paralelo, por dashboard_grafico
+    return render_template(
+        "dashboard.html",
         elemento_cores=ELEMENTO_CORES,
         elemento_cores_amostras=ELEMENTO_CORES_AMOSTRAS,
-        total_quantidade_amostras=total_quantidade_amostras,
+        **montar_cards(dados)
     )
 
 
+@app.route("/dashboard/graficos/<nome>")
+@login_required
+@limiter.exempt  # Três requisições por visita ao dashboard; o limite padrão por hora seria atingido
+def dashboard_grafico(nome):
+    """Retorna o dataset de um gráfico do dashboard em JSON (com ETag)."""
+    from flask import jsonify
+    from blueprints.helpers import get_user_id
+    
+    montar = GRAFICOS_DASHBOARD.get(nome)
+    if montar is None:
+        return {"error": "Gráfico não encontrado"}, 404
+
+    try:
+        response = jsonify(montar(obter_dados_dashboard(get_user_id())))
+    except Exception as e:
+        return {"error": formatar_erro_supabase(str(e), "carregar gráfico")}, 500
+
+    # Sempre revalida: o cache do servidor é invalidado a cada escrita do usuário
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @app.route("/perfil", methods=["GET", "POST"])
 @login_required
 def perfil():
-    from blueprints.helpers import get_user_id, get_authenticated_client, get_habilitar_abas, is_admin
+    from blueprints.helpers import get_user_id, get_authenticated_client, get_habilitar_abas, is_admin, contadores_usuario, atualizar_cache_perfil
+    from utils.supabase_utils import executar_consultas
     
     user_id = get_user_id()
     supabase = get_authenticated_client()
 
-    perfil_response = supabase.table("perfil").select("*").eq("id", user_id).execute()
-    perfil_data = perfil_response.data[0] if perfil_response.data else {}
-    user_role = perfil_data.get("role", "usuario")
-    user_nome = perfil_data.get("nome", "")
-    
-    if is_admin():
-        habilitar_abas = {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
-    else:
-        habilitar_abas = get_habilitar_abas(user_id)
-
     if request.method == "POST":
         action = request.form.get("action")
         
@@ -350,7 +380,7 @@ def perfil():
                 perfil_check = supabase.table("perfil").select("id").eq("id", user_id).execute()
                 
                 if not perfil_check.data:
-                    supabase.table("perfil").insert({
+                    resposta = supabase.table("perfil").insert({
                         "id": user_id,
                         "role": "usuario",
                         "ativo": True,
@@ -359,24 +389,29 @@ def perfil():
                     }).execute()
                     flash("Perfil criado com sucesso!", "success")
                 else:
-                    supabase.table("perfil").update({"nome": nome}).eq("id", user_id).execute()
+                    resposta = supabase.table("perfil").update({"nome": nome}).eq("id", user_id).execute()
                     flash("Perfil atualizado com sucesso!", "success")
+                atualizar_cache_perfil(user_id, resposta.data)
             except Exception as e:
                 flash("Erro ao atualizar perfil.", "danger")
             
             return redirect(url_for("perfil"))
 
-    cilindro_response = supabase.table("cilindro").select("id").eq("user_id", user_id).execute()
-    elementos_response = supabase.table("elemento").select("id").eq("user_id", user_id).execute()
-    amostras_response = supabase.table("amostra").select("id").eq("user_id", user_id).execute()
-    pressoes_response = supabase.table("pressao").select("id").eq("user_id", user_id).execute()
+    respostas = executar_consultas({
+        "perfil": supabase.table("perfil").select("*").eq("id", user_id),
+        "stats": supabase.table("user_stats").select("*").eq("user_id", user_id),
+    })
 
-    stats = {
-        "cilindros": len(cilindro_response.data or []),
-        "elementos": len(elementos_response.data or []),
-        "amostras": len(amostras_response.data or []),
-        "pressoes": len(pressoes_response.data or []),
-    }
+    perfil_data = respostas["perfil"].data[0] if respostas["perfil"].data else {}
+    user_role = perfil_data.get("role", "usuario")
+    user_nome = perfil_data.get("nome", "")
+    
+    if is_admin():
+        habilitar_abas = {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
+    else:
+        habilitar_abas = get_habilitar_abas(user_id)
+
+    stats = contadores_usuario((respostas["stats"].data or [None])[0])
 
     return render_template("perfil.html", stats=stats, user_role=user_role, user_nome=user_nome, habilitar_abas=habilitar_abas)
 
@@ -479,6 +514,9 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(historico_bp)
 app.register_blueprint(pressao_bp)
 
+# Consultado a cada poucos segundos enquanto uma exportação está em andamento
+limiter.exempt(app.view_functions["admin.export_status"])
+
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
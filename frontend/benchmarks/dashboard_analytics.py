@@ -0,0 +1,111 @@
+# Benchmark: laços por métrica (dashboard antigo) x agregação colunar (utils.analytics)
+#
+# Uso (a partir de frontend/):
+#   python -m benchmarks.dashboard_analytics [quantidade_de_linhas]
+import sys
+import time
+import random
+from collections import Counter
+
+from utils.analytics import resumir_amostras
+
+
+def gerar_amostras(n, cilindros=200, elementos=40, semente=42):
+    rnd = random.Random(semente)
+    amostras = []
+    for i in range(n):
+        segundos = rnd.randint(0, 3 * 3600)
+        amostras.append({
+            "id": i + 1,
+            "cilindro_id": rnd.randint(1, cilindros),
+            "elemento_id": rnd.randint(1, elementos),
+            "quantidade_amostras": rnd.randint(1, 20),
+            "tempo_chama": f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}",
+            "tempo_chama_segundos": segundos,
+        })
+    return amostras
+
+
+def dashboard_lacos(amostras):
+    """Reproduz os laços do dashboard antes da agregação colunar."""
+    cilindro_amostras = {}
+    for a in amostras:
+        cid = a.get("cilindro_id")
+        if cid:
+            cilindro_amostras[cid] = cilindro_amostras.get(cid, 0) + (a.get("quantidade_amostras") or 1)
+
+    elemento_count = Counter()
+    for a in amostras:
+        eid = a.get("elemento_id")
+        if eid:
+            elemento_count[eid] += a.get("quantidade_amostras") or 1
+    top_elementos = elemento_count.most_common(5)
+
+    tempo_por_elemento = {}
+    for a in amostras:
+        eid = a.get("elemento_id")
+        if eid and a.get("tempo_chama"):
+            h, m, s = (int(p) for p in a["tempo_chama"].split(":"))
+            tempo_por_elemento[eid] = tempo_por_elemento.get(eid, 0) + h * 3600 + m * 60 + s
+
+    eficiencia = {}
+    for a in amostras:
+        cid, eid = a.get("cilindro_id"), a.get("elemento_id")
+        if cid and eid:
+            chave = f"{cid}-{eid}"
+            eficiencia[chave] = eficiencia.get(chave, 0) + (a.get("quantidade_amostras") or 1)
+    top_pares = sorted(eficiencia.items(), key=lambda x: x[1], reverse=True)[:10]
+
+    total = sum(a.get("quantidade_amostras") or 1 for a in amostras)
+    return cilindro_amostras, top_elementos, tempo_por_elemento, top_pares, total, eficiencia
+
+
+def dashboard_colunar(amostras):
+    resumo = resumir_amostras(amostras)
+    eficiencia = {f"{c}-{e}": q for (c, e), q in resumo.matriz().items()}
+    top_pares = [(f"{c}-{e}", q) for (c, e), q in resumo.top_pares(10)]
+    return (
+        resumo.por_cilindro(),
+        resumo.top_elementos(5),
+        resumo.segundos_por_elemento(),
+        top_pares,
+        resumo.total,
+        eficiencia,
+    )
+
+
+def cronometrar(func, *args, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor, resultado
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    print(f"Gerando {n} amostras sintéticas...")
+    amostras = gerar_amostras(n)
+
+    t_lacos, antigo = cronometrar(dashboard_lacos, amostras)
+    t_colunar, novo = cronometrar(dashboard_colunar, amostras)
+
+    assert antigo[0] == novo[0], "por cilindro divergente"
+    assert dict(antigo[1]) == dict(novo[1]), "top elementos divergente"
+    assert antigo[2] == novo[2], "tempo por elemento divergente"
+    assert antigo[4] == novo[4], "total divergente"
+    assert antigo[5] == novo[5], "matriz de eficiência divergente"
+    # Pares empatados podem sair em outra ordem: compara as quantidades do top
+    # e confere cada par escolhido contra a matriz
+    assert [q for _, q in antigo[3]] == [q for _, q in novo[3]], "top pares divergente"
+    assert all(antigo[5][par] == q for par, q in novo[3]), "top pares divergente"
+
+    print(f"Laços por métrica: {t_lacos * 1000:8.1f} ms")
+    print(f"Colunar (NumPy):   {t_colunar * 1000:8.1f} ms")
+    print(f"Ganho:             {t_lacos / t_colunar:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
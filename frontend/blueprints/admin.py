@@ -1,13 +1,23 @@
 # Admin blueprint - Administrative functions
-import json
-import io
+import os
+import re
 import jwt
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, make_response
-from openpyxl import Workbook
+from datetime import datetime, timezone
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, Response, stream_with_context
 
-from utils.supabase_utils import get_admin_client
-from blueprints.helpers import get_user_id, is_admin, get_user_role, get_habilitar_abas, registrar_historico
+from utils.supabase_utils import get_admin_client, executar_consultas, buscar_pagina, buscar_pagina_cursor
+from utils.cache import invalidar_dashboard
+from utils.erros_utils import formatar_erro_supabase
+from utils.exportacao import (
+    Exportacao, parquet_disponivel, gerar_json_delta, marcas_desde, decodificar_cursor_delta
+)
+from utils.tarefas_exportacao import (
+    FORMATOS_EXPORTACAO, EXPORT_ASSINCRONO, iniciar_exportacao, obter_tarefa, arquivo_tarefa
+)
+from blueprints.helpers import (
+    get_user_id, is_admin, get_user_role, abas_do_perfil, atualizar_cache_perfil,
+    registrar_historico, registrar_historico_lote, contadores_usuario, CONTADOR_POR_TABELA
+)
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -44,50 +54,50 @@ def panel():
     if error:
         return error
     
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 25, type=int), 1), 100)
+    q = request.args.get("q", "").strip()
+    
     client = get_admin_client()
-    users_response = client.table("perfil").select("*").execute()
-    users = users_response.data or []
+    consulta = client.table("perfil").select("*", count="exact")
+    # Vírgulas, parênteses e aspas têm significado no filtro or do PostgREST
+    termo = re.sub(r'[,()"\\*%]', " ", q).strip()
+    if termo:
+        consulta = consulta.or_(f"nome.ilike.*{termo}*,email.ilike.*{termo}*")
+    users, total = buscar_pagina(
+        consulta.order("nome", nullsfirst=False).order("email").order("id"),
+        page, per_page
+    )
     
+    contagens = {}
     if users:
-        user_ids = [u.get("id") for u in users]
-        
-        cil_response = client.table("cilindro").select("user_id,id", count="exact").in_("user_id", user_ids).execute()
-        ele_response = client.table("elemento").select("user_id,id", count="exact").in_("user_id", user_ids).execute()
-        amo_response = client.table("amostra").select("user_id,id", count="exact").in_("user_id", user_ids).execute()
-        pre_response = client.table("pressao").select("user_id,id", count="exact").in_("user_id", user_ids).execute()
-        
-        cil_counts = {}
-        for r in cil_response.data or []:
-            cil_counts[r["user_id"]] = r.get("count", 0)
-        
-        ele_counts = {}
-        for r in ele_response.data or []:
-            ele_counts[r["user_id"]] = r.get("count", 0)
-        
-        amo_counts = {}
-        for r in amo_response.data or []:
-            amo_counts[r["user_id"]] = r.get("count", 0)
-        
-        pre_counts = {}
-        for r in pre_response.data or []:
-            pre_counts[r["user_id"]] = r.get("count", 0)
+        # Uma linha (user_id, tabela, total) por tabela com registros, só dos usuários da página
+        linhas = client.rpc("contagens_usuarios", {"p_user_ids": [u.get("id") for u in users]}).execute().data or []
+        for linha in linhas:
+            contagens.setdefault(linha["user_id"], {})[CONTADOR_POR_TABELA[linha["tabela"]]] = linha["total"]
     
     for user in users:
         uid = user.get("id")
         
         user["nome"] = user.get("nome") or user.get("email") or uid
-        user["cilindros"] = cil_counts.get(uid, 0)
-        user["elementos"] = ele_counts.get(uid, 0)
-        user["amostras"] = amo_counts.get(uid, 0)
-        user["pressoes"] = pre_counts.get(uid, 0)
-        if user.get("role") == "admin":
-            user["habilitar_abas"] = {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
-        else:
-            user["habilitar_abas"] = get_habilitar_abas(user["id"])
+        user.update(contadores_usuario(contagens.get(uid)))
+        user["habilitar_abas"] = abas_do_perfil(user)
     
-    users = sorted(users, key=lambda x: (x.get("nome") or x.get("email") or "").lower())
+    pages = (total + per_page - 1) // per_page
+    end = min(page * per_page, total)
+    max_pages = min(pages, 10)
     
-    return render_template("admin.html", users=users)
+    return render_template(
+        "admin.html",
+        users=users,
+        q=q,
+        page=page,
+        per_page=per_page,
+        total=total,
+        pages=pages,
+        end=end,
+        max_pages=max_pages
+    )
 
 
 @admin_bp.route("/admin/toggle-user", methods=["POST"])
@@ -108,7 +118,8 @@ def toggle_user():
         return redirect(url_for("admin.panel"))
     
     client = get_admin_client()
-    client.table("perfil").update({"ativo": ativo}).eq("id", target_user_id).execute()
+    resposta = client.table("perfil").update({"ativo": ativo}).eq("id", target_user_id).execute()
+    atualizar_cache_perfil(target_user_id, resposta.data)
     
     # Registrar no histórico
     acao = "ativado" if ativo else "desativado"
@@ -141,7 +152,8 @@ def set_role():
         return redirect(url_for("admin.panel"))
     
     client = get_admin_client()
-    client.table("perfil").update({"role": role}).eq("id", target_user_id).execute()
+    resposta = client.table("perfil").update({"role": role}).eq("id", target_user_id).execute()
+    atualizar_cache_perfil(target_user_id, resposta.data)
     
     # Registrar alteração de role no histórico
     registrar_historico("perfil", "atualizado", f"Role alterada para {role}", get_user_id())
@@ -168,12 +180,20 @@ def delete_user():
         return redirect(url_for("admin.panel"))
     
     client = get_admin_client()
-    client.table("cilindro").delete().eq("user_id", target_user_id).execute()
-    client.table("elemento").delete().eq("user_id", target_user_id).execute()
-    client.table("amostra").delete().eq("user_id", target_user_id).execute()
-    client.table("pressao").delete().eq("user_id", target_user_id).execute()
+    # Dependentes antes de cilindro/elemento: assim cada linha volta no delete
+    # e vira tombstone para a exportação incremental (nada some por cascata).
+    # O histórico do usuário é apagado, então as exclusões ficam no do admin.
+    for tabela, campo_nome in (("amostra", None), ("pressao", None), ("cilindro", "codigo"), ("elemento", "nome")):
+        excluidos = client.table(tabela).delete().eq("user_id", target_user_id).execute().data or []
+        registrar_historico_lote(
+            tabela, "excluido",
+            [str(r.get(campo_nome) or f"#{r.get('id')}") for r in excluidos],
+            user_id, [r.get("id") for r in excluidos]
+        )
     client.table("historico_log").delete().eq("user_id", target_user_id).execute()
     client.table("perfil").delete().eq("id", target_user_id).execute()
+    invalidar_dashboard(target_user_id)
+    atualizar_cache_perfil(target_user_id, None)
     
     flash("Usuário e todos os seus dados foram excluídos!", "success")
     
@@ -211,7 +231,8 @@ def update_habilitar_abas():
     
     habilitar_abas[aba] = habilitar
     
-    client.table("perfil").update({"habilitar_abas": habilitar_abas}).eq("id", target_user_id).execute()
+    resposta = client.table("perfil").update({"habilitar_abas": habilitar_abas}).eq("id", target_user_id).execute()
+    atualizar_cache_perfil(target_user_id, resposta.data)
     
     # Registrar alteração de permissões no histórico
     acao = "habilitada" if habilitar else "desabilitada"
@@ -235,20 +256,21 @@ def user_data(target_user_id):
     
     client = get_admin_client()
     
-    page = int(request.args.get("page", 1))
+    cursor = request.args.get("cursor")
+    direcao = request.args.get("dir", "proxima")
     per_page = 20
     
-    cilindro_total = client.table("cilindro").select("*", count="exact").eq("user_id", target_user_id).execute().count or 0
-    elementos_total = client.table("elemento").select("*", count="exact").eq("user_id", target_user_id).execute().count or 0
-    amostras_total = client.table("amostra").select("*", count="exact").eq("user_id", target_user_id).execute().count or 0
-    pressoes_total = client.table("pressao").select("*", count="exact").eq("user_id", target_user_id).execute().count or 0
+    respostas = executar_consultas({
+        "stats": client.table("user_stats").select("*").eq("user_id", target_user_id),
+        "perfil": client.table("perfil").select("*").eq("id", target_user_id),
+        "historico": lambda: buscar_pagina_cursor(
+            client.table("historico_log").select("id, tipo, acao, nome, created_at", count="estimated").eq("user_id", target_user_id),
+            per_page, cursor, direcao
+        ),
+    })
     
-    historico_offset = (page - 1) * per_page
-    historico_log = client.table("historico_log").select(
-        "tipo, acao, nome, created_at"
-    ).eq("user_id", target_user_id).order("created_at", desc=True).range(historico_offset, historico_offset + per_page - 1).execute().data or []
-    
-    historico_total = client.table("historico_log").select("*", count="exact").eq("user_id", target_user_id).execute().count or 0
+    stats = contadores_usuario((respostas["stats"].data or [None])[0])
+    historico_log, cursor_proxima, cursor_anterior, historico_total = respostas["historico"]
     
     history = [{
         "tipo": h.get("tipo"),
@@ -257,23 +279,24 @@ def user_data(target_user_id):
         "data": h.get("created_at")
     } for h in historico_log]
     
-    perfil = client.table("perfil").select("*").eq("id", target_user_id).execute().data
+    perfil = respostas["perfil"].data
     target_user = perfil[0] if perfil else {"id": target_user_id, "role": "unknown"}
     
-    habilitar_abas = get_habilitar_abas(target_user_id) if target_user.get("role") != "admin" else {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
+    habilitar_abas = abas_do_perfil(target_user)
     
     return render_template(
         "admin_user_data.html",
         target_user=target_user,
-        cilindro_total=cilindro_total,
-        elementos_total=elementos_total,
-        amostras_total=amostras_total,
-        pressoes_total=pressoes_total,
+        cilindro_total=stats["cilindros"],
+        elementos_total=stats["elementos"],
+        amostras_total=stats["amostras"],
+        pressoes_total=stats["pressoes"],
         habilitar_abas=habilitar_abas,
         history=history,
         historico_total=historico_total,
-        page=page,
-        per_page=per_page
+        per_page=per_page,
+        cursor_proxima=cursor_proxima,
+        cursor_anterior=cursor_anterior
     )
 
 
@@ -289,229 +312,164 @@ def export_data():
     
     formato = request.args.get("formato", "json").lower()
     
-    if formato not in ["csv", "json", "excel", "md"]:
+    if formato not in FORMATOS_EXPORTACAO:
         flash("Formato inválido.", "danger")
         return redirect(url_for("dashboard"))
     
-    client = get_admin_client()
+    if request.args.get("since") or request.args.get("cursor"):
+        return _exportar_delta(formato)
     
-    cilindro_data = client.table("cilindro").select("*").execute().data or []
-    elementos_data = client.table("elemento").select("*").execute().data or []
-    amostras_data = client.table("amostra").select("*").execute().data or []
-    pressoes_data = client.table("pressao").select("*").execute().data or []
-    usuarios_data = client.table("perfil").select("id,email,nome").execute().data or []
-    
-    usuarios_dict = {u.get("id"): u for u in usuarios_data}
-    
-    for c in cilindro_data:
-        uid = c.get("user_id")
-        if uid:
-            u = usuarios_dict.get(uid, {})
-            c["usuario_email"] = u.get("email", "")
-            c["usuario_nome"] = u.get("nome", "")
-    
-    for e in elementos_data:
-        uid = e.get("user_id")
-        if uid:
-            u = usuarios_dict.get(uid, {})
-            e["usuario_email"] = u.get("email", "")
-            e["usuario_nome"] = u.get("nome", "")
-    
-    cilindro_dict = {c.get("id"): c.get("codigo") for c in cilindro_data}
-    elemento_dict = {e.get("id"): e.get("nome") for e in elementos_data}
-    
-    for a in amostras_data:
-        uid = a.get("user_id")
-        if uid:
-            u = usuarios_dict.get(uid, {})
-            a["usuario_email"] = u.get("email", "")
-            a["usuario_nome"] = u.get("nome", "")
-        a["cilindro_codigo"] = cilindro_dict.get(a.get("cilindro_id"), "")
-        a["elemento_nome"] = elemento_dict.get(a.get("elemento_id"), "")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    if formato == "json":
-        data = {
-            "exportado_em": datetime.now().isoformat(),
-            "cilindros": cilindro_data,
-            "elementos": elementos_data,
-            "amostras": amostras_data,
-            "pressoes": pressoes_data
-        }
-        response = make_response(json.dumps(data, indent=2, default=str))
-        response.headers["Content-Disposition"] = f"attachment; filename=labgas_export_{timestamp}.json"
-        response.headers["Content-Type"] = "application/json"
-        return response
-    
-    elif formato == "csv":
-        output = io.StringIO()
-        
-        output.write("# CILINDROS\n")
-        if cilindro_data:
-            headers = ["id", "codigo", "data_compra", "data_inicio_consumo", "data_fim", 
-                      "gas_kg", "litros_equivalentes", "custo", "status", 
-                      "usuario_email", "usuario_nome", "created_at"]
-            output.write(",".join(headers) + "\n")
-            for row in cilindro_data:
-                values = [str(row.get(h, "")) for h in headers]
-                output.write(",".join(values) + "\n")
-        
-        output.write("\n# ELEMENTOS\n")
-        if elementos_data:
-            headers = ["id", "nome", "consumo_lpm", "usuario_email", "usuario_nome", "created_at"]
-            output.write(",".join(headers) + "\n")
-            for row in elementos_data:
-                values = [str(row.get(h, "")) for h in headers]
-                output.write(",".join(values) + "\n")
-        
-        output.write("\n# AMOSTRAS\n")
-        if amostras_data:
-            headers = ["id", "data", "tempo_chama", "cilindro_id", "cilindro_codigo", 
-                      "elemento_id", "elemento_nome", "quantidade_amostras",
-                      "usuario_email", "usuario_nome", "created_at"]
-            output.write(",".join(headers) + "\n")
-            for row in amostras_data:
-                values = [str(row.get(h, "")) for h in headers]
-                output.write(",".join(values) + "\n")
-        
-        output.write("\n# PRESSOES\n")
-        if pressoes_data:
-            for t in pressoes_data:
-                uid = t.get("user_id")
-                if uid:
-                    u = usuarios_dict.get(uid, {})
-                    t["usuario_email"] = u.get("email", "")
-                    t["usuario_nome"] = u.get("nome", "")
-                t["cilindro_codigo"] = cilindro_dict.get(t.get("cilindro_id"), "")
-            headers = ["id", "cilindro_id", "cilindro_codigo", "pressao", "temperatura", "data", "hora",
-                      "usuario_email", "usuario_nome", "created_at"]
-            output.write(",".join(headers) + "\n")
-            for row in pressoes_data:
-                values = [str(row.get(h, "")) for h in headers]
-                output.write(",".join(values) + "\n")
-        
-        response = make_response(output.getvalue())
-        response.headers["Content-Disposition"] = f"attachment; filename=labgas_export_{timestamp}.csv"
-        response.headers["Content-Type"] = "text/csv"
-        return response
+    if formato == "parquet" and not parquet_disponivel():
+        flash("Exportação Parquet indisponível: instale o pacote pyarrow no servidor.", "warning")
+        return redirect(url_for("dashboard"))
     
-    elif formato == "excel":
-        wb = Workbook()
-        
-        ws_cilindros = wb.active
-        ws_cilindros.title = "Cilindros"
-        if cilindro_data:
-            headers = ["ID", "Código", "Data Compra", "Data Início", "Data Fim", 
-                      "Gas (kg)", "Litros", "Custo", "Status", 
-                      "Usuário Email", "Usuário Nome", "Criado em"]
-            ws_cilindros.append(headers)
-            for row in cilindro_data:
-                ws_cilindros.append([
-                    row.get("id"), row.get("codigo"), row.get("data_compra"),
-                    row.get("data_inicio_consumo"), row.get("data_fim"),
-                    row.get("gas_kg"), row.get("litros_equivalentes"), row.get("custo"),
-                    row.get("status"), 
-                    row.get("usuario_email"), row.get("usuario_nome"), row.get("created_at")
-                ])
-        
-        ws_elementos = wb.create_sheet("Elementos")
-        if elementos_data:
-            headers = ["ID", "Nome", "Consumo (L/min)", "Usuário Email", "Usuário Nome", "Criado em"]
-            ws_elementos.append(headers)
-            for row in elementos_data:
-                ws_elementos.append([
-                    row.get("id"), row.get("nome"), row.get("consumo_lpm"),
-                    row.get("usuario_email"), row.get("usuario_nome"), row.get("created_at")
-                ])
-        
-        ws_amostras = wb.create_sheet("Amostras")
-        if amostras_data:
-            headers = ["ID", "Data", "Tempo Chama", "Cilindro ID", "Cilindro Código",
-                      "Elemento ID", "Elemento Nome", "Qtd Amostras",
-                      "Usuário Email", "Usuário Nome", "Criado em"]
-            ws_amostras.append(headers)
-            for row in amostras_data:
-                ws_amostras.append([
-                    row.get("id"), row.get("data"), row.get("tempo_chama"),
-                    row.get("cilindro_id"), row.get("cilindro_codigo"),
-                    row.get("elemento_id"), row.get("elemento_nome"),
-                    row.get("quantidade_amostras"),
-                    row.get("usuario_email"), row.get("usuario_nome"), row.get("created_at")
-                ])
-        
-        ws_pressoes = wb.create_sheet("Pressoes")
-        if pressoes_data:
-            for t in pressoes_data:
-                t["cilindro_codigo"] = cilindro_dict.get(t.get("cilindro_id"), "")
-            headers = ["ID", "Cilindro ID", "Cilindro Código", "Pressão (bar)", "Temperatura (°C)", "Data", "Hora",
-                      "Usuário Email", "Usuário Nome", "Criado em"]
-            ws_pressoes.append(headers)
-            for row in pressoes_data:
-                ws_pressoes.append([
-                    row.get("id"), row.get("cilindro_id"), row.get("cilindro_codigo"),
-                    row.get("pressao"), row.get("temperatura"), row.get("data"), row.get("hora"),
-                    row.get("usuario_email"), row.get("usuario_nome"), row.get("created_at")
-                ])
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = make_response(output.getvalue())
-        response.headers["Content-Disposition"] = f"attachment; filename=labgas_export_{timestamp}.xlsx"
-        response.headers["Content-Type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        return response
+    if not EXPORT_ASSINCRONO:
+        return _exportar_streaming(formato)
     
-    elif formato == "md":
-        md_output = io.StringIO()
-        
-        md_output.write(f"# LabGas Manager - Exportação\n\n")
-        md_output.write(f"**Exportado em:** {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
-        md_output.write(f"**Total:** {len(cilindro_data)} Cilindros | {len(pressoes_data)} Pressoes | {len(elementos_data)} Elementos | {len(amostras_data)} Amostras\n\n")
-        
-        md_output.write("## Cilindros\n\n")
-        if cilindro_data:
-            md_output.write("| ID | Código | Status | Gas (kg) | Custo | Usuário |\n")
-            md_output.write("|---|---|---|---|---|---|\n")
-            for row in cilindro_data:
-                md_output.write(f"| {row.get('id')} | {row.get('codigo')} | {row.get('status')} | {row.get('gas_kg')} | R${row.get('custo')} | {row.get('usuario_email')} |\n")
-        else:
-            md_output.write("*Nenhum cilindro encontrado.*\n\n")
-        
-        md_output.write("\n## Pressoes\n\n")
-        if pressoes_data:
-            for t in pressoes_data:
-                t["cilindro_codigo"] = cilindro_dict.get(t.get("cilindro_id"), "")
-            md_output.write("| ID | Cilindro | Temperatura | Data | Hora | Usuário |\n")
-            md_output.write("|---|---|---|---|---|---|\n")
-            for row in pressoes_data:
-                md_output.write(f"| {row.get('id')} | {row.get('cilindro_codigo')} | {row.get('temperatura')}°C | {row.get('data')} | {row.get('hora')} | {row.get('usuario_email')} |\n")
-        else:
-            md_output.write("*Nenhum registro de temperatura encontrado.*\n\n")
-        
-        md_output.write("\n## Elementos\n\n")
-        if elementos_data:
-            md_output.write("| ID | Nome | Consumo (L/min) | Usuário |\n")
-            md_output.write("|---|---|---|---|\n")
-            for row in elementos_data:
-                md_output.write(f"| {row.get('id')} | {row.get('nome')} | {row.get('consumo_lpm')} | {row.get('usuario_email')} |\n")
-        else:
-            md_output.write("*Nenhum elemento encontrado.*\n\n")
-        
-        md_output.write("\n## Amostras\n\n")
-        if amostras_data:
-            md_output.write("| ID | Data | Tempo | Cilindro | Elemento | Qtd | Usuário |\n")
-            md_output.write("|---|---|---|---|---|---|---|\n")
-            for row in amostras_data:
-                md_output.write(f"| {row.get('id')} | {row.get('data')} | {row.get('tempo_chama')} | {row.get('cilindro_codigo')} | {row.get('elemento_nome')} | {row.get('quantidade_amostras')} | {row.get('usuario_email')} |\n")
-        else:
-            md_output.write("*Nenhuma amostra encontrada.*\n\n")
-        
-        response = make_response(md_output.getvalue())
-        response.headers["Content-Disposition"] = f"attachment; filename=labgas_export_{timestamp}.md"
-        response.headers["Content-Type"] = "text/markdown"
-        return response
+    try:
+        tarefa = iniciar_exportacao(formato)
+    except Exception as e:
+        flash(formatar_erro_supabase(str(e), "exportar dados"), "danger")
+        return redirect(url_for("dashboard"))
     
-    flash("Formato não suportado.", "danger")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("admin.export_tarefa", tarefa_id=tarefa["id"]))
+
+
+def _exportar_streaming(formato):
+    """Exportação completa enviada em partes na própria requisição, sem tarefa nem cache.
+
+    Usada onde as tarefas não funcionam (EXPORT_ASSINCRONO desligado, ex: Vercel).
+    """
+    try:
+        exportacao = Exportacao(get_admin_client())
+    except Exception as e:
+        flash(formatar_erro_supabase(str(e), "exportar dados"), "danger")
+        return redirect(url_for("dashboard"))
+    
+    gerar, extensao, content_type = FORMATOS_EXPORTACAO[formato]
+    timestamp = exportacao.exportado_em.strftime("%Y%m%d_%H%M%S")
+    return Response(
+        stream_with_context(gerar(exportacao)),
+        content_type=content_type if formato in ("excel", "parquet") else f"{content_type}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename=labgas_export_{timestamp}.{extensao}"}
+    )
+
+
+def _exportar_delta(formato):
+    """Exportação incremental (?since=<ISO 8601> ou ?cursor=<cursor anterior>) em JSON.
+
+    since sem fuso é lido como UTC. since ou cursor inválidos respondem 400.
+
+    Costuma ser pequena, então é gerada na própria requisição, sem tarefa
+    nem cache de arquivo.
+    """
+    if formato != "json":
+        flash("A exportação incremental está disponível apenas em JSON.", "warning")
+        return redirect(url_for("dashboard"))
+    
+    cursor = request.args.get("cursor")
+    if cursor:
+        marcas = decodificar_cursor_delta(cursor)
+        if marcas is None:
+            return {"error": "Cursor de exportação inválido."}, 400
+    else:
+        try:
+            desde = datetime.fromisoformat(request.args.get("since") or "")
+        except ValueError:
+            return {"error": "Data inválida em since (use o formato ISO 8601, ex: 2024-01-31T12:00:00)."}, 400
+        # As colunas comparadas são TIMESTAMP sem fuso, em UTC: um since com
+        # fuso é convertido, senão o PostgREST descartaria o deslocamento
+        if desde.tzinfo is not None:
+            desde = desde.astimezone(timezone.utc).replace(tzinfo=None)
+        marcas = marcas_desde(desde.isoformat())
+    
+    try:
+        exportacao = Exportacao(get_admin_client(), marcas=marcas)
+    except Exception as e:
+        flash(formatar_erro_supabase(str(e), "exportar dados"), "danger")
+        return redirect(url_for("dashboard"))
+    
+    timestamp = exportacao.exportado_em.strftime("%Y%m%d_%H%M%S")
+    return Response(
+        stream_with_context(gerar_json_delta(exportacao)),
+        mimetype="application/json",
+        headers={"Content-Disposition": f"attachment; filename=labgas_delta_{timestamp}.json"}
+    )
+
+
+def _tarefa_admin(tarefa_id, json=False):
+    """Valida o acesso admin e carrega a tarefa; retorna (tarefa, resposta_de_erro).
+
+    Uma tarefa concluída cujo arquivo já foi removido conta como expirada.
+    Com json=True (consulta de status) os erros vêm em JSON, sem redirecionar.
+    """
+    if not is_admin():
+        if json:
+            return None, ({"error": "Acesso restrito a administradores."}, 403)
+        flash("Acesso restrito a administradores.", "danger")
+        return None, redirect(url_for("dashboard"))
+    
+    user_id, error = validate_admin_token()
+    if error:
+        if json:
+            return None, ({"error": "Sessão inválida. Faça login novamente."}, 401)
+        return None, error
+    
+    tarefa = obter_tarefa(tarefa_id)
+    if tarefa and tarefa["status"] == "concluida" and not os.path.exists(arquivo_tarefa(tarefa)):
+        tarefa = None
+    if not tarefa:
+        if json:
+            return None, ({"error": "Exportação não encontrada ou expirada."}, 404)
+        flash("Exportação não encontrada ou expirada.", "warning")
+        return None, redirect(url_for("dashboard"))
+    return tarefa, None
+
+
+def _status_tarefa(tarefa):
+    return {
+        "id": tarefa["id"],
+        "formato": tarefa["formato"],
+        "status": tarefa["status"],
+        "lidas": tarefa.get("lidas", 0),
+        "total": tarefa.get("total", 0),
+        "erro": formatar_erro_supabase(tarefa["erro"], "exportar dados") if tarefa.get("erro") else None,
+        "download_url": url_for("admin.export_download", tarefa_id=tarefa["id"]) if tarefa["status"] == "concluida" else None,
+    }
+
+
+@admin_bp.route("/admin/export/<tarefa_id>")
+def export_tarefa(tarefa_id):
+    tarefa, error = _tarefa_admin(tarefa_id)
+    if error:
+        return error
+    return render_template("admin_export.html", tarefa=_status_tarefa(tarefa))
+
+
+@admin_bp.route("/admin/export/<tarefa_id>/status")
+def export_status(tarefa_id):
+    """Progresso da exportação em JSON (consultado periodicamente pela página)."""
+    tarefa, error = _tarefa_admin(tarefa_id, json=True)
+    if error:
+        return error
+    return _status_tarefa(tarefa)
+
+
+@admin_bp.route("/admin/export/<tarefa_id>/download")
+def export_download(tarefa_id):
+    tarefa, error = _tarefa_admin(tarefa_id)
+    if error:
+        return error
+    
+    if tarefa["status"] != "concluida":
+        flash("A exportação ainda não foi concluída.", "warning")
+        return redirect(url_for("admin.export_tarefa", tarefa_id=tarefa_id))
+    
+    _, extensao, content_type = FORMATOS_EXPORTACAO[tarefa["formato"]]
+    timestamp = datetime.fromisoformat(tarefa["criada_em"]).strftime("%Y%m%d_%H%M%S")
+    return send_file(
+        arquivo_tarefa(tarefa),
+        mimetype=content_type,
+        as_attachment=True,
+        download_name=f"labgas_export_{timestamp}.{extensao}"
+    )
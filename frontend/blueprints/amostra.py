@@ -1,15 +1,23 @@
 # Amostra blueprint - CRUD operations
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 
-from utils.supabase_utils import get_supabase_client, get_admin_client
-from utils.validators import safe_int, formatar_tempo_chama
-from utils.constants import ITEMS_PER_PAGE
+from utils.supabase_utils import get_supabase_client, get_admin_client, buscar_pagina
+from utils.validators import safe_int, formatar_tempo_chama, tempo_chama_para_segundos
+from utils.constants import ITEMS_PER_PAGE, PAGINACAO_COUNT
 from utils.erros_utils import formatar_erro_supabase
-from blueprints.helpers import get_user_id, is_admin, registrar_historico, pode_acessar_aba
+from utils.cache import invalidar_dashboard
+from blueprints.helpers import get_user_id, is_admin, registrar_historico, excluir_em_lote, pode_acessar_aba
 
 amostra_bp = Blueprint('amostra', __name__)
 
 
+def nome_amostra_lote(amostra):
+    """Nome da amostra no histórico a partir das relações embutidas cilindro(codigo) e elemento(nome)"""
+    cilindro = amostra.get("cilindro") or {}
+    elemento = amostra.get("elemento") or {}
+    return f"{cilindro.get('codigo') or 'N/A'} - {elemento.get('nome') or 'N/A'}"
+
+
 @amostra_bp.route("/amostras", methods=["GET", "POST"])
 def list():
     if not pode_acessar_aba("amostra"):
@@ -20,8 +28,8 @@ def list():
     user_id = get_user_id()
     admin = is_admin()
     
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", ITEMS_PER_PAGE, type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", ITEMS_PER_PAGE, type=int), 1), 100)
     
     cilindro_response = get_supabase_client().table("cilindro").select("id,codigo").order("codigo").execute()
     elementos_response = get_supabase_client().table("elemento").select("id,nome").order("nome").execute()
@@ -55,6 +63,11 @@ def list():
                 return redirect(url_for("amostra.list"))
             
             tempo_chama = formatar_tempo_chama(hora, minuto, segundo)
+            tempo_chama_segundos = tempo_chama_para_segundos(tempo_chama)
+            
+            if tempo_chama_segundos is None:
+                flash("Tempo de chama inválido", "danger")
+                return redirect(url_for("amostra.list"))
             
             cilindro_id_val = safe_int(cilindro_id)
             elemento_id_val = safe_int(elemento_id)
@@ -67,6 +80,7 @@ def list():
             data = {
                 "data": data_amostra,
                 "tempo_chama": tempo_chama,
+                "tempo_chama_segundos": tempo_chama_segundos,
                 "cilindro_id": cilindro_id_val,
                 "elemento_id": elemento_id_val,
                 "quantidade_amostras": quantidade_val,
@@ -106,6 +120,12 @@ def list():
                 return redirect(url_for("amostra.list"))
             
             tempo_chama = formatar_tempo_chama(hora, minuto, segundo)
+            tempo_chama_segundos = tempo_chama_para_segundos(tempo_chama)
+            
+            if tempo_chama_segundos is None:
+                flash("Tempo de chama inválido", "danger")
+                return redirect(url_for("amostra.list"))
+            
             cilindro_id_val = safe_int(cilindro_id)
             elemento_id_val = safe_int(elemento_id)
             quantidade_val = safe_int(quantidade, 1)
@@ -113,6 +133,7 @@ def list():
             data = {
                 "data": data_amostra,
                 "tempo_chama": tempo_chama,
+                "tempo_chama_segundos": tempo_chama_segundos,
                 "cilindro_id": cilindro_id_val,
                 "elemento_id": elemento_id_val,
                 "quantidade_amostras": quantidade_val
@@ -122,6 +143,8 @@ def list():
                 get_supabase_client().table("amostra").update(data).eq("id", amostra_id).eq("user_id", user_id).execute()
             else:
                 get_supabase_client().table("amostra").update(data).eq("id", amostra_id).execute()
+                # Admin pode alterar registros de outros usuários
+                invalidar_dashboard()
             
             amostra_info = get_supabase_client().table("amostra").select("cilindro_id,elemento_id").eq("id", amostra_id).execute().data
             nome_amostra = "N/A"
@@ -157,7 +180,7 @@ def list():
                 
                 get_admin_client().table("amostra").delete().eq("id", amostra_id).execute()
                 
-                registrar_historico("amostra", "excluido", nome_amostra, user_id)
+                registrar_historico("amostra", "excluido", nome_amostra, user_id, amostra_id)
                 flash("Amostra excluída com sucesso!", "success")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir amostra"), "danger")
@@ -172,49 +195,24 @@ def list():
                 return redirect(url_for("amostra.list"))
             
             try:
-                deleted_count = 0
-                not_owned = []
-                
-                for amostra_id in amostra_ids:
-                    try:
-                        amostra_info = get_supabase_client().table("amostra").select("cilindro_id,elemento_id,user_id").eq("id", amostra_id).execute().data
-                        if not amostra_info:
-                            continue
-                        
-                        if amostra_info[0].get("user_id") != user_id:
-                            not_owned.append(amostra_id)
-                            continue
-                        
-                        nome_amostra = "N/A"
-                        cilindro_nome = get_supabase_client().table("cilindro").select("codigo").eq("id", amostra_info[0]["cilindro_id"]).execute().data
-                        elemento_nome = get_supabase_client().table("elemento").select("nome").eq("id", amostra_info[0]["elemento_id"]).execute().data
-                        nome_amostra = f"{cilindro_nome[0]['codigo'] if cilindro_nome else 'N/A'} - {elemento_nome[0]['nome'] if elemento_nome else 'N/A'}"
-                        
-                        get_admin_client().table("amostra").delete().eq("id", amostra_id).execute()
-                        
-                        registrar_historico("amostra", "excluido", nome_amostra, user_id)
-                        deleted_count += 1
-                    except Exception:
-                        continue
+                resultado = excluir_em_lote(
+                    "amostra", amostra_ids, user_id, "cilindro(codigo),elemento(nome)",
+                    nome_registro=nome_amostra_lote
+                )
                 
-                if deleted_count > 0:
-                    flash(f"{deleted_count} amostra(s) excluída(s) com sucesso!", "success")
-                if not_owned:
-                    flash(f"{len(not_owned)} amostra(s) não foram excluídas (não pertencem a você)", "warning")
+                if resultado["excluidos"]:
+                    flash(f"{len(resultado['excluidos'])} amostra(s) excluída(s) com sucesso!", "success")
+                if resultado["sem_permissao"]:
+                    flash(f"{len(resultado['sem_permissao'])} amostra(s) não foram excluídas (não pertencem a você)", "warning")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir amostras"), "danger")
             
             return redirect(url_for("amostra.list"))
     
-    response = get_supabase_client().table("amostra").select("*").order("data", desc=True).execute()
-    amostras = response.data or []
-    
-    total = len(amostras)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_data = amostras[start:end]
-    
-    amostras = paginated_data
+    amostras, total = buscar_pagina(
+        get_supabase_client().table("amostra").select("*", count=PAGINACAO_COUNT).order("data", desc=True).order("id", desc=True),
+        page, per_page
+    )
     
     pages = (total + per_page - 1) // per_page
     end = min(page * per_page, total)
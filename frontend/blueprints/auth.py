@@ -5,8 +5,8 @@ from datetime import datetime, timedelta
 import jwt
 import logging
 
-from utils.supabase_utils import get_supabase_client, get_admin_client
-from blueprints.helpers import registrar_historico, is_user_active
+from utils.supabase_utils import get_auth_client, get_admin_client
+from blueprints.helpers import registrar_historico, atualizar_cache_perfil, ABAS_DEFAULT
 
 auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
@@ -64,7 +64,7 @@ def login():
             flash("Email e senha são obrigatórios", "danger")
             return redirect(url_for("auth.login"))
 
-        supabase = get_supabase_client()
+        supabase = get_auth_client()
 
         try:
             response = supabase.auth.sign_in_with_password({
@@ -83,38 +83,39 @@ def login():
                 session["supabase_token"] = response.session.access_token
                 session["jwt_token"] = generate_jwt_token(response.user.id, secret_key)
                 session.permanent = True
-                
-                if not is_user_active(response.user.id):
+
+                # Perfil criado (se faltar) e lido em uma única chamada; o
+                # resultado já vai para o cache usado pelas páginas seguintes
+                perfil = {}
+                try:
+                    nome = response.user.user_metadata.get("nome", "") if response.user.user_metadata else ""
+                    resultado = get_admin_client().rpc("entrar_perfil", {
+                        "p_id": response.user.id,
+                        "p_email": email,
+                        "p_nome": nome,
+                        "p_habilitar_abas": ABAS_DEFAULT
+                    }).execute()
+                    if resultado.data:
+                        perfil = resultado.data[0]
+                        atualizar_cache_perfil(response.user.id, resultado.data)
+                except Exception as e:
+                    logger.error(f"login: erro ao obter perfil: {str(e)}")
+                    flash("Erro ao criar/atualizar perfil.", "warning")
+
+                if perfil.get("ativo") is False:
                     session.clear()
                     flash("Usuário desativado. Contacte o administrador.", "danger")
                     return redirect(url_for("auth.login"))
-                
+
+                if perfil.get("criado"):
+                    flash("Perfil criado com sucesso!", "success")
+
                 session["user_data"] = {
                     "id": response.user.id,
                     "email": response.user.email,
                     "email_confirmed_at": response.user.email_confirmed_at,
                 }
 
-                try:
-                    from blueprints.helpers import get_authenticated_client
-                    perfil_client = get_authenticated_client()
-                    perfil = perfil_client.table("perfil").select("*").eq("id", response.user.id).execute()
-                    nome = response.user.user_metadata.get("nome", "") if response.user.user_metadata else ""
-                    
-                    if not perfil.data:
-                        get_admin_client().table("perfil").insert({
-                            "id": response.user.id,
-                            "role": "usuario",
-                            "ativo": True,
-                            "nome": nome,
-                            "email": email,
-                            "habilitar_abas": {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
-                        }).execute()
-                        flash("Perfil criado com sucesso!", "success")
-
-                except Exception as e:
-                    flash("Erro ao criar/atualizar perfil.", "warning")
-
                 user = User(response.user.id, response.user.email, session["user_data"])
                 login_user(user, remember=True, duration=timedelta(days=7))
 
@@ -169,7 +170,7 @@ def register():
             flash("A senha deve ter pelo menos 6 caracteres", "danger")
             return redirect(url_for("auth.register"))
 
-        supabase = get_supabase_client()
+        supabase = get_auth_client()
 
         try:
             try:
@@ -188,7 +189,7 @@ def register():
 
             if response.user:
                 try:
-                    get_admin_client().table("perfil").insert({
+                    novo = get_admin_client().table("perfil").insert({
                         "id": response.user.id,
                         "role": "usuario",
                         "ativo": True,
@@ -196,6 +197,7 @@ def register():
                         "email": email,
                         "habilitar_abas": {"cilindro": True, "pressao": True, "elemento": True, "amostra": True, "historico": True}
                     }).execute()
+                    atualizar_cache_perfil(response.user.id, novo.data)
                     
                     # Registrar cadastro no histórico
                     registrar_historico("perfil", "criado", email, response.user.id)
@@ -232,7 +234,7 @@ def register():
 
 @auth_bp.route("/logout")
 def logout():
-    supabase = get_supabase_client()
+    supabase = get_auth_client()
     try:
         supabase.auth.sign_out()
     except:
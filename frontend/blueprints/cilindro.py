@@ -3,11 +3,12 @@ import re
 from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 
-from utils.supabase_utils import get_supabase_client, get_admin_client
+from utils.supabase_utils import get_supabase_client, get_admin_client, buscar_pagina
 from utils.validators import safe_float
-from utils.constants import ITEMS_PER_PAGE, LITROS_EQUIVALENTES_KG, GAS_KG_DEFAULT, CUSTO_DEFAULT, CILINDRO_STATUS
+from utils.constants import ITEMS_PER_PAGE, PAGINACAO_COUNT, LITROS_EQUIVALENTES_KG, GAS_KG_DEFAULT, CUSTO_DEFAULT, CILINDRO_STATUS
 from utils.erros_utils import formatar_erro_supabase
-from blueprints.helpers import get_user_id, is_admin, registrar_historico, pode_acessar_aba
+from utils.cache import invalidar_dashboard
+from blueprints.helpers import get_user_id, is_admin, registrar_historico, excluir_em_lote, pode_acessar_aba, amostras_vinculadas
 
 cilindro_bp = Blueprint('cilindro', __name__)
 
@@ -22,8 +23,8 @@ def list():
     user_id = get_user_id()
     admin = is_admin()
     
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", ITEMS_PER_PAGE, type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", ITEMS_PER_PAGE, type=int), 1), 100)
     
     if request.method == "POST":
         action = request.form.get("action")
@@ -155,6 +156,8 @@ def list():
                     get_supabase_client().table("cilindro").update(data).eq("id", cilindro_id).eq("user_id", user_id).execute()
                 else:
                     get_supabase_client().table("cilindro").update(data).eq("id", cilindro_id).execute()
+                    # Admin pode alterar registros de outros usuários
+                    invalidar_dashboard()
                 
                 registrar_historico("cilindro", "atualizado", codigo, user_id)
                 flash("Cilindro atualizado com sucesso!", "success")
@@ -180,14 +183,14 @@ def list():
                 
                 cilindro_codigo = cilindro_info[0].get("codigo")
                 
-                amostra_count = get_supabase_client().table("amostra").select("id", count="exact").eq("cilindro_id", cilindro_id).execute()
-                if amostra_count.count and amostra_count.count > 0:
+                amostra_count = amostras_vinculadas("cilindro", cilindro_id)
+                if amostra_count > 0:
                     flash("Não é possível excluir este cilindro pois existem amostras vinculadas a ele. Exclua primeiro as amostras.", "warning")
                     return redirect(url_for("cilindro.list"))
                 
                 get_admin_client().table("cilindro").delete().eq("id", cilindro_id).execute()
                 
-                registrar_historico("cilindro", "excluido", cilindro_codigo, user_id)
+                registrar_historico("cilindro", "excluido", cilindro_codigo, user_id, cilindro_id)
                 flash("Cilindro excluído com sucesso!", "success")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir cilindro"), "danger")
@@ -202,54 +205,27 @@ def list():
                 return redirect(url_for("cilindro.list"))
             
             try:
-                deleted_count = 0
-                skipped = []
-                not_owned = []
+                resultado = excluir_em_lote(
+                    "cilindro", cilindro_ids, user_id, "codigo",
+                    nome_registro=lambda c: c.get("codigo") or str(c["id"]),
+                    coluna_dependencia="cilindro_id"
+                )
                 
-                for cilindro_id in cilindro_ids:
-                    try:
-                        cilindro_info = get_supabase_client().table("cilindro").select("codigo,user_id").eq("id", cilindro_id).execute().data
-                        if not cilindro_info:
-                            continue
-                        
-                        if cilindro_info[0].get("user_id") != user_id:
-                            not_owned.append(cilindro_info[0].get("codigo", cilindro_id))
-                            continue
-                        
-                        cilindro_codigo = cilindro_info[0].get("codigo")
-                        
-                        amostra_count = get_supabase_client().table("amostra").select("id", count="exact").eq("cilindro_id", cilindro_id).execute()
-                        if amostra_count.count and amostra_count.count > 0:
-                            skipped.append(cilindro_codigo)
-                            continue
-                        
-                        get_admin_client().table("cilindro").delete().eq("id", cilindro_id).execute()
-                        
-                        registrar_historico("cilindro", "excluido", cilindro_codigo, user_id)
-                        deleted_count += 1
-                    except Exception:
-                        continue
-                
-                if deleted_count > 0:
-                    flash(f"{deleted_count} cilindro(s) excluído(s) com sucesso!", "success")
-                if skipped:
-                    flash(f"Alguns cilindos não puderam ser excluídos (amostras vinculadas): {', '.join(skipped)}", "warning")
-                if not_owned:
-                    flash(f"Alguns cilindos não foram excluídos (não pertencem a você): {', '.join(not_owned)}", "warning")
+                if resultado["excluidos"]:
+                    flash(f"{len(resultado['excluidos'])} cilindro(s) excluído(s) com sucesso!", "success")
+                if resultado["com_dependencia"]:
+                    flash(f"Alguns cilindos não puderam ser excluídos (amostras vinculadas): {', '.join(resultado['com_dependencia'])}", "warning")
+                if resultado["sem_permissao"]:
+                    flash(f"Alguns cilindos não foram excluídos (não pertencem a você): {', '.join(resultado['sem_permissao'])}", "warning")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir cilindros"), "danger")
             
             return redirect(url_for("cilindro.list"))
     
-    response = get_supabase_client().table("cilindro").select("*").order("created_at", desc=True).execute()
-    cilindro = response.data or []
-    
-    total = len(cilindro)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_data = cilindro[start:end]
-    
-    cilindro = paginated_data
+    cilindro, total = buscar_pagina(
+        get_supabase_client().table("cilindro").select("*", count=PAGINACAO_COUNT).order("created_at", desc=True).order("id", desc=True),
+        page, per_page
+    )
     
     pages = (total + per_page - 1) // per_page
     end = min(page * per_page, total)
@@ -1,11 +1,12 @@
 # Elemento blueprint - CRUD operations
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 
-from utils.supabase_utils import get_supabase_client, get_admin_client
+from utils.supabase_utils import get_supabase_client, get_admin_client, buscar_pagina
 from utils.validators import safe_float
-from utils.constants import ITEMS_PER_PAGE
+from utils.constants import ITEMS_PER_PAGE, PAGINACAO_COUNT
 from utils.erros_utils import formatar_erro_supabase
-from blueprints.helpers import get_user_id, is_admin, registrar_historico, pode_acessar_aba
+from utils.cache import invalidar_dashboard
+from blueprints.helpers import get_user_id, is_admin, registrar_historico, excluir_em_lote, pode_acessar_aba, amostras_vinculadas
 
 elemento_bp = Blueprint('elemento', __name__)
 
@@ -20,8 +21,8 @@ def list():
     user_id = get_user_id()
     admin = is_admin()
     
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", ITEMS_PER_PAGE, type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", ITEMS_PER_PAGE, type=int), 1), 100)
     
     if request.method == "POST":
         action = request.form.get("action")
@@ -86,6 +87,8 @@ def list():
                 get_supabase_client().table("elemento").update(data).eq("id", elemento_id).eq("user_id", user_id).execute()
             else:
                 get_supabase_client().table("elemento").update(data).eq("id", elemento_id).execute()
+                # Admin pode alterar registros de outros usuários
+                invalidar_dashboard()
             
             registrar_historico("elemento", "atualizado", nome, user_id)
             flash("Elemento atualizado com sucesso!", "success")
@@ -108,15 +111,15 @@ def list():
             
             elemento_nome = elemento_info[0].get("nome")
             
-            amostra_count = get_supabase_client().table("amostra").select("id", count="exact").eq("elemento_id", elemento_id).execute()
-            if amostra_count.count and amostra_count.count > 0:
+            amostra_count = amostras_vinculadas("elemento", elemento_id)
+            if amostra_count > 0:
                 flash("Não é possível excluir este elemento pois existem amostras vinculadas a ele. Exclua primeiro as amostras.", "warning")
                 return redirect(url_for("elemento.list"))
             
             try:
                 get_admin_client().table("elemento").delete().eq("id", elemento_id).execute()
                 
-                registrar_historico("elemento", "excluido", elemento_nome, user_id)
+                registrar_historico("elemento", "excluido", elemento_nome, user_id, elemento_id)
                 flash("Elemento excluído com sucesso!", "success")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir elemento"), "danger")
@@ -131,54 +134,27 @@ def list():
                 return redirect(url_for("elemento.list"))
             
             try:
-                deleted_count = 0
-                skipped = []
-                not_owned = []
+                resultado = excluir_em_lote(
+                    "elemento", elemento_ids, user_id, "nome",
+                    nome_registro=lambda e: e.get("nome") or str(e["id"]),
+                    coluna_dependencia="elemento_id"
+                )
                 
-                for elemento_id in elemento_ids:
-                    try:
-                        elemento_info = get_supabase_client().table("elemento").select("nome,user_id").eq("id", elemento_id).execute().data
-                        if not elemento_info:
-                            continue
-                        
-                        if elemento_info[0].get("user_id") != user_id:
-                            not_owned.append(elemento_info[0].get("nome", elemento_id))
-                            continue
-                        
-                        elemento_nome = elemento_info[0].get("nome")
-                        
-                        amostra_count = get_supabase_client().table("amostra").select("id", count="exact").eq("elemento_id", elemento_id).execute()
-                        if amostra_count.count and amostra_count.count > 0:
-                            skipped.append(elemento_nome)
-                            continue
-                        
-                        get_admin_client().table("elemento").delete().eq("id", elemento_id).execute()
-                        
-                        registrar_historico("elemento", "excluido", elemento_nome, user_id)
-                        deleted_count += 1
-                    except Exception:
-                        continue
-                
-                if deleted_count > 0:
-                    flash(f"{deleted_count} elemento(s) excluído(s) com sucesso!", "success")
-                if skipped:
-                    flash(f"Alguns elementos não puderam ser excluídos (amostras vinculadas): {', '.join(skipped)}", "warning")
-                if not_owned:
-                    flash(f"Alguns elementos não foram excluídos (não pertencem a você): {', '.join(not_owned)}", "warning")
+                if resultado["excluidos"]:
+                    flash(f"{len(resultado['excluidos'])} elemento(s) excluído(s) com sucesso!", "success")
+                if resultado["com_dependencia"]:
+                    flash(f"Alguns elementos não puderam ser excluídos (amostras vinculadas): {', '.join(resultado['com_dependencia'])}", "warning")
+                if resultado["sem_permissao"]:
+                    flash(f"Alguns elementos não foram excluídos (não pertencem a você): {', '.join(resultado['sem_permissao'])}", "warning")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir elementos"), "danger")
             
             return redirect(url_for("elemento.list"))
     
-    response = get_supabase_client().table("elemento").select("*").order("nome", desc=False).execute()
-    elementos = response.data or []
-    
-    total = len(elementos)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_data = elementos[start:end]
-    
-    elementos = paginated_data
+    elementos, total = buscar_pagina(
+        get_supabase_client().table("elemento").select("*", count=PAGINACAO_COUNT).order("nome", desc=False).order("id"),
+        page, per_page
+    )
     
     pages = (total + per_page - 1) // per_page
     end = min(page * per_page, total)
@@ -11,44 +11,103 @@ def get_user_id():
 
 
 def is_admin():
-    """Verifica se o usuário atual é admin - usa cache da sessão"""
-    cached = session.get('cached_user_info', {})
-    return cached.get('is_admin', False)
+    """Verifica se o usuário atual é admin - usa o cache do perfil
+
+    Com o cache em memória, um admin rebaixado em outro worker continuaria
+    admin neste até o PERFIL_CACHE_TTL; nesse caso a role de admin em cache
+    é confirmada no banco (uma vez por requisição).
+    """
+    if perfil_atual().get("role") != "admin":
+        return False
+    return revalidar_perfil_atual().get("role") == "admin"
 
 
 def is_user_active(user_id):
     """Verifica se o usuário está ativo"""
-    try:
-        from utils.supabase_utils import get_supabase_client
-        supabase = get_authenticated_client()
-        response = supabase.table("perfil").select("ativo").eq("id", user_id).execute()
-        if response.data:
-            return response.data[0].get("ativo", True)
-    except Exception as e:
-        logger.error(f"is_user_active: erro: {str(e)}")
-    return True
+    return obter_perfil(user_id).get("ativo") is not False
 
 
 def get_user_role():
-    """Retorna o role do usuário atual - usa cache da sessão"""
-    cached = session.get('cached_user_info', {})
-    return cached.get('user_role', 'usuario')
+    """Retorna o role do usuário atual - usa o cache do perfil"""
+    return perfil_atual().get("role") or "usuario"
 
 
 def get_user_name():
-    """Retorna o nome do usuário atual - usa cache da sessão"""
-    cached = session.get('cached_user_info', {})
-    return cached.get('user_name', '')
+    """Retorna o nome do usuário atual - usa o cache do perfil"""
+    return perfil_atual().get("nome") or ""
+
+
+# Colunas do perfil guardadas no cache (utils/cache.py); versao é
+# incrementada pelo banco a cada alteração de role, ativo, nome ou abas
+COLUNAS_PERFIL = ("id", "role", "nome", "ativo", "habilitar_abas", "versao")
+
+
+def obter_perfil(user_id):
+    """Perfil do usuário (COLUNAS_PERFIL) lido do cache ou, na falta, do banco."""
+    from utils.cache import obter_perfil_cache, salvar_perfil_cache
+    perfil = obter_perfil_cache(user_id)
+    if perfil is not None:
+        return perfil
+    try:
+        response = get_admin_client().table("perfil").select(",".join(COLUNAS_PERFIL)).eq("id", user_id).execute()
+    except Exception as e:
+        logger.error(f"obter_perfil: erro: {str(e)}")
+        return {"id": user_id}
+    perfil = response.data[0] if response.data else {"id": user_id, "versao": 0}
+    salvar_perfil_cache(user_id, perfil)
+    return perfil
+
+
+def perfil_atual():
+    """Perfil do usuário logado, consultado uma única vez por requisição."""
+    from flask import g
+    user_id = get_user_id()
+    if not user_id:
+        return {}
+    if g.get("perfil_atual", {}).get("id") != user_id:
+        g.perfil_atual = obter_perfil(user_id)
+    return g.perfil_atual
+
+
+def revalidar_perfil_atual():
+    """Perfil do usuário logado confirmado pela versao no banco, se o cache não for compartilhado."""
+    from flask import g
+    from utils.cache import perfil_cache_compartilhado, salvar_perfil_cache
+    perfil = perfil_atual()
+    if perfil_cache_compartilhado() or g.get("perfil_revalidado") == perfil.get("id"):
+        return perfil
+    user_id = perfil.get("id")
+    try:
+        response = get_admin_client().table("perfil").select(",".join(COLUNAS_PERFIL)).eq("id", user_id).execute()
+    except Exception as e:
+        logger.error(f"revalidar_perfil_atual: erro: {str(e)}")
+        return {"id": user_id}
+    banco = response.data[0] if response.data else {"id": user_id, "versao": 0}
+    if banco.get("versao") != perfil.get("versao"):
+        salvar_perfil_cache(user_id, banco)
+    g.perfil_atual = banco
+    g.perfil_revalidado = user_id
+    return banco
+
+
+def atualizar_cache_perfil(user_id, linhas):
+    """Atualiza o cache com o perfil retornado por um insert/update (ou o invalida)."""
+    from flask import g
+    from utils.cache import salvar_perfil_cache, invalidar_perfil_cache
+    if linhas:
+        salvar_perfil_cache(user_id, {coluna: linhas[0].get(coluna) for coluna in COLUNAS_PERFIL})
+    else:
+        invalidar_perfil_cache(user_id)
+    if g.get("perfil_atual", {}).get("id") == user_id:
+        g.pop("perfil_atual", None)
 
 
 def get_authenticated_client():
     """Retorna cliente Supabase autenticado com token JWT do usuário"""
-    from utils.supabase_utils import get_supabase_client
+    from utils.supabase_utils import get_supabase_client, get_user_client
     token = session.get("supabase_token")
     if token:
-        client = get_supabase_client()
-        client.auth.set_session(token, "")
-        return client
+        return get_user_client(token)
     return get_supabase_client()
 
 
@@ -58,22 +117,106 @@ def get_admin_client():
     return supabase_admin()
 
 
-def registrar_historico(tipo, acao, nome, user_id):
-    """Registra uma ação no histórico"""
-    from utils.supabase_utils import get_admin_client
+TIPOS_DASHBOARD = ("cilindro", "elemento", "amostra")
+
+# Colunas de user_stats (mantida por triggers no banco) por tabela contada
+CONTADOR_POR_TABELA = {"cilindro": "cilindros", "elemento": "elementos", "amostra": "amostras", "pressao": "pressoes"}
+CONTADORES_USUARIO = tuple(CONTADOR_POR_TABELA.values())
+
+
+def contadores_usuario(linha):
+    """Contadores de uma linha de user_stats; zeros se o usuário não tiver linha."""
+    linha = linha or {}
+    return {c: linha.get(c) or 0 for c in CONTADORES_USUARIO}
+
+
+def amostras_vinculadas(tipo, registro_id):
+    """Quantidade de amostras ligadas a um cilindro ou elemento (contador cilindro_stats/elemento_stats)."""
+    from utils.supabase_utils import get_supabase_client
+    response = get_supabase_client().table(f"{tipo}_stats").select("amostras").eq(f"{tipo}_id", registro_id).execute()
+    return response.data[0].get("amostras", 0) if response.data else 0
+
+
+def registrar_historico(tipo, acao, nome, user_id, registro_id=None):
+    """Registra uma ação no histórico e invalida o cache do dashboard do usuário"""
+    registrar_historico_lote(tipo, acao, [nome], user_id, None if registro_id is None else [registro_id])
+
+
+def registrar_historico_lote(tipo, acao, nomes, user_id, registro_ids=None):
+    """Registra várias ações do mesmo tipo no histórico.
+
+    A invalidação do dashboard é imediata; a gravação no historico_log é
+    feita em lote, fora da requisição, pelo escritor de utils/auditoria.py.
+    registro_ids (mesma ordem de nomes) identifica os registros afetados;
+    nas exclusões é o que a exportação incremental usa como tombstone.
+    """
+    from utils.cache import invalidar_dashboard
+    from utils.auditoria import registrar_eventos
+    from utils.validators import safe_int
+    if not nomes:
+        return
+    if tipo in TIPOS_DASHBOARD:
+        invalidar_dashboard(user_id)
     try:
-        client = get_admin_client()
-        client.table("historico_log").insert({
-            "tipo": tipo,
-            "acao": acao,
-            "nome": nome,
-            "user_id": user_id
-        }).execute()
-        logger.info(f"Histórico registrado: {tipo} | {acao} | {nome} | User: {user_id}")
+        registro_ids = [safe_int(i) for i in registro_ids] if registro_ids else [None] * len(nomes)
+        registrar_eventos([
+            {"tipo": tipo, "acao": acao, "nome": nome, "user_id": user_id, "registro_id": registro_id}
+            for nome, registro_id in zip(nomes, registro_ids)
+        ])
+        logger.info(f"Histórico registrado: {tipo} | {acao} | {len(nomes)} registro(s) | User: {user_id}")
     except Exception as e:
         logger.error(f"Erro ao registrar histórico: {str(e)}")
 
 
+def excluir_em_lote(tipo, ids, user_id, colunas, nome_registro, coluna_dependencia=None, admin=False):
+    """Exclui vários registros de uma tabela com um número fixo de consultas.
+
+    Independente da quantidade selecionada: um select com .in_() para
+    verificar o dono e montar os nomes (colunas pode embutir relações, ex:
+    "cilindro(codigo)"), uma contagem agrupada de amostras vinculadas (se
+    coluna_dependencia for informada), um delete e um insert no histórico.
+
+    Retorna dict com as listas de nomes "excluidos", "com_dependencia" e
+    "sem_permissao". IDs inexistentes são ignorados.
+    """
+    from utils.supabase_utils import get_supabase_client, get_admin_client
+    from utils.validators import safe_int
+
+    ids = list({i for i in (safe_int(v) for v in ids) if i is not None})
+    resultado = {"excluidos": [], "com_dependencia": [], "sem_permissao": []}
+    if not ids:
+        return resultado
+
+    registros = get_supabase_client().table(tipo).select(f"id,user_id,{colunas}").in_("id", ids).execute().data or []
+
+    permitidos = {}
+    for registro in registros:
+        if not admin and registro.get("user_id") != user_id:
+            resultado["sem_permissao"].append(nome_registro(registro))
+        else:
+            permitidos[registro["id"]] = registro
+
+    if permitidos and coluna_dependencia:
+        contagens = get_supabase_client().rpc("contar_amostras_vinculadas", {
+            "p_coluna": coluna_dependencia,
+            "p_ids": list(permitidos)
+        }).execute().data or []
+        for linha in contagens:
+            registro = permitidos.pop(linha.get("referencia_id"), None)
+            if registro is not None and linha.get("total"):
+                resultado["com_dependencia"].append(nome_registro(registro))
+
+    if not permitidos:
+        return resultado
+
+    excluidos = get_admin_client().table(tipo).delete().in_("id", list(permitidos)).execute().data or []
+    excluidos_ids = [r["id"] for r in excluidos if r.get("id") in permitidos]
+    resultado["excluidos"] = [nome_registro(permitidos[i]) for i in excluidos_ids]
+
+    registrar_historico_lote(tipo, "excluido", resultado["excluidos"], user_id, excluidos_ids)
+    return resultado
+
+
 ABAS_DISPONIVEIS = ["cilindro", "pressao", "elemento", "amostra", "historico"]
 ABAS_DEFAULT = {aba: True for aba in ABAS_DISPONIVEIS}
 
@@ -92,19 +235,22 @@ def pode_acessar_aba(aba):
 
 
 def get_habilitar_abas(user_id=None):
-    """Retorna o dicionário de abas habilitadas para o usuário - usa cache da sessão"""
+    """Retorna o dicionário de abas habilitadas para o usuário - usa o cache do perfil"""
     if user_id is None:
         user_id = get_user_id()
     
     if not user_id:
         return ABAS_DEFAULT.copy()
     
-    cached = session.get('cached_user_info', {})
-    
-    if cached.get('is_admin'):
+    return abas_do_perfil(perfil_atual() if user_id == get_user_id() else obter_perfil(user_id))
+
+
+def abas_do_perfil(perfil):
+    """Abas habilitadas a partir de uma linha de perfil (admin acessa todas)."""
+    if perfil.get("role") == "admin":
         return {aba: True for aba in ABAS_DISPONIVEIS}
     
-    habilitar_abas = cached.get('habilitar_abas')
+    habilitar_abas = perfil.get("habilitar_abas")
     if habilitar_abas:
         return {aba: habilitar_abas.get(aba, True) for aba in ABAS_DISPONIVEIS}
     
@@ -2,7 +2,7 @@
 from flask import Blueprint, render_template, flash, redirect, request, url_for
 
 from utils.supabase_utils import get_supabase_client
-from utils.supabase_utils import buscar_perfis_usuarios
+from utils.supabase_utils import buscar_perfis_usuarios, buscar_pagina_cursor
 from blueprints.helpers import get_user_id, is_admin, pode_acessar_aba
 
 historico_bp = Blueprint('historico', __name__)
@@ -17,13 +17,14 @@ def list():
     user_id = get_user_id()
     admin = is_admin()
     
-    page = int(request.args.get("page", 1))
+    cursor = request.args.get("cursor")
+    direcao = request.args.get("dir", "proxima")
     per_page = 20
-    offset = (page - 1) * per_page
     
-    historico_log = get_supabase_client().table("historico_log").select("*").order("created_at", desc=True).range(offset, offset + per_page - 1).execute().data or []
-    
-    total = get_supabase_client().table("historico_log").select("*", count="exact").execute().count or 0
+    historico_log, cursor_proxima, cursor_anterior, total = buscar_pagina_cursor(
+        get_supabase_client().table("historico_log").select("*", count="estimated"),
+        per_page, cursor, direcao
+    )
     
     all_user_ids = {h.get("user_id") for h in historico_log if h.get("user_id")}
     user_map = buscar_perfis_usuarios(all_user_ids)
@@ -42,4 +43,11 @@ def list():
             "usuario_nome": user_map.get(h.get("user_id"), '-')
         })
     
-    return render_template("historico.html", history=history, page=page, per_page=per_page, total=total)
+    return render_template(
+        "historico.html",
+        history=history,
+        per_page=per_page,
+        total=total,
+        cursor_proxima=cursor_proxima,
+        cursor_anterior=cursor_anterior
+    )
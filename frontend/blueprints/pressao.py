@@ -2,15 +2,23 @@
 from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 
-from utils.supabase_utils import get_supabase_client, get_admin_client
+from utils.supabase_utils import get_supabase_client, get_admin_client, buscar_pagina
 from utils.validators import safe_float
-from utils.constants import ITEMS_PER_PAGE
+from utils.constants import ITEMS_PER_PAGE, PAGINACAO_COUNT
 from utils.erros_utils import formatar_erro_supabase
-from blueprints.helpers import get_user_id, is_admin, registrar_historico, pode_acessar_aba, get_authenticated_client
+from blueprints.helpers import get_user_id, is_admin, registrar_historico, excluir_em_lote, pode_acessar_aba, get_authenticated_client
 
 pressao_bp = Blueprint('pressao', __name__)
 
 
+def nome_pressao_lote(pressao):
+    """Nome do registro de pressão no histórico a partir da relação embutida cilindro(codigo)"""
+    cilindro_codigo = (pressao.get("cilindro") or {}).get("codigo") or str(pressao.get("cilindro_id"))
+    temp_val = pressao.get("temperatura")
+    temp_str = f", {temp_val}°C" if temp_val is not None else ""
+    return f"{cilindro_codigo} - {pressao.get('pressao')} bar{temp_str}"
+
+
 @pressao_bp.route("/pressoes", methods=["GET", "POST"])
 def pressao_list():
     if not pode_acessar_aba("pressao"):
@@ -20,8 +28,8 @@ def pressao_list():
     user_id = get_user_id()
     admin = is_admin()
     
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", ITEMS_PER_PAGE, type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", ITEMS_PER_PAGE, type=int), 1), 100)
     
     if request.method == "POST":
         action = request.form.get("action")
@@ -191,7 +199,7 @@ def pressao_list():
                 get_admin_client().table("pressao").delete().eq("id", pressao_id).execute()
                 
                 temp_str = f", {temp_val}°C" if temp_val is not None else ""
-                registrar_historico("pressao", "excluido", f"{cilindro_codigo} - {pressao_val} bar{temp_str}", user_id)
+                registrar_historico("pressao", "excluido", f"{cilindro_codigo} - {pressao_val} bar{temp_str}", user_id, pressao_id)
                 flash("Registro de pressão excluído com sucesso!", "success")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir pressão"), "danger")
@@ -206,45 +214,24 @@ def pressao_list():
                 return redirect(url_for("pressao.pressao_list"))
             
             try:
-                deleted_count = 0
-                not_owned = []
-                
-                for pressao_id in pressao_ids:
-                    try:
-                        pressao_info = get_supabase_client().table("pressao").select("cilindro_id,pressao,temperatura,user_id").eq("id", pressao_id).execute().data
-                        if not pressao_info:
-                            continue
-                        
-                        if not admin and pressao_info[0].get("user_id") != user_id:
-                            not_owned.append(pressao_id)
-                            continue
-                        
-                        cilindro_id = pressao_info[0].get("cilindro_id")
-                        pressao_val = pressao_info[0].get("pressao")
-                        temp_val = pressao_info[0].get("temperatura")
-                        
-                        cilindro_info = get_supabase_client().table("cilindro").select("codigo").eq("id", cilindro_id).execute().data
-                        cilindro_codigo = cilindro_info[0].get("codigo") if cilindro_info else str(cilindro_id)
-                        
-                        get_admin_client().table("pressao").delete().eq("id", pressao_id).execute()
-                        
-                        temp_str = f", {temp_val}°C" if temp_val is not None else ""
-                        registrar_historico("pressao", "excluido", f"{cilindro_codigo} - {pressao_val} bar{temp_str}", user_id)
-                        deleted_count += 1
-                    except Exception:
-                        continue
+                resultado = excluir_em_lote(
+                    "pressao", pressao_ids, user_id, "cilindro_id,pressao,temperatura,cilindro(codigo)",
+                    nome_registro=nome_pressao_lote, admin=admin
+                )
                 
-                if deleted_count > 0:
-                    flash(f"{deleted_count} registro(s) excluído(s) com sucesso!", "success")
-                if not_owned:
-                    flash(f"Alguns registros não foram excluídos (não pertencem a você): {', '.join(not_owned)}", "warning")
+                if resultado["excluidos"]:
+                    flash(f"{len(resultado['excluidos'])} registro(s) excluído(s) com sucesso!", "success")
+                if resultado["sem_permissao"]:
+                    flash(f"Alguns registros não foram excluídos (não pertencem a você): {', '.join(resultado['sem_permissao'])}", "warning")
             except Exception as e:
                 flash(formatar_erro_supabase(str(e), "excluir registros"), "danger")
             
             return redirect(url_for("pressao.pressao_list"))
     
-    response = get_supabase_client().table("pressao").select("*").order("created_at", desc=True).execute()
-    pressoes = response.data or []
+    pressoes, total = buscar_pagina(
+        get_supabase_client().table("pressao").select("*", count=PAGINACAO_COUNT).order("created_at", desc=True).order("id", desc=True),
+        page, per_page
+    )
     
     cilindro_list_response = get_authenticated_client().table("cilindro").select("id,codigo").eq("user_id", user_id).order("codigo").execute()
     cilindro_list = cilindro_list_response.data or []
@@ -254,13 +241,6 @@ def pressao_list():
     for p in pressoes:
         p["cilindro_codigo"] = cilindro_dict.get(p.get("cilindro_id"), "")
     
-    total = len(pressoes)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_data = pressoes[start:end]
-    
-    pressoes = paginated_data
-    
     pages = (total + per_page - 1) // per_page if total > 0 else 1
     end_page = min(page * per_page, total) if total > 0 else 0
     max_pages = min(pages, 10)
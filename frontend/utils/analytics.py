@@ -0,0 +1,133 @@
+# Columnar analytics for amostras (dashboard and admin export)
+import numpy as np
+
+# Chave de par cilindro × elemento: cilindro nos 32 bits altos, elemento nos baixos.
+# IDs nulos viram 0 (SERIAL começa em 1).
+_DESLOCAMENTO = np.int64(32)
+_MASCARA = np.int64(0xFFFFFFFF)
+
+
+def _reduzir(chaves, *pesos):
+    """Agrupa por chave e soma cada array de pesos; retorna (chaves_unicas, *somas)."""
+    unicas, inverso = np.unique(chaves, return_inverse=True)
+    somas = [np.bincount(inverso, weights=p, minlength=len(unicas)).round().astype(np.int64) for p in pesos]
+    return (unicas, *somas)
+
+
+def _para_dict(chaves, valores):
+    return dict(zip(chaves.tolist(), valores.tolist()))
+
+
+def _top(chaves, valores, k):
+    """Retorna os k maiores (chave, valor) em ordem decrescente de valor."""
+    if len(valores) > k:
+        indices = np.argpartition(-valores, k - 1)[:k]
+    else:
+        indices = np.arange(len(valores))
+    indices = indices[np.argsort(-valores[indices], kind="stable")]
+    return list(zip(chaves[indices].tolist(), valores[indices].tolist()))
+
+
+class ResumoAmostras:
+    """Agregados de amostras por par cilindro × elemento, já reduzidos."""
+
+    def __init__(self, pares, quantidade, segundos):
+        self.pares = pares
+        self.quantidade = quantidade
+        self.segundos = segundos
+        self.cilindro_ids = pares >> _DESLOCAMENTO
+        self.elemento_ids = pares & _MASCARA
+
+    @property
+    def total(self):
+        return int(self.quantidade.sum())
+
+    def por_cilindro(self):
+        """{cilindro_id: quantidade} ignorando amostras sem cilindro."""
+        validos = self.cilindro_ids > 0
+        ids, qtd = _reduzir(self.cilindro_ids[validos], self.quantidade[validos])
+        return _para_dict(ids, qtd)
+
+    def por_elemento(self):
+        """{elemento_id: quantidade} ignorando amostras sem elemento."""
+        validos = self.elemento_ids > 0
+        ids, qtd = _reduzir(self.elemento_ids[validos], self.quantidade[validos])
+        return _para_dict(ids, qtd)
+
+    def segundos_por_elemento(self):
+        """{elemento_id: segundos de chama} ignorando amostras sem elemento."""
+        validos = self.elemento_ids > 0
+        ids, seg = _reduzir(self.elemento_ids[validos], self.segundos[validos])
+        return _para_dict(ids, seg)
+
+    def top_elementos(self, k):
+        """[(elemento_id, quantidade)] dos k elementos mais analisados."""
+        validos = self.elemento_ids > 0
+        ids, qtd = _reduzir(self.elemento_ids[validos], self.quantidade[validos])
+        return _top(ids, qtd, k)
+
+    def matriz(self):
+        """{(cilindro_id, elemento_id): quantidade} para pares com os dois IDs."""
+        validos = (self.cilindro_ids > 0) & (self.elemento_ids > 0)
+        return {
+            (c, e): q for c, e, q in zip(
+                self.cilindro_ids[validos].tolist(),
+                self.elemento_ids[validos].tolist(),
+                self.quantidade[validos].tolist()
+            )
+        }
+
+    def top_pares(self, k):
+        """[((cilindro_id, elemento_id), quantidade)] dos k pares com mais amostras."""
+        validos = (self.cilindro_ids > 0) & (self.elemento_ids > 0)
+        return [
+            ((int(par >> _DESLOCAMENTO), int(par & _MASCARA)), qtd)
+            for par, qtd in _top(self.pares[validos], self.quantidade[validos], k)
+        ]
+
+
+class AgregadorAmostras:
+    """Carrega amostras em colunas e agrega em uma única passada.
+
+    Aceita tanto linhas cruas de amostra quanto grupos já reduzidos pelo
+    banco (dashboard_agregados), bastando informar os nomes dos campos.
+    Pode receber várias partes (ex: chunks de uma exportação); cada parte é
+    reduzida por par cilindro × elemento antes de ser guardada.
+    """
+
+    def __init__(self, campo_quantidade="quantidade_amostras", campo_segundos="tempo_chama_segundos"):
+        self.campo_quantidade = campo_quantidade
+        self.campo_segundos = campo_segundos
+        self._partes = []
+
+    def adicionar(self, linhas):
+        if not linhas:
+            return self
+        cq, cs = self.campo_quantidade, self.campo_segundos
+        colunas = np.array([
+            (
+                linha.get("cilindro_id") or 0,
+                linha.get("elemento_id") or 0,
+                1 if linha.get(cq) is None else linha.get(cq),
+                linha.get(cs) or 0,
+            )
+            for linha in linhas
+        ], dtype=np.int64)
+        pares = (colunas[:, 0] << _DESLOCAMENTO) | colunas[:, 1]
+        self._partes.append(_reduzir(pares, colunas[:, 2], colunas[:, 3]))
+        return self
+
+    def resumo(self):
+        if not self._partes:
+            vazio = np.zeros(0, dtype=np.int64)
+            return ResumoAmostras(vazio, vazio, vazio)
+        if len(self._partes) == 1:
+            return ResumoAmostras(*self._partes[0])
+        pares, quantidade, segundos = (np.concatenate(col) for col in zip(*self._partes))
+        self._partes = [_reduzir(pares, quantidade, segundos)]
+        return ResumoAmostras(*self._partes[0])
+
+
+def resumir_amostras(linhas, campo_quantidade="quantidade_amostras", campo_segundos="tempo_chama_segundos"):
+    """Atalho para agregar uma lista de linhas de uma vez."""
+    return AgregadorAmostras(campo_quantidade, campo_segundos).adicionar(linhas).resumo()
@@ -0,0 +1,246 @@
+# Escritor assíncrono do histórico (historico_log)
+import os
+import json
+import queue
+import atexit
+import logging
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from postgrest.exceptions import APIError
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# "assincrono": eventos vão para uma fila e são gravados em lote por uma thread.
+# "sincrono": cada chamada grava na hora (padrão na Vercel, onde a função pode
+# ser congelada logo após a resposta).
+AUDITORIA_MODO = os.getenv("AUDITORIA_MODO", "sincrono" if os.getenv("VERCEL") else "assincrono")
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", "50"))
+AUDITORIA_INTERVALO_MS = int(os.getenv("AUDITORIA_INTERVALO_MS", "500"))
+AUDITORIA_ARQUIVO = os.getenv("AUDITORIA_ARQUIVO") or os.path.join(tempfile.gettempdir(), "labgas_historico_pendente.jsonl")
+# Tempo máximo de espera pela thread ao encerrar o processo
+AUDITORIA_ENCERRAMENTO_S = int(os.getenv("AUDITORIA_ENCERRAMENTO_S", "10"))
+
+# Colocado na fila para a thread gravar o que já retirou e terminar
+_PARAR = object()
+
+
+class _EnvioInterrompido(Exception):
+    """Falha no envio linha a linha; as `tratadas` primeiras linhas já foram gravadas ou descartadas."""
+
+    def __init__(self, erro, tratadas):
+        super().__init__(str(erro))
+        self.tratadas = tratadas
+
+
+def _erro_de_dados(erro):
+    # SQLSTATE 22xxx/23xxx (ex: usuário excluído): nova tentativa não resolve
+    return isinstance(erro, APIError) and str(erro.code or "").startswith(("22", "23"))
+
+
+def _inserir_historico(linhas):
+    from utils.supabase_utils import get_admin_client
+    get_admin_client().table("historico_log").insert(linhas).execute()
+
+
+class EscritorAuditoria:
+    """Fila de eventos do histórico gravada em inserts de várias linhas.
+
+    Grava a cada `tamanho_lote` eventos ou a cada `intervalo_ms`, o que vier
+    primeiro. Se o banco estiver inacessível, o lote é anexado a um arquivo
+    JSONL local e reenviado na próxima gravação bem-sucedida. O arquivo é
+    compartilhado pelos workers da máquina e protegido por uma trava de
+    arquivo (flock). Ao encerrar o processo, a thread termina o lote em
+    andamento e o que restar na fila é gravado.
+    """
+
+    def __init__(self, inserir=_inserir_historico, tamanho_lote=AUDITORIA_LOTE,
+                 intervalo_ms=AUDITORIA_INTERVALO_MS, arquivo=AUDITORIA_ARQUIVO):
+        self.inserir = inserir
+        self.tamanho_lote = max(tamanho_lote, 1)
+        self.intervalo = max(intervalo_ms, 1) / 1000
+        self.arquivo = arquivo
+        self._fila = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._parar = False
+        self._lock = threading.Lock()
+        self._gravacao_lock = threading.Lock()
+
+    def registrar(self, eventos):
+        """Enfileira eventos (dicts com tipo, acao, nome e user_id) sem bloquear a requisição."""
+        self._iniciar()
+        agora = datetime.now(timezone.utc).isoformat()
+        for evento in eventos:
+            self._fila.put({**evento, "created_at": evento.get("created_at") or agora})
+
+    def flush(self):
+        """Grava imediatamente tudo o que estiver na fila."""
+        while True:
+            lote = self._retirar(self.tamanho_lote)
+            if not lote:
+                break
+            self._gravar(lote)
+
+    def encerrar(self, timeout=AUDITORIA_ENCERRAMENTO_S):
+        """Para a thread depois do lote em andamento e grava o restante da fila."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            self._fila.put(_PARAR)
+            thread.join(timeout)
+        self.flush()
+
+    def _iniciar(self):
+        # Após um fork (gunicorn) a thread do processo pai não existe no filho
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._fila = queue.Queue()
+                self._pid = os.getpid()
+                self._parar = False
+                self._thread = threading.Thread(target=self._executar, name="historico-auditoria", daemon=True)
+                self._thread.start()
+
+    def _retirar(self, limite, prazo=None):
+        """Retira até `limite` eventos; com prazo, espera novos eventos até ele vencer."""
+        lote = []
+        while len(lote) < limite:
+            try:
+                if prazo is None:
+                    evento = self._fila.get_nowait()
+                else:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    evento = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if evento is _PARAR:
+                # A thread termina após gravar este lote
+                self._parar = True
+                continue
+            lote.append(evento)
+        return lote
+
+    def _executar(self):
+        while not self._parar:
+            primeiro = self._fila.get()
+            if primeiro is _PARAR:
+                break
+            lote = [primeiro] + self._retirar(self.tamanho_lote - 1, prazo=time.monotonic() + self.intervalo)
+            try:
+                self._gravar(lote)
+            except Exception as e:
+                logger.error(f"Erro no escritor do histórico: {str(e)}")
+
+    def _gravar(self, lote):
+        with self._gravacao_lock, self._trava_arquivo():
+            pendentes = self._ler_pendentes()
+            eventos = pendentes + lote
+            enviados = 0
+            try:
+                while enviados < len(eventos):
+                    self._inserir_lote(eventos[enviados:enviados + self.tamanho_lote])
+                    enviados = min(enviados + self.tamanho_lote, len(eventos))
+            except Exception as e:
+                if isinstance(e, _EnvioInterrompido):
+                    enviados += e.tratadas
+                logger.error(f"Banco inacessível, histórico salvo em {self.arquivo}: {str(e)}")
+                # Só o que não foi enviado fica no arquivo, para não reenviar linhas já gravadas
+                self._reescrever_pendentes(eventos[enviados:])
+                return
+            if pendentes:
+                self._reescrever_pendentes([])
+                logger.info(f"Histórico pendente reenviado: {len(pendentes)} registro(s)")
+
+    @contextmanager
+    def _trava_arquivo(self):
+        """Trava exclusiva entre processos sobre o arquivo de pendentes."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.arquivo}.lock", "a") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _inserir_lote(self, linhas):
+        """Grava as linhas; num erro de dados, grava linha a linha e descarta só as inválidas.
+
+        Se outra falha interromper o envio linha a linha, levanta
+        _EnvioInterrompido com quantas linhas já foram tratadas.
+        """
+        try:
+            self.inserir(linhas)
+        except APIError as e:
+            if not _erro_de_dados(e):
+                raise
+            logger.error(f"Erro ao registrar histórico em lote: {e.message}")
+            for tratadas, linha in enumerate(linhas):
+                try:
+                    self.inserir([linha])
+                except Exception as erro:
+                    if not _erro_de_dados(erro):
+                        raise _EnvioInterrompido(erro, tratadas) from erro
+                    logger.error(f"Registro de histórico descartado ({erro.message}): {linha}")
+
+    def _ler_pendentes(self):
+        try:
+            with open(self.arquivo, encoding="utf-8") as f:
+                return [json.loads(linha) for linha in f if linha.strip()]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"Erro ao ler histórico pendente: {str(e)}")
+            return []
+
+    def _reescrever_pendentes(self, eventos):
+        """Substitui o arquivo pelos eventos informados (ou o remove, se não houver)."""
+        try:
+            if not eventos:
+                if os.path.exists(self.arquivo):
+                    os.remove(self.arquivo)
+                return
+            temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                for evento in eventos:
+                    f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            os.replace(temporario, self.arquivo)
+        except OSError as e:
+            logger.error(f"Erro ao salvar histórico pendente, {len(eventos)} registro(s) perdidos: {str(e)}")
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def get_escritor_auditoria():
+    """Retorna o escritor do histórico do processo, criando-o uma única vez."""
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                _escritor = EscritorAuditoria()
+                atexit.register(_escritor.encerrar)
+    return _escritor
+
+
+def registrar_eventos(eventos):
+    """Grava eventos no historico_log conforme AUDITORIA_MODO."""
+    if not eventos:
+        return
+    if AUDITORIA_MODO == "sincrono":
+        _inserir_historico(eventos)
+    else:
+        get_escritor_auditoria().registrar(eventos)
@@ -0,0 +1,280 @@
+# Cache utility functions
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Backend do cache: "memoria" (LRU do processo) ou "redis" (compartilhado entre workers)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "512"))
+# Escritas feitas pela API REST (backend/) não invalidam o dashboard em cache:
+# aparecem nele em até DASHBOARD_CACHE_TTL segundos
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+
+
+class CacheLRU:
+    """Cache em memória do processo com limite de itens (LRU) e TTL por item."""
+
+    # Cada worker tem o seu: uma invalidação não chega aos outros processos
+    compartilhado = False
+
+    def __init__(self, max_itens=CACHE_MAX_ITENS):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        # Contadores ficam fora do LRU: não podem voltar a zero por despejo
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def _ler(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        valor, expira_em = item
+        if expira_em is not None and expira_em < time.monotonic():
+            del self._itens[chave]
+            return None
+        return valor
+
+    def _gravar(self, chave, valor, ttl):
+        expira_em = time.monotonic() + ttl if ttl else None
+        self._itens[chave] = (valor, expira_em)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._ler(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        with self._lock:
+            self._gravar(chave, valor, ttl)
+
+    def set_condicional(self, chave, valor, substituir, ttl=None):
+        """Grava se não houver valor ou se substituir(valor_atual) for verdadeiro; retorna se gravou."""
+        with self._lock:
+            atual = self._ler(chave)
+            if atual is not None and not substituir(atual):
+                return False
+            self._gravar(chave, valor, ttl)
+            return True
+
+    def contador(self, chave):
+        with self._lock:
+            return self._contadores.get(chave, 0)
+
+    def incrementar(self, chave):
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + 1
+            return self._contadores[chave]
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def clear(self, prefixo=""):
+        with self._lock:
+            for chave in [c for c in self._itens if c.startswith(prefixo)]:
+                del self._itens[chave]
+
+
+class CacheRedis:
+    """Cache compartilhado entre workers em um servidor compatível com Redis."""
+
+    compartilhado = True
+
+    def __init__(self, url, namespace="labgas:"):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, chave):
+        valor = self._redis.get(self.namespace + chave)
+        return pickle.loads(valor) if valor is not None else None
+
+    def set(self, chave, valor, ttl=None):
+        self._redis.set(self.namespace + chave, pickle.dumps(valor), ex=ttl or None)
+
+    def set_condicional(self, chave, valor, substituir, ttl=None):
+        """Como CacheLRU.set_condicional; a leitura e a gravação são uma transação (WATCH/MULTI)."""
+        from redis.exceptions import WatchError
+        chave = self.namespace + chave
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(chave)
+                    atual = pipe.get(chave)
+                    if atual is not None and not substituir(pickle.loads(atual)):
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(chave, pickle.dumps(valor), ex=ttl or None)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    # A chave mudou entre o GET e o EXEC: compara de novo
+                    continue
+
+    def contador(self, chave):
+        valor = self._redis.get(self.namespace + chave)
+        return int(valor) if valor is not None else 0
+
+    def incrementar(self, chave):
+        return self._redis.incr(self.namespace + chave)
+
+    def delete(self, chave):
+        self._redis.delete(self.namespace + chave)
+
+    def clear(self, prefixo=""):
+        for chave in self._redis.scan_iter(match=f"{self.namespace}{prefixo}*"):
+            self._redis.delete(chave)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Retorna o cache do processo conforme CACHE_BACKEND (LRU em memória por padrão)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _criar_cache()
+    return _cache
+
+
+def _criar_cache():
+    if CACHE_BACKEND == "redis" and CACHE_REDIS_URL:
+        try:
+            return CacheRedis(CACHE_REDIS_URL)
+        except ImportError:
+            logger.warning("Pacote redis não instalado; usando cache em memória.")
+    return CacheLRU()
+
+
+def _chave_dashboard(user_id):
+    return f"dashboard:{user_id}"
+
+
+def _chave_geracao_dashboard(user_id):
+    # Sem user_id: a geração de todos os usuários
+    return f"geracao_dashboard:{user_id}"
+
+
+def _geracao_dashboard(cache, user_id):
+    return (cache.contador(_chave_geracao_dashboard("")), cache.contador(_chave_geracao_dashboard(user_id)))
+
+
+def obter_dashboard(user_id):
+    """Retorna (dados, geracao): os agregados em cache do usuário (ou None) e a geração atual.
+
+    A geração muda a cada invalidar_dashboard; leia-a antes de calcular os
+    dados e passe-a a salvar_dashboard. Um item gravado em outra geração é
+    ignorado.
+    """
+    try:
+        cache = get_cache()
+        geracao = _geracao_dashboard(cache, user_id)
+        item = cache.get(_chave_dashboard(user_id))
+    except Exception as e:
+        logger.error(f"Erro ao ler cache do dashboard: {str(e)}")
+        return None, None
+    if item is not None and item.get("geracao") == geracao:
+        return item["dados"], geracao
+    return None, geracao
+
+
+def salvar_dashboard(user_id, dados, geracao):
+    """Guarda os agregados do dashboard por DASHBOARD_CACHE_TTL segundos, se ainda forem da geração atual.
+
+    Um cálculo que começou antes de uma escrita (e da invalidação) traz
+    dados antigos; eles não são gravados nem substituem os de uma geração
+    mais nova.
+    """
+    if geracao is None:
+        return
+    try:
+        cache = get_cache()
+        if _geracao_dashboard(cache, user_id) != geracao:
+            return
+        cache.set_condicional(
+            _chave_dashboard(user_id), {"geracao": geracao, "dados": dados},
+            lambda atual: tuple(atual.get("geracao") or ()) <= geracao,
+            ttl=DASHBOARD_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.error(f"Erro ao gravar cache do dashboard: {str(e)}")
+
+
+def invalidar_dashboard(user_id=None):
+    """Invalida o dashboard do usuário (ou de todos, se user_id for None) após uma escrita."""
+    try:
+        cache = get_cache()
+        if user_id is None:
+            cache.incrementar(_chave_geracao_dashboard(""))
+            cache.clear(_chave_dashboard(""))
+        else:
+            cache.incrementar(_chave_geracao_dashboard(user_id))
+            cache.delete(_chave_dashboard(user_id))
+    except Exception as e:
+        logger.error(f"Erro ao invalidar cache do dashboard: {str(e)}")
+
+
+# Perfil (role, nome, ativo, habilitar_abas) por usuário. Com CACHE_BACKEND=redis
+# a invalidação feita pelo admin vale para todos os workers na hora; no cache
+# em memória, outros processos veem a mudança em até PERFIL_CACHE_TTL segundos,
+# exceto a role de admin, que is_admin() confirma no banco (blueprints/helpers.py).
+PERFIL_CACHE_TTL = int(os.getenv("PERFIL_CACHE_TTL", "30"))
+
+
+def _chave_perfil(user_id):
+    return f"perfil:{user_id}"
+
+
+def obter_perfil_cache(user_id):
+    """Retorna o perfil em cache do usuário ou None."""
+    try:
+        return get_cache().get(_chave_perfil(user_id))
+    except Exception as e:
+        logger.error(f"Erro ao ler cache do perfil: {str(e)}")
+        return None
+
+
+def perfil_cache_compartilhado():
+    """Se o cache do perfil é visto por todos os workers (invalidação imediata)."""
+    return get_cache().compartilhado
+
+
+def salvar_perfil_cache(user_id, perfil):
+    """Guarda o perfil por PERFIL_CACHE_TTL segundos, sem sobrescrever uma versão mais nova.
+
+    Uma leitura lenta do banco que termine depois de uma alteração do admin
+    traz uma versão antiga; a comparação de versao, feita na mesma operação
+    que a gravação, impede que ela substitua o perfil já atualizado no cache.
+    """
+    versao = perfil.get("versao") or 0
+    try:
+        get_cache().set_condicional(
+            _chave_perfil(user_id), perfil,
+            lambda atual: (atual.get("versao") or 0) <= versao,
+            ttl=PERFIL_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.error(f"Erro ao gravar cache do perfil: {str(e)}")
+
+
+def invalidar_perfil_cache(user_id):
+    """Remove o perfil do usuário do cache (próximo acesso relê do banco)."""
+    try:
+        get_cache().delete(_chave_perfil(user_id))
+    except Exception as e:
+        logger.error(f"Erro ao invalidar cache do perfil: {str(e)}")
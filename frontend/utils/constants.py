@@ -3,6 +3,9 @@ import os
 
 ITEMS_PER_PAGE = int(os.getenv("ITEMS_PER_PAGE", "10"))
 
+# Modo de contagem do PostgREST nas listagens paginadas: exact, planned ou estimated
+PAGINACAO_COUNT = os.getenv("PAGINACAO_COUNT", "exact")
+
 LITROS_EQUIVALENTES_KG = float(os.getenv("LITROS_EQUIVALENTES_KG", "956.0"))
 GAS_KG_DEFAULT = float(os.getenv("GAS_KG_DEFAULT", "1.0"))
 CUSTO_DEFAULT = float(os.getenv("CUSTO_DEFAULT", "290.00"))
@@ -0,0 +1,538 @@
+# Exportação do banco (admin) em streaming
+import io
+import os
+import csv
+import json
+import base64
+from datetime import datetime, timedelta, timezone
+
+from utils.analytics import AgregadorAmostras
+from utils.supabase_utils import executar_consultas
+
+# Linhas por requisição ao PostgREST; o Supabase limita cada resposta a 1000 por padrão
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "1000"))
+# A exportação incremental não avança as marcas sobre alterações mais recentes
+# que isso: updated_at é o início da transação (NOW()) e o id do histórico é
+# atribuído no insert, então uma transação ainda aberta pode confirmar linhas
+# "atrás" de uma marca já entregue. Essas linhas vão na exportação seguinte.
+EXPORT_DELTA_ATRASO_S = int(os.getenv("EXPORT_DELTA_ATRASO_S", "60"))
+
+# (chave na exportação, tabela no banco)
+TABELAS_EXPORTACAO = (
+    ("cilindros", "cilindro"),
+    ("elementos", "elemento"),
+    ("amostras", "amostra"),
+    ("pressoes", "pressao"),
+)
+
+COLUNAS_CSV = {
+    "cilindros": ["id", "codigo", "data_compra", "data_inicio_consumo", "data_fim",
+                  "gas_kg", "litros_equivalentes", "custo", "status",
+                  "usuario_email", "usuario_nome", "created_at"],
+    "elementos": ["id", "nome", "consumo_lpm", "usuario_email", "usuario_nome", "created_at"],
+    "amostras": ["id", "data", "tempo_chama", "cilindro_id", "cilindro_codigo",
+                 "elemento_id", "elemento_nome", "quantidade_amostras",
+                 "usuario_email", "usuario_nome", "created_at"],
+    "pressoes": ["id", "cilindro_id", "cilindro_codigo", "pressao", "temperatura", "data", "hora",
+                 "usuario_email", "usuario_nome", "created_at"],
+}
+
+
+# Colunas e tipos de cada tabela nos formatos tipados (Parquet e Excel): (coluna, tipo)
+# tipos: "int", "float", "texto", "data", "hora", "timestamp"
+TIPOS_COLUNAS = {
+    "cilindros": [
+        ("id", "int"), ("codigo", "texto"), ("data_compra", "data"), ("data_inicio_consumo", "data"),
+        ("data_fim", "data"), ("gas_kg", "float"), ("litros_equivalentes", "float"), ("custo", "float"),
+        ("status", "texto"), ("user_id", "texto"), ("usuario_email", "texto"), ("usuario_nome", "texto"),
+        ("created_at", "timestamp"),
+    ],
+    "elementos": [
+        ("id", "int"), ("nome", "texto"), ("consumo_lpm", "float"),
+        ("user_id", "texto"), ("usuario_email", "texto"), ("usuario_nome", "texto"),
+        ("created_at", "timestamp"),
+    ],
+    "amostras": [
+        ("id", "int"), ("data", "data"), ("tempo_chama", "texto"), ("tempo_chama_segundos", "int"),
+        ("cilindro_id", "int"), ("cilindro_codigo", "texto"), ("elemento_id", "int"), ("elemento_nome", "texto"),
+        ("quantidade_amostras", "int"), ("user_id", "texto"), ("usuario_email", "texto"), ("usuario_nome", "texto"),
+        ("created_at", "timestamp"),
+    ],
+    "pressoes": [
+        ("id", "int"), ("cilindro_id", "int"), ("cilindro_codigo", "texto"), ("pressao", "float"),
+        ("temperatura", "float"), ("data", "data"), ("hora", "hora"),
+        ("user_id", "texto"), ("usuario_email", "texto"), ("usuario_nome", "texto"),
+        ("created_at", "timestamp"),
+    ],
+}
+
+
+def _converter(valor, tipo):
+    """Converte o valor JSON do PostgREST para o tipo Python da coluna."""
+    from datetime import date, time
+
+    if valor is None or valor == "":
+        return None
+    if tipo == "int":
+        return int(valor)
+    if tipo == "float":
+        return float(valor)
+    if tipo == "data":
+        return date.fromisoformat(valor)
+    if tipo == "hora":
+        return time.fromisoformat(valor)
+    if tipo == "timestamp":
+        return datetime.fromisoformat(valor)
+    return str(valor)
+
+
+def iterar_blocos(criar_consulta, tamanho=EXPORT_CHUNK):
+    """Percorre uma tabela em ordem de id, em blocos; termina no primeiro bloco vazio.
+
+    `criar_consulta()` retorna um select novo (que inclua id) a cada bloco.
+    Pagina por keyset (id > último id lido) em vez de .range(): uma exclusão
+    durante a leitura não desloca as linhas seguintes e cada bloco usa o
+    índice da chave primária, sem percorrer de novo os blocos anteriores.
+    Não depende do tamanho do bloco retornado, que pode ser menor que o
+    pedido se o PostgREST tiver um limite de linhas (max-rows) menor.
+    """
+    ultimo_id = None
+    while True:
+        consulta = criar_consulta()
+        if ultimo_id is not None:
+            consulta = consulta.gt("id", ultimo_id)
+        bloco = consulta.order("id").limit(tamanho).execute().data or []
+        if not bloco:
+            return
+        yield bloco
+        ultimo_id = bloco[-1]["id"]
+
+
+def resumo_por_elemento(resumo, elementos):
+    """Linhas de resumo por elemento: amostras, tempo de chama e consumo estimado (L)."""
+    quantidade = resumo.por_elemento()
+    segundos = resumo.segundos_por_elemento()
+    linhas = []
+    for e in sorted(elementos, key=lambda x: quantidade.get(x.get("id"), 0), reverse=True):
+        eid = e.get("id")
+        if eid not in quantidade:
+            continue
+        linhas.append({
+            "elemento_id": eid,
+            "elemento_nome": e.get("nome"),
+            "quantidade_amostras": quantidade[eid],
+            "tempo_chama_segundos": segundos.get(eid, 0),
+            "consumo_litros": round(float(e.get("consumo_lpm") or 0) * segundos.get(eid, 0) / 60, 2)
+        })
+    return linhas
+
+
+def marcas_desde(desde):
+    """Marcas da exportação incremental para tudo o que mudou a partir de `desde` (ISO 8601)."""
+    return {
+        "tabelas": {tabela: [desde, 0] for _, tabela in TABELAS_EXPORTACAO},
+        "historico_id": None,
+        "desde": desde,
+    }
+
+
+def codificar_cursor_delta(marcas):
+    """Cursor opaco com as marcas de uma exportação incremental."""
+    conteudo = json.dumps(marcas, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(conteudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor_delta(cursor):
+    """Retorna as marcas do cursor ou None se for inválido."""
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        marcas = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        tabelas = {tabela: [str(marcas["tabelas"][tabela][0]), int(marcas["tabelas"][tabela][1])]
+                   for _, tabela in TABELAS_EXPORTACAO}
+        historico_id = marcas.get("historico_id")
+        desde = marcas.get("desde")
+        if historico_id is None and not desde:
+            return None
+        return {
+            "tabelas": tabelas,
+            "historico_id": None if historico_id is None else int(historico_id),
+            "desde": None if desde is None else str(desde),
+        }
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        return None
+
+
+class Exportacao:
+    """Leitura das tabelas exportadas, bloco a bloco, com as colunas de junção.
+
+    Só as tabelas de referência (ids/códigos de cilindro, nomes e consumo de
+    elemento, perfis) ficam em memória; as linhas de cada tabela são lidas em
+    blocos de EXPORT_CHUNK e descartadas depois de serializadas. As amostras
+    lidas alimentam o resumo por elemento.
+
+    Com `marcas` (ver marcas_desde/decodificar_cursor_delta) a exportação é
+    incremental: cada tabela é lida em ordem de (updated_at, id) a partir da
+    marca anterior e as marcas avançam conforme os blocos são lidos, até o
+    `limite` (agora menos EXPORT_DELTA_ATRASO_S).
+    """
+
+    def __init__(self, client, tamanho_bloco=EXPORT_CHUNK, marcas=None):
+        self.client = client
+        self.tamanho_bloco = tamanho_bloco
+        self.marcas = marcas
+        self.exportado_em = datetime.now()
+        # Em UTC sem fuso, como updated_at e inserido_em no banco
+        self.limite = (datetime.now(timezone.utc) - timedelta(seconds=EXPORT_DELTA_ATRASO_S)).replace(tzinfo=None).isoformat()
+        self.agregador = AgregadorAmostras()
+        self.linhas_lidas = 0
+        # Chamado após cada bloco lido (ex: para registrar o progresso de uma tarefa)
+        self.ao_ler_bloco = None
+
+        respostas = executar_consultas({
+            "cilindros": lambda: self._todas("cilindro", "id,codigo"),
+            "elementos": lambda: self._todas("elemento", "id,nome,consumo_lpm"),
+            "usuarios": lambda: self._todas("perfil", "id,email,nome"),
+            **{
+                f"total_{nome}": self._filtrar_delta(client.table(tabela).select("id", count="exact", head=True), tabela)
+                for nome, tabela in TABELAS_EXPORTACAO
+            }
+        })
+        self.elementos = respostas["elementos"]
+        self.usuarios = {u.get("id"): u for u in respostas["usuarios"]}
+        self.cilindro_dict = {c.get("id"): c.get("codigo") for c in respostas["cilindros"]}
+        self.elemento_dict = {e.get("id"): e.get("nome") for e in self.elementos}
+        self.totais = {nome: respostas[f"total_{nome}"].count or 0 for nome, _ in TABELAS_EXPORTACAO}
+
+    def _todas(self, tabela, colunas):
+        linhas = []
+        for bloco in iterar_blocos(lambda: self.client.table(tabela).select(colunas), self.tamanho_bloco):
+            linhas.extend(bloco)
+        return linhas
+
+    def _filtrar_delta(self, consulta, tabela):
+        """Restringe a consulta às linhas entre a marca (updated_at, id) da tabela e o limite."""
+        if self.marcas is None:
+            return consulta
+        updated_at, id_ = self.marcas["tabelas"][tabela]
+        return consulta.or_(
+            f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt.{id_})'
+        ).lt("updated_at", self.limite)
+
+    def _blocos_delta(self, tabela):
+        # Keyset em vez de .range(): uma linha alterada durante a leitura vai
+        # para o fim da ordem sem deslocar (e pular) as linhas seguintes
+        while True:
+            consulta = self._filtrar_delta(self.client.table(tabela).select("*"), tabela)
+            bloco = consulta.order("updated_at").order("id").limit(self.tamanho_bloco).execute().data or []
+            if not bloco:
+                return
+            self.marcas["tabelas"][tabela] = [bloco[-1]["updated_at"], bloco[-1]["id"]]
+            yield bloco
+
+    def blocos(self, nome):
+        """Gera blocos de linhas da tabela com usuario_*, cilindro_codigo e elemento_nome."""
+        tabela = dict(TABELAS_EXPORTACAO)[nome]
+        if self.marcas is None:
+            leitura = iterar_blocos(lambda: self.client.table(tabela).select("*"), self.tamanho_bloco)
+        else:
+            leitura = self._blocos_delta(tabela)
+        for bloco in leitura:
+            for row in bloco:
+                u = self.usuarios.get(row.get("user_id"), {})
+                row["usuario_email"] = u.get("email", "")
+                row["usuario_nome"] = u.get("nome", "")
+                if "cilindro_id" in row:
+                    row["cilindro_codigo"] = self.cilindro_dict.get(row.get("cilindro_id"), "")
+                if "elemento_id" in row:
+                    row["elemento_nome"] = self.elemento_dict.get(row.get("elemento_id"), "")
+            if nome == "amostras":
+                self.agregador.adicionar(bloco)
+            self.linhas_lidas += len(bloco)
+            if self.ao_ler_bloco:
+                self.ao_ler_bloco(self)
+            yield bloco
+
+    def linhas(self, nome):
+        for bloco in self.blocos(nome):
+            yield from bloco
+
+    def excluidos(self):
+        """Gera blocos de exclusões (tombstones) registradas no historico_log após a marca.
+
+        Segue o id do histórico, não o created_at: eventos regravados pelo
+        escritor do histórico chegam com a data original, mas com id novo.
+        Só lê linhas gravadas (inserido_em) antes do limite.
+        """
+        tabelas = [tabela for _, tabela in TABELAS_EXPORTACAO]
+        while True:
+            consulta = (
+                self.client.table("historico_log").select("id,tipo,registro_id,nome,created_at")
+                .eq("acao", "excluido").in_("tipo", tabelas).not_.is_("registro_id", "null")
+                .lt("inserido_em", self.limite)
+            )
+            if self.marcas["historico_id"] is not None:
+                consulta = consulta.gt("id", self.marcas["historico_id"])
+            else:
+                consulta = consulta.gte("created_at", self.marcas["desde"])
+            bloco = consulta.order("id").limit(self.tamanho_bloco).execute().data or []
+            if not bloco:
+                return
+            self.marcas["historico_id"] = bloco[-1]["id"]
+            self.linhas_lidas += len(bloco)
+            yield [
+                {"tipo": r.get("tipo"), "registro_id": r.get("registro_id"),
+                 "nome": r.get("nome"), "excluido_em": r.get("created_at")}
+                for r in bloco
+            ]
+
+    def resumo(self):
+        """Resumo por elemento das amostras já percorridas (chame após ler "amostras")."""
+        resumo = self.agregador.resumo()
+        return {
+            "total_amostras": resumo.total,
+            "por_elemento": resumo_por_elemento(resumo, self.elementos)
+        }
+
+
+def _array_json(blocos):
+    """Array JSON (indentado como valor de primeiro nível) gerado bloco a bloco."""
+    yield "["
+    primeira = True
+    for bloco in blocos:
+        partes = []
+        for row in bloco:
+            partes.append(("\n    " if primeira else ",\n    ") + json.dumps(row, default=str, ensure_ascii=False))
+            primeira = False
+        yield "".join(partes)
+    yield "\n  ]" if not primeira else "]"
+
+
+def gerar_json(exportacao):
+    """Documento JSON gerado em partes; o resumo vai ao final, depois das amostras."""
+    yield "{\n"
+    yield f'  "exportado_em": {json.dumps(exportacao.exportado_em.isoformat())}'
+    for nome, _ in TABELAS_EXPORTACAO:
+        yield f',\n  "{nome}": '
+        yield from _array_json(exportacao.blocos(nome))
+    yield f',\n  "resumo": {json.dumps(exportacao.resumo(), default=str, ensure_ascii=False)}\n}}\n'
+
+
+def gerar_json_delta(exportacao):
+    """Exportação incremental em JSON: linhas novas ou alteradas, exclusões e o próximo cursor.
+
+    O cursor vai ao final porque só é conhecido depois de lidas todas as
+    tabelas. Quem consome aplica as linhas por id (upsert) e depois remove
+    os "excluidos". Alterações do último EXPORT_DELTA_ATRASO_S segundos
+    ficam para a exportação seguinte. A exclusão de um cilindro remove em
+    cascata suas pressões, que não têm registro próprio no histórico.
+    """
+    yield "{\n"
+    yield f'  "exportado_em": {json.dumps(exportacao.exportado_em.isoformat())}'
+    yield f',\n  "desde": {json.dumps(exportacao.marcas.get("desde"))}'
+    for nome, _ in TABELAS_EXPORTACAO:
+        yield f',\n  "{nome}": '
+        yield from _array_json(exportacao.blocos(nome))
+    yield ',\n  "excluidos": '
+    yield from _array_json(exportacao.excluidos())
+    yield f',\n  "cursor": {json.dumps(codificar_cursor_delta(exportacao.marcas))}\n}}\n'
+
+
+def gerar_csv(exportacao):
+    """Seções # CILINDROS, # ELEMENTOS, # AMOSTRAS e # PRESSOES, um bloco por vez."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def esvaziar():
+        conteudo = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return conteudo
+
+    for i, (nome, _) in enumerate(TABELAS_EXPORTACAO):
+        headers = COLUNAS_CSV[nome]
+        buffer.write(("\n" if i else "") + f"# {nome.upper()}\n")
+        for j, bloco in enumerate(exportacao.blocos(nome)):
+            if j == 0:
+                writer.writerow(headers)
+            writer.writerows([["" if row.get(h) is None else row.get(h) for h in headers] for row in bloco])
+            yield esvaziar()
+    yield esvaziar()
+
+
+SECOES_MARKDOWN = (
+    ("cilindros", "Cilindros", "*Nenhum cilindro encontrado.*",
+     "| ID | Código | Status | Gas (kg) | Custo | Usuário |\n|---|---|---|---|---|---|\n",
+     lambda row: f"| {row.get('id')} | {row.get('codigo')} | {row.get('status')} | {row.get('gas_kg')} | R${row.get('custo')} | {row.get('usuario_email')} |\n"),
+    ("pressoes", "Pressoes", "*Nenhum registro de temperatura encontrado.*",
+     "| ID | Cilindro | Temperatura | Data | Hora | Usuário |\n|---|---|---|---|---|---|\n",
+     lambda row: f"| {row.get('id')} | {row.get('cilindro_codigo')} | {row.get('temperatura')}°C | {row.get('data')} | {row.get('hora')} | {row.get('usuario_email')} |\n"),
+    ("elementos", "Elementos", "*Nenhum elemento encontrado.*",
+     "| ID | Nome | Consumo (L/min) | Usuário |\n|---|---|---|---|\n",
+     lambda row: f"| {row.get('id')} | {row.get('nome')} | {row.get('consumo_lpm')} | {row.get('usuario_email')} |\n"),
+    ("amostras", "Amostras", "*Nenhuma amostra encontrada.*",
+     "| ID | Data | Tempo | Cilindro | Elemento | Qtd | Usuário |\n|---|---|---|---|---|---|---|\n",
+     lambda row: f"| {row.get('id')} | {row.get('data')} | {row.get('tempo_chama')} | {row.get('cilindro_codigo')} | {row.get('elemento_nome')} | {row.get('quantidade_amostras')} | {row.get('usuario_email')} |\n"),
+)
+
+
+def gerar_markdown(exportacao):
+    """Relatório Markdown; o resumo por elemento vai ao final, depois das amostras."""
+    totais = exportacao.totais
+    yield "# LabGas Manager - Exportação\n\n"
+    yield f"**Exportado em:** {exportacao.exportado_em.strftime('%d/%m/%Y %H:%M:%S')}\n\n"
+    yield f"**Total:** {totais['cilindros']} Cilindros | {totais['pressoes']} Pressoes | {totais['elementos']} Elementos | {totais['amostras']} Amostras\n\n"
+
+    for i, (nome, titulo, vazio, cabecalho, formatar) in enumerate(SECOES_MARKDOWN):
+        yield ("\n" if i else "") + f"## {titulo}\n\n"
+        vazia = True
+        for bloco in exportacao.blocos(nome):
+            yield (cabecalho if vazia else "") + "".join(formatar(row) for row in bloco)
+            vazia = False
+        if vazia:
+            yield f"{vazio}\n\n"
+
+    resumo = exportacao.resumo()["por_elemento"]
+    yield "\n## Resumo por Elemento\n\n"
+    if not resumo:
+        yield "*Nenhuma amostra encontrada.*\n\n"
+        return
+    yield "| Elemento | Amostras | Tempo de Chama (min) | Consumo (L) |\n|---|---|---|---|\n"
+    for row in resumo:
+        yield f"| {row['elemento_nome']} | {row['quantidade_amostras']} | {round(row['tempo_chama_segundos'] / 60, 1)} | {row['consumo_litros']} |\n"
+
+
+COLUNAS_EXCEL = {
+    "cilindros": ("Cilindros", ["ID", "Código", "Data Compra", "Data Início", "Data Fim",
+                                "Gas (kg)", "Litros", "Custo", "Status",
+                                "Usuário Email", "Usuário Nome", "Criado em"]),
+    "elementos": ("Elementos", ["ID", "Nome", "Consumo (L/min)", "Usuário Email", "Usuário Nome", "Criado em"]),
+    "amostras": ("Amostras", ["ID", "Data", "Tempo Chama", "Cilindro ID", "Cilindro Código",
+                              "Elemento ID", "Elemento Nome", "Qtd Amostras",
+                              "Usuário Email", "Usuário Nome", "Criado em"]),
+    "pressoes": ("Pressoes", ["ID", "Cilindro ID", "Cilindro Código", "Pressão (bar)", "Temperatura (°C)", "Data", "Hora",
+                              "Usuário Email", "Usuário Nome", "Criado em"]),
+}
+
+
+def gerar_excel(exportacao):
+    """Planilha .xlsx em modo write-only do openpyxl, gerada em partes.
+
+    As linhas de cada bloco vão direto para o arquivo temporário da aba;
+    o .xlsx final é montado em um arquivo temporário e enviado em pedaços.
+    Datas, horas e números são gravados como células tipadas.
+    """
+    import tempfile
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    formatos = {"data": "DD/MM/YYYY", "hora": "HH:MM:SS", "timestamp": "DD/MM/YYYY HH:MM:SS"}
+
+    wb = Workbook(write_only=True)
+    for nome, _ in TABELAS_EXPORTACAO:
+        titulo, headers = COLUNAS_EXCEL[nome]
+        tipos = dict(TIPOS_COLUNAS[nome])
+        colunas = [(coluna, tipos.get(coluna, "texto")) for coluna in COLUNAS_CSV[nome]]
+        ws = wb.create_sheet(titulo)
+        ws.freeze_panes = "A2"
+
+        cabecalho = []
+        for h in headers:
+            celula = WriteOnlyCell(ws, value=h)
+            celula.font = Font(bold=True)
+            cabecalho.append(celula)
+        ws.append(cabecalho)
+
+        for bloco in exportacao.blocos(nome):
+            for row in bloco:
+                linha = []
+                for coluna, tipo in colunas:
+                    valor = _converter(row.get(coluna), tipo)
+                    if tipo in formatos and valor is not None:
+                        valor = WriteOnlyCell(ws, value=valor)
+                        valor.number_format = formatos[tipo]
+                    linha.append(valor)
+                ws.append(linha)
+
+    with tempfile.TemporaryFile() as arquivo:
+        wb.save(arquivo)
+        arquivo.seek(0)
+        while True:
+            parte = arquivo.read(64 * 1024)
+            if not parte:
+                break
+            yield parte
+
+
+def parquet_disponivel():
+    """Indica se o pyarrow (dependência opcional) está instalado."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _SaidaZip:
+    """Destino não pesquisável do zip: acumula bytes até serem retirados pelo gerador."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._posicao = 0
+
+    def write(self, dados):
+        self._buffer += dados
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = bytes(self._buffer)
+        self._buffer.clear()
+        return dados
+
+
+def gerar_parquet(exportacao):
+    """Zip com um arquivo Parquet (zstd) por tabela, gerado em partes.
+
+    Cada bloco lido do banco vira um row group, então a memória fica
+    limitada a um bloco. Datas, horas e timestamps são gravados com tipo;
+    valores NUMERIC viram float64. Requer pyarrow.
+    """
+    import zipfile
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos_arrow = {
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "texto": pa.string(),
+        "data": pa.date32(),
+        "hora": pa.time64("us"),
+        "timestamp": pa.timestamp("us"),
+    }
+
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_STORED) as zf:
+        for nome, _ in TABELAS_EXPORTACAO:
+            colunas = TIPOS_COLUNAS[nome]
+            schema = pa.schema([(coluna, tipos_arrow[tipo]) for coluna, tipo in colunas])
+            with zf.open(f"{nome}.parquet", "w", force_zip64=True) as arquivo:
+                with pq.ParquetWriter(arquivo, schema, compression="zstd") as writer:
+                    for bloco in exportacao.blocos(nome):
+                        tabela = pa.table({
+                            coluna: pa.array([_converter(row.get(coluna), tipo) for row in bloco], type=tipos_arrow[tipo])
+                            for coluna, tipo in colunas
+                        }, schema=schema)
+                        writer.write_table(tabela)
+                        yield saida.retirar()
+            yield saida.retirar()
+
+        resumo = exportacao.resumo()["por_elemento"]
+        zf.writestr("resumo_por_elemento.json", json.dumps(resumo, ensure_ascii=False, indent=2))
+    yield saida.retirar()
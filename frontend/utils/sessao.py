@@ -0,0 +1,218 @@
+# Sessões guardadas no servidor: o cookie leva apenas um identificador opaco
+import os
+import time
+import random
+import secrets
+import sqlite3
+import logging
+import tempfile
+import threading
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from utils.cache import CacheLRU
+
+logger = logging.getLogger(__name__)
+
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL") or os.getenv("REDIS_URL")
+# "redis" (compartilhado entre workers e instâncias; o de produção), "cookie"
+# (sessão assinada do Flask, sem armazenamento no servidor) e, só para uso
+# local, "sqlite" (arquivo em /tmp dos workers da máquina) ou "memoria" (um
+# único processo). Estes dois perdem as sessões quando o container reinicia e
+# não são vistos por outras réplicas. Sem SESSION_BACKEND: Redis se houver
+# URL, senão o cookie.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND") or ("redis" if SESSION_REDIS_URL else "cookie")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH") or os.path.join(tempfile.gettempdir(), "labgas_sessoes.sqlite3")
+SESSION_MAX_ITENS = int(os.getenv("SESSION_MAX_ITENS", "10000"))
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo fica no armazém; `sid` é o valor do cookie."""
+
+    def __init__(self, inicial=None, sid=None):
+        def ao_alterar(sessao):
+            sessao.modified = True
+            sessao.accessed = True
+
+        super().__init__(inicial, ao_alterar)
+        self.sid = sid
+        self.modified = False
+        self.accessed = False
+        # Usuário ao abrir a sessão: se mudar (login/logout), o sid é trocado
+        self.user_id_inicial = self.get("user_id")
+
+
+class ArmazemMemoria:
+    """Sessões em um LRU do processo (desenvolvimento com um único worker)."""
+
+    def __init__(self, max_itens=SESSION_MAX_ITENS):
+        self._cache = CacheLRU(max_itens)
+
+    def get(self, sid):
+        return self._cache.get(sid)
+
+    def set(self, sid, dados, ttl):
+        self._cache.set(sid, dados, ttl=ttl)
+
+    def delete(self, sid):
+        self._cache.delete(sid)
+
+
+class ArmazemSQLite:
+    """Sessões em um arquivo SQLite compartilhado pelos workers da máquina."""
+
+    def __init__(self, caminho=SESSION_SQLITE_PATH):
+        self.caminho = caminho
+        self._local = threading.local()
+        with self._conexao() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS sessao (sid TEXT PRIMARY KEY, dados BLOB NOT NULL, expira_em REAL NOT NULL)"
+            )
+
+    def _conexao(self):
+        # Uma conexão por thread; após um fork (gunicorn) o pid muda e ela é refeita
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def get(self, sid):
+        linha = self._conexao().execute(
+            "SELECT dados FROM sessao WHERE sid = ? AND expira_em > ?", (sid, time.time())
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def set(self, sid, dados, ttl):
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT INTO sessao (sid, dados, expira_em) VALUES (?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET dados = excluded.dados, expira_em = excluded.expira_em",
+                (sid, dados, time.time() + ttl)
+            )
+            # Limpeza ocasional das sessões expiradas
+            if random.random() < 0.01:
+                conexao.execute("DELETE FROM sessao WHERE expira_em <= ?", (time.time(),))
+
+    def delete(self, sid):
+        with self._conexao() as conexao:
+            conexao.execute("DELETE FROM sessao WHERE sid = ?", (sid,))
+
+
+class ArmazemRedis:
+    """Sessões em um servidor compatível com Redis, com expiração nativa."""
+
+    def __init__(self, url, namespace="labgas:sessao:"):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, sid):
+        return self._redis.get(self.namespace + sid)
+
+    def set(self, sid, dados, ttl):
+        self._redis.set(self.namespace + sid, dados, ex=ttl)
+
+    def delete(self, sid):
+        self._redis.delete(self.namespace + sid)
+
+
+class InterfaceSessaoServidor(SessionInterface):
+    """SessionInterface do Flask com o conteúdo da sessão no armazém.
+
+    O cookie leva só um identificador aleatório de 256 bits, então não há
+    assinatura HMAC a verificar a cada requisição. O conteúdo é serializado
+    em JSON compacto (o mesmo formato com tags da sessão padrão do Flask).
+    Requisições de arquivos estáticos não consultam o armazém.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def open_session(self, app, request):
+        if request.path.startswith(f"{app.static_url_path}/"):
+            return SessaoServidor()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return SessaoServidor()
+        try:
+            dados = self.armazem.get(sid)
+            if dados is not None:
+                sessao = SessaoServidor(self.serializer.loads(dados), sid=sid)
+                sessao.accessed = True
+                return sessao
+        except Exception as e:
+            logger.error(f"Erro ao ler sessão: {str(e)}")
+        return SessaoServidor()
+
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            # Sessão esvaziada (logout): remove do armazém e apaga o cookie
+            if session.modified and session.sid:
+                self._remover(session.sid)
+                response.delete_cookie(nome, domain=dominio, path=caminho)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        # Novo identificador na criação e quando o usuário muda (login),
+        # para que um sid obtido antes do login não sirva depois dele
+        if session.sid is None or session.get("user_id") != session.user_id_inicial:
+            if session.sid:
+                self._remover(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.user_id_inicial = session.get("user_id")
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        try:
+            self.armazem.set(session.sid, self.serializer.dumps(dict(session)), ttl)
+        except Exception as e:
+            logger.error(f"Erro ao gravar sessão: {str(e)}")
+            return
+
+        response.set_cookie(
+            nome,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=caminho,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _remover(self, sid):
+        try:
+            self.armazem.delete(sid)
+        except Exception as e:
+            logger.error(f"Erro ao remover sessão: {str(e)}")
+
+
+def criar_interface_sessao():
+    """SessionInterface conforme SESSION_BACKEND, ou None para manter o cookie assinado do Flask."""
+    if SESSION_BACKEND == "redis" and SESSION_REDIS_URL:
+        try:
+            return InterfaceSessaoServidor(ArmazemRedis(SESSION_REDIS_URL))
+        except ImportError:
+            logger.warning("Pacote redis não instalado; mantendo a sessão no cookie.")
+            return None
+    if SESSION_BACKEND == "sqlite":
+        return InterfaceSessaoServidor(ArmazemSQLite())
+    if SESSION_BACKEND == "memoria":
+        return InterfaceSessaoServidor(ArmazemMemoria())
+    return None
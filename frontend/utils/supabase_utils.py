@@ -1,40 +1,227 @@
 # Supabase utility functions
 import os
-from supabase import create_client
+import re
+import json
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from postgrest.exceptions import APIError
+from supabase import create_client, ClientOptions
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERVICE_KEY")
 
+# Registro de clientes compartilhados pelo processo (um por tipo de chave).
+# Cada cliente mantém seu próprio pool HTTP keep-alive com o PostgREST.
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+_METODOS_CONSULTA = ("select", "insert", "update", "upsert", "delete")
+
+# Pool limitado para consultas independentes disparadas em paralelo
+MAX_CONSULTAS_PARALELAS = int(os.getenv("SUPABASE_MAX_CONSULTAS_PARALELAS", "8"))
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _criar_cliente(chave):
+    """Cria um cliente sem estado de sessão (nunca é alterado por login/logout)."""
+    options = ClientOptions(auto_refresh_token=False, persist_session=False)
+    return create_client(SUPABASE_URL, chave, options=options)
+
+
+def _cliente_compartilhado(tipo, chave):
+    """Retorna o cliente do processo para o tipo de chave, criando-o uma única vez."""
+    cliente = _clientes.get(tipo)
+    if cliente is not None:
+        return cliente
+
+    with _clientes_lock:
+        cliente = _clientes.get(tipo)
+        if cliente is None:
+            cliente = _criar_cliente(chave)
+            # Inicializa o PostgREST (lazy) dentro do lock para evitar corrida entre threads
+            cliente.postgrest
+            _clientes[tipo] = cliente
+    return cliente
+
+
+def _aplicar_headers(query, headers):
+    """Aplica headers em um request builder (postgrest 2.x guarda-os em query.request)."""
+    getattr(query, "request", query).headers.update(headers)
+    return query
+
+
+class _ConsultaComHeaders:
+    """Encapsula um request builder aplicando headers extras em cada consulta."""
+
+    def __init__(self, builder, headers):
+        self._builder = builder
+        self._headers = headers
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._builder, nome)
+        if nome not in _METODOS_CONSULTA:
+            return atributo
+
+        def consulta(*args, **kwargs):
+            return _aplicar_headers(atributo(*args, **kwargs), self._headers)
+        return consulta
+
+
+class ClienteUsuario:
+    """Visão do cliente compartilhado que envia o token do usuário em cada requisição.
+
+    Não altera o cliente do processo: o header Authorization é aplicado
+    apenas nas consultas criadas por esta instância.
+    """
+
+    def __init__(self, cliente, token):
+        self._cliente = cliente
+        self._headers = {"Authorization": f"Bearer {token}"}
+
+    def table(self, nome):
+        return _ConsultaComHeaders(self._cliente.postgrest.from_(nome), self._headers)
+
+    from_ = table
+
+    def rpc(self, funcao, params=None):
+        return _aplicar_headers(self._cliente.postgrest.rpc(funcao, params or {}), self._headers)
+
 
 def get_supabase_client():
-    """Retorna cliente Supabase (anon key) usando Flask g para thread safety."""
-    from flask import has_request_context, g, current_app
-    
-    if not has_request_context():
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
-    
-    if not hasattr(g, '_supabase_client'):
-        g._supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    return g._supabase_client
+    """Retorna o cliente Supabase (anon key) compartilhado pelo processo."""
+    return _cliente_compartilhado("anon", SUPABASE_KEY)
 
 
 def get_admin_client():
-    """Retorna cliente Supabase com service_role (bypass RLS) usando Flask g."""
-    from flask import has_request_context, g, current_app
-    
-    if not has_request_context():
-        return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    
-    if not hasattr(g, '_admin_client'):
-        g._admin_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return g._admin_client
+    """Retorna o cliente Supabase com service_role (bypass RLS) compartilhado pelo processo."""
+    return _cliente_compartilhado("service", SUPABASE_SERVICE_KEY)
+
+
+def get_user_client(token):
+    """Retorna cliente que usa o transporte anon compartilhado com o JWT do usuário."""
+    return ClienteUsuario(get_supabase_client(), token)
+
+
+def get_auth_client():
+    """Retorna um cliente novo para operações de autenticação (login, registro, logout).
+
+    O GoTrue guarda a sessão no próprio cliente e propaga o token para o
+    PostgREST, por isso essas operações não podem usar o cliente compartilhado.
+    """
+    return _criar_cliente(SUPABASE_KEY)
+
+
+def _get_executor():
+    """Retorna o pool de threads do processo para consultas em paralelo."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_CONSULTAS_PARALELAS,
+                    thread_name_prefix="supabase-consulta"
+                )
+    return _executor
+
+
+def executar_consultas(consultas):
+    """Executa consultas independentes em paralelo e retorna as respostas pelas mesmas chaves.
+
+    Recebe um dicionário {nome: consulta}, em que cada consulta é um request
+    builder ainda não executado (ex: client.table("x").select("*")) ou uma
+    função sem argumentos que não dependa do contexto do Flask. A latência
+    total passa a ser a da consulta mais lenta. Se alguma falhar, a exceção é
+    propagada.
+    """
+    if not consultas:
+        return {}
+
+    tarefas = {nome: consulta if callable(consulta) else consulta.execute for nome, consulta in consultas.items()}
+    if len(tarefas) == 1:
+        return {nome: tarefa() for nome, tarefa in tarefas.items()}
+
+    executor = _get_executor()
+    futuros = {nome: executor.submit(tarefa) for nome, tarefa in tarefas.items()}
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
+
+
+def buscar_pagina(consulta, page, per_page):
+    """Busca uma página no banco com .range() e retorna (linhas, total).
+
+    A consulta deve ter sido criada com select(..., count=...) para que o
+    PostgREST devolva o total junto com a página.
+    """
+    inicio = (max(page, 1) - 1) * per_page
+    try:
+        response = consulta.range(inicio, inicio + per_page - 1).execute()
+    except APIError as e:
+        # PGRST103: offset além do total; a página fica vazia como no fatiamento em Python
+        if e.code != "PGRST103":
+            raise
+        total = re.search(r"only (\d+) rows", e.details or "")
+        return [], int(total.group(1)) if total else 0
+    return response.data or [], response.count or 0
+
+
+def codificar_cursor(linha):
+    """Gera cursor opaco a partir da chave (created_at, id) de uma linha."""
+    chave = json.dumps([linha.get("created_at"), linha.get("id")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(chave.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Retorna (created_at, id) do cursor ou None se for inválido."""
+    if not cursor:
+        return None
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        created_at, id_ = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        return str(created_at), int(id_)
+    except (ValueError, TypeError):
+        return None
+
+
+def buscar_pagina_cursor(consulta, per_page, cursor=None, direcao="proxima"):
+    """Paginação keyset por (created_at, id) em ordem decrescente.
+
+    A consulta deve selecionar created_at e id; para ter o total, use
+    select(..., count="estimated"), que não exige varredura completa.
+    Retorna (linhas, cursor_proxima, cursor_anterior, total).
+    """
+    chave = decodificar_cursor(cursor)
+    voltando = chave is not None and direcao == "anterior"
+
+    if chave:
+        created_at, id_ = chave
+        op = "gt" if voltando else "lt"
+        consulta = consulta.or_(
+            f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}.{id_})'
+        )
+
+    # Voltando, percorre em ordem crescente a partir do cursor e inverte o resultado
+    response = consulta.order("created_at", desc=not voltando).order("id", desc=not voltando).limit(per_page + 1).execute()
+    linhas = response.data or []
+    tem_mais = len(linhas) > per_page
+    linhas = linhas[:per_page]
+
+    if voltando:
+        linhas.reverse()
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, chave is not None
+
+    cursor_proxima = codificar_cursor(linhas[-1]) if linhas and tem_proxima else None
+    cursor_anterior = codificar_cursor(linhas[0]) if linhas and tem_anterior else None
+    return linhas, cursor_proxima, cursor_anterior, response.count or 0
 
 
 def buscar_perfis_usuarios(user_ids):
     """Busca perfis de múltiplos usuários em uma única consulta (otimização N+1)."""
     from flask import current_app
-    
+
     supabase = get_supabase_client()
     if not user_ids:
         return {}
@@ -0,0 +1,227 @@
+# Tarefas de exportação em segundo plano com cache de arquivos gerados
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.supabase_utils import get_admin_client, executar_consultas
+from utils.exportacao import (
+    Exportacao, TABELAS_EXPORTACAO,
+    gerar_json, gerar_csv, gerar_markdown, gerar_excel, gerar_parquet
+)
+
+logger = logging.getLogger(__name__)
+
+# Diretório dos arquivos gerados e do estado das tarefas. Status e download
+# só funcionam se toda instância que atende o admin enxergar o mesmo
+# diretório (workers de uma máquina ou um volume compartilhado).
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "labgas_exportacoes")
+EXPORT_CACHE_TTL = int(os.getenv("EXPORT_CACHE_TTL", str(24 * 3600)))
+EXPORT_MAX_TAREFAS = int(os.getenv("EXPORT_MAX_TAREFAS", "1"))
+# Tarefa sem atualização há mais tempo que isso é considerada abandonada
+EXPORT_TAREFA_TIMEOUT = int(os.getenv("EXPORT_TAREFA_TIMEOUT", "600"))
+# Tarefas em segundo plano exigem EXPORT_DIR compartilhado e threads que
+# sobrevivam à resposta. Na Vercel nenhum dos dois vale (/tmp é de cada
+# instância e a função é congelada após a resposta): lá a exportação é
+# enviada em streaming na própria requisição (admin.export_data).
+EXPORT_ASSINCRONO = os.getenv("EXPORT_ASSINCRONO", "0" if os.getenv("VERCEL") else "1") == "1"
+
+# formato: (gerador, extensão, content type)
+FORMATOS_EXPORTACAO = {
+    "json": (gerar_json, "json", "application/json"),
+    "csv": (gerar_csv, "csv", "text/csv"),
+    "md": (gerar_markdown, "md", "text/markdown"),
+    "excel": (gerar_excel, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (gerar_parquet, "parquet.zip", "application/zip"),
+}
+
+# Tabelas cujo conteúdo vai na exportação (perfil: email e nome dos usuários)
+TABELAS_MARCA_DAGUA = [tabela for _, tabela in TABELAS_EXPORTACAO] + ["perfil"]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=EXPORT_MAX_TAREFAS, thread_name_prefix="exportacao")
+    return _executor
+
+
+def calcular_marca_dagua(client):
+    """Versão dos dados: maior updated_at e total de linhas de cada tabela exportada.
+
+    updated_at muda em inserções e alterações, feitas pelo frontend ou pela
+    API (backend/); o total muda nas exclusões.
+    """
+    consultas = {}
+    for tabela in TABELAS_MARCA_DAGUA:
+        consultas[f"{tabela}_max"] = client.table(tabela).select("updated_at").order("updated_at", desc=True).limit(1)
+        consultas[f"{tabela}_total"] = client.table(tabela).select("id", count="exact", head=True)
+    respostas = executar_consultas(consultas)
+    return {
+        tabela: [
+            (respostas[f"{tabela}_max"].data or [{}])[0].get("updated_at"),
+            respostas[f"{tabela}_total"].count or 0,
+        ]
+        for tabela in TABELAS_MARCA_DAGUA
+    }
+
+
+def _id_tarefa(formato, marca_dagua):
+    versao = json.dumps(marca_dagua, sort_keys=True, default=str)
+    return f"{formato}_{hashlib.sha256(versao.encode()).hexdigest()[:16]}"
+
+
+def _caminho(tarefa_id, sufixo):
+    return os.path.join(EXPORT_DIR, f"{tarefa_id}.{sufixo}")
+
+
+def obter_tarefa(tarefa_id):
+    """Estado da tarefa (dict) ou None se não existir."""
+    if not tarefa_id or not all(c.isalnum() or c == "_" for c in tarefa_id):
+        return None
+    try:
+        with open(_caminho(tarefa_id, "json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _salvar_tarefa(tarefa):
+    tarefa["atualizada_em"] = time.time()
+    # Escrita atômica: leitores em outros workers nunca veem um JSON pela metade
+    temporario = _caminho(tarefa["id"], f"json.{os.getpid()}.{threading.get_ident()}")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(tarefa, f)
+    os.replace(temporario, _caminho(tarefa["id"], "json"))
+
+
+def _reaproveitavel(tarefa):
+    """Tarefa concluída com arquivo presente ou em andamento dando sinais de vida."""
+    if tarefa["status"] == "concluida":
+        return os.path.exists(arquivo_tarefa(tarefa))
+    if tarefa["status"] in ("pendente", "executando"):
+        # Worker encerrado no meio da exportação deixa a tarefa parada
+        return time.time() - tarefa.get("atualizada_em", 0) < EXPORT_TAREFA_TIMEOUT
+    return False
+
+
+def arquivo_tarefa(tarefa):
+    """Caminho do arquivo gerado por uma tarefa concluída."""
+    return _caminho(tarefa["id"], FORMATOS_EXPORTACAO[tarefa["formato"]][1])
+
+
+def iniciar_exportacao(formato):
+    """Retorna a tarefa que produz a exportação dos dados atuais no formato.
+
+    Se os dados não mudaram desde a última exportação nesse formato, reaproveita
+    o arquivo já gerado (ou a tarefa em andamento); senão cria uma nova tarefa.
+    Só é usada com EXPORT_ASSINCRONO.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _limpar_expirados()
+
+    marca_dagua = calcular_marca_dagua(get_admin_client())
+    tarefa_id = _id_tarefa(formato, marca_dagua)
+
+    tarefa = obter_tarefa(tarefa_id)
+    if tarefa and _reaproveitavel(tarefa):
+        return tarefa
+    if tarefa:
+        _remover(_caminho(tarefa_id, "lock"))
+
+    # O arquivo .lock garante uma única tarefa por versão entre os workers
+    try:
+        descritor = os.open(_caminho(tarefa_id, "lock"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(descritor)
+    except FileExistsError:
+        return obter_tarefa(tarefa_id) or {"id": tarefa_id, "formato": formato, "status": "pendente", "lidas": 0, "total": 0}
+
+    tarefa = {
+        "id": tarefa_id,
+        "formato": formato,
+        "status": "pendente",
+        "marca_dagua": marca_dagua,
+        "criada_em": datetime.now().isoformat(),
+        "lidas": 0,
+        "total": 0,
+        "erro": None,
+    }
+    _salvar_tarefa(tarefa)
+
+    _get_executor().submit(_executar, tarefa)
+    return obter_tarefa(tarefa_id)
+
+
+def _executar(tarefa):
+    gerar, _, _ = FORMATOS_EXPORTACAO[tarefa["formato"]]
+    destino = arquivo_tarefa(tarefa)
+    parcial = f"{destino}.parcial"
+
+    def registrar_progresso(exportacao):
+        if time.time() - tarefa["atualizada_em"] >= 1:
+            tarefa["lidas"] = exportacao.linhas_lidas
+            _salvar_tarefa(tarefa)
+
+    try:
+        tarefa["status"] = "executando"
+        _salvar_tarefa(tarefa)
+        exportacao = Exportacao(get_admin_client())
+        exportacao.ao_ler_bloco = registrar_progresso
+        tarefa["total"] = sum(exportacao.totais.values())
+        _salvar_tarefa(tarefa)
+
+        with open(parcial, "wb") as f:
+            for parte in gerar(exportacao):
+                f.write(parte.encode("utf-8") if isinstance(parte, str) else parte)
+        os.replace(parcial, destino)
+
+        tarefa.update(status="concluida", lidas=exportacao.linhas_lidas, concluida_em=datetime.now().isoformat())
+        _salvar_tarefa(tarefa)
+        logger.info(f"Exportação {tarefa['id']} concluída")
+    except Exception as e:
+        logger.error(f"Erro na exportação {tarefa['id']}: {str(e)}")
+        tarefa.update(status="erro", erro=str(e))
+        _salvar_tarefa(tarefa)
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        # Libera a versão para uma nova tentativa
+        _remover(_caminho(tarefa["id"], "lock"))
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _limpar_expirados():
+    """Remove as tarefas sem alteração há mais de EXPORT_CACHE_TTL, com todos os seus arquivos.
+
+    Estado, arquivo gerado e trava saem juntos (o estado primeiro), para que
+    nenhuma tarefa concluída aponte para um arquivo que já não existe.
+    """
+    limite = time.time() - EXPORT_CACHE_TTL
+    try:
+        # Arquivos da tarefa: <id>.json, <id>.lock, <id>.<extensão> e temporários
+        arquivos = {}
+        for nome in os.listdir(EXPORT_DIR):
+            arquivos.setdefault(nome.split(".", 1)[0], []).append(os.path.join(EXPORT_DIR, nome))
+        for tarefa_id, caminhos in arquivos.items():
+            if max(os.path.getmtime(caminho) for caminho in caminhos) >= limite:
+                continue
+            estado = _caminho(tarefa_id, "json")
+            for caminho in sorted(caminhos, key=lambda c: c != estado):
+                _remover(caminho)
+    except OSError as e:
+        logger.error(f"Erro ao limpar exportações expiradas: {str(e)}")
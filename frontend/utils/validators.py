@@ -35,6 +35,17 @@ def formatar_tempo_chama(hora, minuto, segundo):
     return f"{h}:{m}:{s}"
 
 
+def tempo_chama_para_segundos(tempo):
+    """Converte tempo de chama HH:MM:SS em segundos; retorna None se inválido."""
+    try:
+        horas, minutos, segundos = (int(parte) for parte in str(tempo).split(":"))
+    except (ValueError, TypeError):
+        return None
+    if horas < 0 or not 0 <= minutos < 60 or not 0 <= segundos < 60:
+        return None
+    return horas * 3600 + minutos * 60 + segundos
+
+
 def remover_duplicatas_por_campo(items, campo):
     """Remove itens duplicados baseado em um campo específico."""
     unicos = []